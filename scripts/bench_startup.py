@@ -0,0 +1,154 @@
+"""
+Benchmark de inicialização: do início do processo até a primeira busca de pedidos.
+
+Copia o serviço para uma pasta temporária com um config.ini de teste
+(BACKEND = nulo) apontando para um servidor local que imita o Supabase
+(local_supabase.py), inicia o processo N vezes e mede quanto tempo leva
+até a primeira requisição de pedidos pendentes chegar ao servidor.
+
+Uso:
+    python bench_startup.py                       print_service.py, 5 execuções
+    python bench_startup.py --gui                 print_service_gui.py (requer tela)
+    python bench_startup.py --exe dist\\ImpressoraPedidos\\ImpressoraPedidos.exe
+    python bench_startup.py --runs 10 --limit 2000
+
+Com --limit, termina com código 1 se a mediana passar do limite (ms).
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from local_supabase import LocalSupabase
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TEST_CONFIG = """[GERAL]
+SUPABASE_URL = {url}
+SUPABASE_KEY = benchmark
+
+[RESTAURANTE]
+ID = 00000000-0000-0000-0000-000000000000
+IMPRESSORA =
+
+[SISTEMA]
+INTERVALO = {interval}
+
+[IMPRESSAO]
+BACKEND = nulo
+"""
+
+
+def prepare(workdir: str, command: List[str], source: str = SCRIPTS_DIR) -> List[str]:
+    """Copia o serviço (de source) para workdir e retorna a linha de comando ajustada."""
+    if command[0] != sys.executable:
+        exe_dir = os.path.dirname(os.path.abspath(command[0]))
+        # Build onedir: a pasta inteira vai junto (o config.ini fica ao lado do .exe)
+        shutil.copytree(exe_dir, os.path.join(workdir, "app"))
+        return [os.path.join(workdir, "app", os.path.basename(command[0]))]
+    for path in glob.glob(os.path.join(source, "*.py")):
+        shutil.copy2(path, workdir)
+    return [sys.executable, os.path.join(workdir, command[1])]
+
+
+def startup_phases(base: str) -> Optional[Dict[str, float]]:
+    """Etapas registradas pelo próprio serviço (stage "startup" no log)."""
+    try:
+        with open(os.path.join(base, "logs", "impressora.log"), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("stage") == "startup" and "phases" in event:
+                    return event["phases"]
+    except OSError:
+        pass
+    return None
+
+
+def run_once(command: List[str], timeout: float) -> Dict:
+    server = LocalSupabase()
+    server.start()
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        command = prepare(workdir, command)
+        base = os.path.dirname(command[-1])
+        with open(os.path.join(base, "config.ini"), "w", encoding="utf-8") as f:
+            f.write(TEST_CONFIG.format(url=server.url, interval=5))
+
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=base, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        phases = None
+        try:
+            while server.first_poll_at is None and time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    break
+                time.sleep(0.005)
+            # O log é gravado por uma thread própria: espera a linha da inicialização
+            deadline = time.perf_counter() + 2.0
+            while server.first_poll_at is not None and phases is None and time.perf_counter() < deadline:
+                time.sleep(0.05)
+                phases = startup_phases(base)
+        finally:
+            process.kill()
+            process.wait()
+        if server.first_poll_at is None:
+            return {"ms": None, "phases": None}
+        return {"ms": (server.first_poll_at - start) * 1000, "phases": phases}
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o tempo até a primeira busca de pedidos")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--gui", action="store_true", help="mede print_service_gui.py")
+    target.add_argument("--exe", help="mede um executável gerado pelo PyInstaller")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--limit", type=float, help="mediana máxima aceitável (ms)")
+    args = parser.parse_args()
+
+    if args.exe:
+        command = [args.exe]
+    else:
+        command = [sys.executable, "print_service_gui.py" if args.gui else "print_service.py"]
+
+    results = []
+    for run in range(1, args.runs + 1):
+        result = run_once(command, args.timeout)
+        results.append(result)
+        label = f"{result['ms']:.0f} ms" if result["ms"] is not None else "sem resposta"
+        print(f"Execução {run}: {label}")
+
+    times = [result["ms"] for result in results if result["ms"] is not None]
+    if not times:
+        print("O serviço não fez nenhuma busca de pedidos.")
+        sys.exit(1)
+    median = statistics.median(times)
+    print(f"\nMediana: {median:.0f} ms  (mín {min(times):.0f}, máx {max(times):.0f})")
+
+    phases = [result["phases"] for result in results if result["phases"]]
+    if phases:
+        print("Etapas (mediana, ms):")
+        for name in phases[0]:
+            print(f"  {name:<12}{statistics.median(p.get(name, 0.0) for p in phases):>8.1f}")
+
+    if args.limit and median > args.limit:
+        print(f"FALHA: mediana acima de {args.limit:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
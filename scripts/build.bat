@@ -4,6 +4,12 @@ echo   Compilando ImpressoraPedidos com PyInstaller
 echo ================================================
 echo.
 
+REM Modo de compilacao:
+REM   build.bat          pasta com o .exe (--onedir): abre em menos de 1 segundo
+REM   build.bat onefile  arquivo unico (--onefile): descompacta tudo a cada inicio
+set MODO=onedir
+if /i "%1"=="onefile" set MODO=onefile
+
 REM Verifica se Python está instalado usando py launcher
 py --version >nul 2>&1
 if errorlevel 1 (
@@ -30,33 +36,45 @@ echo [2/5] Instalando dependencias...
 
 REM Compila o executável COM INTERFACE GRÁFICA (sem console)
 echo [3/5] Compilando executavel com interface grafica...
-%PYCMD% -m PyInstaller --onefile --noconsole --name "ImpressoraPedidos" print_service_gui.py
+%PYCMD% -m PyInstaller --%MODO% --noconsole --noconfirm --name "ImpressoraPedidos" print_service_gui.py
 
 REM Verifica se o executável foi criado
-if not exist "dist\ImpressoraPedidos.exe" (
+set EXE=dist\ImpressoraPedidos\ImpressoraPedidos.exe
+if "%MODO%"=="onefile" set EXE=dist\ImpressoraPedidos.exe
+if not exist "%EXE%" (
     echo.
     echo [ERRO] Falha na compilacao! O executavel nao foi criado.
     echo Verifique se o PyInstaller foi instalado corretamente.
     echo.
     echo Tente executar manualmente:
     echo   %PYCMD% -m pip install pyinstaller
-    echo   %PYCMD% -m PyInstaller --onefile --noconsole --name "ImpressoraPedidos" print_service_gui.py
+    echo   %PYCMD% -m PyInstaller --%MODO% --noconsole --name "ImpressoraPedidos" print_service_gui.py
     echo.
     pause
     exit /b 1
 )
 
-REM Move para pasta de distribuição
+REM Atualiza a pasta de distribuição. Ela pode estar em uso como instalação
+REM (config.ini, logs\, recibos\, estatisticas.json): só o executável e as
+REM bibliotecas (_internal\, PyInstaller 6+) são apagados e copiados de novo
 echo [4/5] Preparando distribuicao...
 if not exist "dist\distribuicao" mkdir "dist\distribuicao"
-copy "dist\ImpressoraPedidos.exe" "dist\distribuicao\" >nul
-copy "config.ini.example" "dist\distribuicao\" >nul
-copy "LEIA-ME.txt" "dist\distribuicao\" >nul
+if exist "dist\distribuicao\ImpressoraPedidos.exe" del /q "dist\distribuicao\ImpressoraPedidos.exe"
+if exist "dist\distribuicao\_internal" rmdir /s /q "dist\distribuicao\_internal"
+if "%MODO%"=="onefile" (
+    copy "dist\ImpressoraPedidos.exe" "dist\distribuicao\" >nul
+    set PACOTE='ImpressoraPedidos.exe','config.ini.example','LEIA-ME.txt'
+) else (
+    xcopy "dist\ImpressoraPedidos" "dist\distribuicao\" /e /i /q /y >nul
+    set PACOTE='ImpressoraPedidos.exe','_internal','config.ini.example','LEIA-ME.txt'
+)
+copy /y "config.ini.example" "dist\distribuicao\" >nul
+copy /y "LEIA-ME.txt" "dist\distribuicao\" >nul
 
-REM Cria o ZIP
+REM Cria o ZIP só com os arquivos do programa (nunca config.ini, logs ou recibos)
 echo [5/5] Criando arquivo ZIP...
 cd dist\distribuicao
-powershell Compress-Archive -Path * -DestinationPath ..\ImpressoraPedidos.zip -Force
+powershell -Command "Compress-Archive -Path %PACOTE% -DestinationPath ..\ImpressoraPedidos.zip -Force"
 cd ..\..
 
 echo.
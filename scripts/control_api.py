@@ -0,0 +1,215 @@
+"""
+API local de status e controle do serviço de impressão.
+
+Desligada por padrão. Quando ativada, um servidor HTTP escuta somente em
+127.0.0.1 para que o painel web (ou um técnico com curl) consulte o estado
+do serviço sem passar pelo Supabase:
+
+    GET  /status            filas, última verificação, impressora, circuitos
+    GET  /jobs?limit=20     últimos pedidos tratados por este computador
+    POST /reprint/<id>      reimprime um pedido
+    POST /pause             suspende a impressão automática
+    POST /resume            retoma a impressão automática
+    POST /poll              verifica novos pedidos imediatamente
+    POST /calibrate         imprime a série de calibração da impressora
+    POST /print             imprime um texto avulso ({"text": ...}; ex.: --summary)
+
+O JSON de /status é montado na thread do servidor a partir dos snapshots
+em memória (ver service_control.py). As ações (reimpressão, verificação)
+são enfileiradas e executadas pelo próprio loop de impressão.
+
+Este módulo (e o http.server) só é carregado quando a API está ativada.
+
+Configuração no config.ini:
+
+[CONTROLE]
+ATIVO = nao
+PORTA = 8765
+TOKEN =          (exigido em "Authorization: Bearer <TOKEN>" em todas as
+                  chamadas; vazio: gerado e gravado em controle-token.txt)
+ORIGEM =         (endereço do painel web liberado para o navegador; vazio:
+                  chamadas de navegador são recusadas)
+"""
+
+import hmac
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from service_control import DEFAULT_PORT, ServiceControl, control_api_enabled, control_token
+
+# Maior texto aceito em POST /print
+MAX_PRINT_BYTES = 64 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ImpressoraPedidos"
+
+    # O servidor guarda a configuração (ver ControlServer)
+    @property
+    def control(self) -> ServiceControl:
+        return self.server.control
+
+    def log_message(self, format, *args):
+        # O padrão escreve em stderr, que não existe no executável --noconsole
+        pass
+
+    def _send(self, status: int, body: Optional[Dict] = None):
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        if self.server.origin and self.headers.get("Origin") == self.server.origin:
+            self.send_header("Access-Control-Allow-Origin", self.server.origin)
+        self.send_header("Cache-Control", "no-store")
+        if body is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def _origin_allowed(self) -> bool:
+        # Sem cabeçalho Origin a chamada não vem de uma página (curl, --reprint)
+        origin = self.headers.get("Origin")
+        return origin is None or (bool(self.server.origin) and origin == self.server.origin)
+
+    def _authorized(self) -> bool:
+        header = self.headers.get("Authorization", "")
+        return hmac.compare_digest(header.encode(), f"Bearer {self.server.token}".encode())
+
+    def _check(self) -> bool:
+        """Recusa origem não permitida (403) e token ausente ou errado (401)."""
+        if not self._origin_allowed():
+            self._send(403, {"error": "origem não permitida"})
+            return False
+        if not self._authorized():
+            self._send(401, {"error": "token inválido"})
+            return False
+        return True
+
+    def do_OPTIONS(self):
+        if not self.server.origin or self.headers.get("Origin") != self.server.origin:
+            return self._send(403, {"error": "origem não permitida"})
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", self.server.origin)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Authorization, Content-Type")
+        # Chrome exige esta resposta para o painel (página pública) acessar localhost
+        self.send_header("Access-Control-Allow-Private-Network", "true")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if not self._check():
+            return
+        url = urlparse(self.path)
+        if url.path == "/status":
+            return self._send(200, self.control.snapshot())
+        if url.path == "/jobs":
+            try:
+                limit = int(parse_qs(url.query).get("limit", ["20"])[0])
+            except ValueError:
+                return self._send(400, {"error": "limit inválido"})
+            return self._send(200, {"jobs": self.control.recent_jobs(max(1, min(limit, self.control.max_jobs)))})
+        self._send(404, {"error": "não encontrado"})
+
+    def do_POST(self):
+        if not self._check():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/pause":
+            self.control.pause()
+            self.server.notify("Impressão automática pausada pela API local", action="pause")
+            return self._send(200, {"paused": True})
+        if path == "/resume":
+            self.control.resume()
+            self.server.notify("Impressão automática retomada pela API local", action="resume")
+            return self._send(200, {"paused": False})
+        if path == "/poll":
+            self.control.request_poll()
+            return self._send(202, {"queued": True})
+        if path == "/calibrate":
+            self.control.request_calibration()
+            self.server.notify("Calibração da impressora solicitada pela API local", action="calibrate")
+            return self._send(202, {"queued": True})
+        if path == "/print":
+            return self._print()
+        if path.startswith("/reprint/"):
+            order_id = path[len("/reprint/"):]
+            try:
+                order_id = str(uuid.UUID(order_id))
+            except ValueError:
+                return self._send(400, {"error": "id de pedido inválido"})
+            self.control.request_reprint(order_id)
+            self.server.notify(f"Reimpressão do pedido {order_id[:8]} solicitada pela API local",
+                               action="reprint", order_id=order_id)
+            return self._send(202, {"queued": True, "order_id": order_id})
+        self._send(404, {"error": "não encontrado"})
+
+
+    def _print(self):
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if not 0 < length <= MAX_PRINT_BYTES:
+            return self._send(400, {"error": f"corpo ausente ou maior que {MAX_PRINT_BYTES} bytes"})
+        try:
+            text = json.loads(self.rfile.read(length).decode("utf-8")).get("text")
+        except (ValueError, AttributeError):
+            text = None
+        if not isinstance(text, str) or not text.strip():
+            return self._send(400, {"error": "campo text ausente"})
+        notify = self.server.notify
+        self.control.request_print(
+            text, lambda printed: notify("Impressão avulsa da API local " + ("enviada" if printed else "falhou"),
+                                         action="print", printed=printed))
+        return self._send(202, {"queued": True})
+
+
+class ControlServer:
+    """Servidor HTTP da API local (thread própria, somente 127.0.0.1)."""
+
+    def __init__(self, control: ServiceControl, token: str, port: int = DEFAULT_PORT,
+                 origin: str = "", notify: Optional[Callable[..., None]] = None):
+        if not token:
+            raise ValueError("a API local exige um token")
+        self.control = control
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.control = control
+        self.httpd.token = token
+        self.httpd.origin = origin
+        self.httpd.notify = notify or (lambda message, **extra: None)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="control-api", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def create_control_server(config, control: ServiceControl, base_path: str,
+                          notify: Optional[Callable[..., None]] = None) -> Optional[ControlServer]:
+    """Cria o servidor da seção [CONTROLE]; None quando desativado.
+
+    Levanta OSError se a porta estiver ocupada.
+    """
+    if not control_api_enabled(config):
+        return None
+    return ControlServer(
+        control,
+        control_token(config, base_path),
+        port=config.getint('CONTROLE', 'PORTA', fallback=DEFAULT_PORT),
+        origin=config.get('CONTROLE', 'ORIGEM', fallback='').strip().rstrip('/'),
+        notify=notify,
+    )
@@ -0,0 +1,259 @@
+"""
+Fila de despacho por prazo: qual pedido pendente vai primeiro para a impressora.
+
+A lista do servidor vem por ordem de chegada. No pico, com a impressora
+lenta, um pedido de balcão rápido ficava esperando atrás de uma mesa de
+20 itens. Aqui cada pedido ganha um prazo para o ticket chegar à cozinha:
+
+    prazo = chegada + meta do tipo - preparo estimado - tempo de impressão
+
+- meta do tipo: em quanto tempo o pedido deve ficar pronto (balcão,
+  retirada, mesa, entrega), configurável em [DESPACHO];
+- preparo estimado: mediana de criação -> pronto (`ready_at`) dos pedidos
+  recentes com o mesmo produto (o mais demorado dos itens), como no
+  relatório de tempo de preparo do sistema web; sem histórico, a mediana
+  do tipo ou PREPARO_PADRAO;
+- tempo de impressão: pelo perfil da calibração da impressora, quando há.
+
+Os pedidos saem pelo menor prazo. Para nenhum ficar para trás
+indefinidamente, quem espera na fila mais que ESPERA_MAXIMA segundos
+passa na frente de todos, por ordem de chegada. Cada impressora tem sua
+fila (o serviço usa uma só); as decisões e as esperas aparecem em
+`dispatch` no /status.
+"""
+
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from order_model import Order
+from print_stats import LatencySketch
+
+# Meta de pronto por tipo de pedido (minutos)
+DEFAULT_TARGETS = {"counter": 10.0, "takeout": 15.0, "takeaway": 15.0, "table": 20.0, "delivery": 30.0}
+
+# Preparo estimado sem histórico (minutos)
+DEFAULT_PREP_MINUTES = 12.0
+
+# Tempo de fila a partir do qual o pedido passa na frente de todos (segundos)
+DEFAULT_MAX_WAIT = 120.0
+
+# Tempos de preparo fora disso são descartados (mesmo corte do relatório web)
+MAX_PREP_MINUTES = 180.0
+
+# Produtos com menos pedidos que isso usam a mediana do tipo
+MIN_SAMPLES = 3
+
+# Atualização do histórico de preparo (segundos); a primeira espera o serviço assentar
+HISTORY_REFRESH = 6 * 3600.0
+HISTORY_FIRST_DELAY = 60.0
+
+# Pedidos mostrados em `next` no /status
+SNAPSHOT_NEXT = 5
+
+
+def _parse_time(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")) if value else None
+    except ValueError:
+        return None
+
+
+class PrepTimeModel:
+    """Tempo de preparo estimado por produto e por tipo de pedido (minutos)."""
+
+    def __init__(self, default_minutes: float = DEFAULT_PREP_MINUTES):
+        self.default_minutes = default_minutes
+        self.by_product: Dict[str, float] = {}
+        self.by_type: Dict[str, float] = {}
+        self.orders = 0
+        self.updated_at: Optional[str] = None
+
+    def update(self, history: Iterable[Dict]):
+        """Recalcula as medianas a partir de pedidos com created_at e ready_at."""
+        products: Dict[str, List[float]] = {}
+        types: Dict[str, List[float]] = {}
+        orders = 0
+        for data in history:
+            created, ready = _parse_time(data.get("created_at")), _parse_time(data.get("ready_at"))
+            if created is None or ready is None:
+                continue
+            minutes = (ready - created).total_seconds() / 60
+            if not 0 <= minutes <= MAX_PREP_MINUTES:
+                continue
+            orders += 1
+            types.setdefault(data.get("order_type") or "table", []).append(minutes)
+            for item in data.get("order_items") or ():
+                if item.get("product_name"):
+                    products.setdefault(item["product_name"], []).append(minutes)
+        self.by_product = {name: statistics.median(times) for name, times in products.items()
+                           if len(times) >= MIN_SAMPLES}
+        self.by_type = {name: statistics.median(times) for name, times in types.items()
+                        if len(times) >= MIN_SAMPLES}
+        self.orders = orders
+        self.updated_at = datetime.now().isoformat(timespec="seconds")
+
+    def estimate(self, order: Order) -> float:
+        """Preparo do pedido: o item mais demorado (os itens são feitos em paralelo)."""
+        known = [self.by_product[item.product_name] for item in order.items if item.product_name in self.by_product]
+        if known:
+            return max(known)
+        return self.by_type.get(order.order_type, self.default_minutes)
+
+    def snapshot(self) -> Dict:
+        return {
+            "orders": self.orders,
+            "products": len(self.by_product),
+            "by_type": {name: round(minutes, 1) for name, minutes in self.by_type.items()},
+            "updated_at": self.updated_at,
+        }
+
+
+class QueuedOrder:
+    """Pedido na fila com o prazo calculado na primeira vez em que foi visto."""
+
+    __slots__ = ("order", "seen_at", "arrived", "deadline", "prep_minutes")
+
+    def __init__(self, order: Order, seen_at: float, arrived: float, deadline: float, prep_minutes: float):
+        self.order = order
+        self.seen_at = seen_at
+        self.arrived = arrived
+        self.deadline = deadline
+        self.prep_minutes = prep_minutes
+
+
+class DispatchScheduler:
+    """Fila de despacho de uma impressora, ordenada por prazo."""
+
+    def __init__(self, printer: str, prep: PrepTimeModel, targets: Optional[Dict[str, float]] = None,
+                 max_wait: float = DEFAULT_MAX_WAIT, print_ms: Optional[Callable[[Order], float]] = None,
+                 enabled: bool = True):
+        self.printer = printer
+        self.prep = prep
+        self.targets = dict(DEFAULT_TARGETS, **(targets or {}))
+        self.max_wait = max_wait
+        self.print_ms = print_ms
+        self.enabled = enabled
+        self.next_history = time.monotonic() + HISTORY_FIRST_DELAY
+
+        self._queue: Dict[str, QueuedOrder] = {}
+        self._plan: List[QueuedOrder] = []
+        self.wait_ms = LatencySketch()
+        self.dispatched_count = 0
+        self.reordered = 0
+        self.promoted = 0
+        self.late = 0
+
+    def _enqueue(self, order: Order, now: float) -> QueuedOrder:
+        prep_minutes = self.prep.estimate(order)
+        arrived = order.created_at.timestamp() if order.created_at and order.created_at.tzinfo else now
+        target = self.targets.get(order.order_type, max(self.targets.values()))
+        deadline = arrived + (target - prep_minutes) * 60
+        if self.print_ms:
+            deadline -= self.print_ms(order) / 1000
+        return QueuedOrder(order, now, arrived, deadline, prep_minutes)
+
+    def plan(self, orders: List[Order]) -> List[Order]:
+        """Pedidos a despachar, na ordem de despacho; quem sumiu da lista sai da fila.
+
+        Recebe só os que ainda não foram enviados (fora do spooler e das
+        confirmações pendentes).
+        """
+        now = time.time()
+        queue = {}
+        for order in orders:
+            entry = self._queue.get(order.id)
+            if entry is None or entry.order is not order:
+                entry = self._enqueue(order, entry.seen_at if entry else now)
+            queue[order.id] = entry
+        self._queue = queue
+        entries = list(queue.values())
+        if self.enabled:
+            # Quem esperou demais primeiro (por chegada); depois o menor prazo
+            entries.sort(key=lambda entry: (0, entry.arrived) if now - entry.seen_at >= self.max_wait
+                         else (1, entry.deadline))
+        self._plan = entries
+        return [entry.order for entry in entries]
+
+    def dispatched(self, order: Order):
+        """Registra a saída de um pedido para a impressora (espera e decisão)."""
+        entry = self._queue.pop(order.id, None)
+        if entry is None:
+            return
+        now = time.time()
+        self.dispatched_count += 1
+        self.wait_ms.add((now - entry.seen_at) * 1000)
+        if now - entry.seen_at >= self.max_wait:
+            self.promoted += 1
+        elif any(other.arrived < entry.arrived for other in self._queue.values()):
+            # Passou na frente de alguém que chegou antes
+            self.reordered += 1
+        if now > entry.deadline:
+            self.late += 1
+
+    def history_due(self) -> bool:
+        return self.enabled and time.monotonic() >= self.next_history
+
+    def update_history(self, history: Optional[List[Dict]]):
+        """Atualiza as estimativas de preparo (None: falhou, tenta de novo na próxima janela)."""
+        self.next_history = time.monotonic() + HISTORY_REFRESH
+        if history is not None:
+            self.prep.update(history)
+            # Os prazos dos pedidos já na fila passam a usar as novas estimativas
+            for order_id, entry in list(self._queue.items()):
+                self._queue[order_id] = self._enqueue(entry.order, entry.seen_at)
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        queue = self._queue
+        # Ordem do último plano, com os prazos atuais (update_history os recalcula)
+        upcoming = [current for current in (queue.get(entry.order.id) for entry in self._plan)
+                    if current is not None][:SNAPSHOT_NEXT]
+        return {
+            "printer": self.printer,
+            "policy": "deadline" if self.enabled else "fifo",
+            "queued": len(queue),
+            "dispatched": self.dispatched_count,
+            "reordered": self.reordered,
+            "promoted": self.promoted,
+            "late": self.late,
+            "wait_ms": self.wait_ms.summary(),
+            "next": [
+                {
+                    "order_id": entry.order.short_id,
+                    "order_type": entry.order.order_type,
+                    "items": len(entry.order.items),
+                    "prep_min": round(entry.prep_minutes, 1),
+                    "deadline_in_s": round(entry.deadline - now),
+                    "waiting_s": round(now - entry.seen_at),
+                }
+                for entry in upcoming
+            ],
+            "prep": self.prep.snapshot(),
+        }
+
+
+def estimate_ticket_lines(order: Order) -> int:
+    """Linhas aproximadas do recibo (cabeçalho, itens com observações, totais)."""
+    return 16 + sum(2 if item.notes else 1 for item in order.items)
+
+
+def create_dispatch_scheduler(config, printer: str,
+                              print_ms: Optional[Callable[[Order], float]] = None) -> DispatchScheduler:
+    """Cria a fila com as metas da seção [DESPACHO] do config.ini."""
+    targets = {
+        "counter": config.getfloat('DESPACHO', 'PRAZO_BALCAO', fallback=DEFAULT_TARGETS["counter"]),
+        "takeout": config.getfloat('DESPACHO', 'PRAZO_RETIRADA', fallback=DEFAULT_TARGETS["takeout"]),
+        "table": config.getfloat('DESPACHO', 'PRAZO_MESA', fallback=DEFAULT_TARGETS["table"]),
+        "delivery": config.getfloat('DESPACHO', 'PRAZO_ENTREGA', fallback=DEFAULT_TARGETS["delivery"]),
+    }
+    targets["takeaway"] = targets["takeout"]
+    return DispatchScheduler(
+        printer,
+        PrepTimeModel(config.getfloat('DESPACHO', 'PREPARO_PADRAO', fallback=DEFAULT_PREP_MINUTES)),
+        targets,
+        max_wait=config.getfloat('DESPACHO', 'ESPERA_MAXIMA', fallback=DEFAULT_MAX_WAIT),
+        print_ms=print_ms,
+        enabled=config.getboolean('DESPACHO', 'ATIVO', fallback=True),
+    )
@@ -0,0 +1,167 @@
+"""
+Servidor local que imita as rotas do Supabase usadas pelo serviço.
+
+Usado pelos benchmarks e testes de carga, sem tocar o banco real:
+
+    GET   /rest/v1/orders?print_status=eq.pending   pedidos pendentes (com ETag)
+    GET   /rest/v1/orders?id=eq.<id>                 um pedido (reimpressão)
+    PATCH /rest/v1/orders?id=eq.<id>                 confirma a impressão
+    POST  /rest/v1/print_logs                        registra o log
+    POST  /functions/v1/printer-heartbeat            heartbeat
+
+Uso:
+    server = LocalSupabase()
+    server.start()
+    server.add_order({"id": "...", "order_type": "counter", "order_items": [...]})
+    ...  config.ini com SUPABASE_URL = server.url
+    server.stop()
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def backend(self) -> "LocalSupabase":
+        return self.server.backend
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else None
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        payload = self._read_json() if method in ("PATCH", "POST") else None
+        status, body, headers = self.backend.handle(method, url.path, query, payload,
+                                                    self.headers.get("If-None-Match"))
+        self._send(status, body, headers)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class LocalSupabase:
+    """Tabelas orders/print_logs em memória servidas por HTTP em 127.0.0.1."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        # Atraso artificial (segundos) em cada resposta, para simular a internet
+        self.latency = latency
+        self.orders: Dict[str, Dict] = {}
+        self.print_logs: List[Dict] = []
+        self.heartbeats = 0
+        self.requests = 0
+        self.first_poll_at: Optional[float] = None
+        # Chamado a cada PATCH de confirmação: on_ack(order_id)
+        self.on_ack: Optional[Callable[[str], None]] = None
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.backend = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="local-supabase", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ---- dados ----
+    def add_order(self, order: Dict):
+        data = dict(order)
+        data.setdefault("print_status", "pending")
+        data.setdefault("order_items", [])
+        with self._lock:
+            self.orders[data["id"]] = data
+
+    def discard_printed(self) -> int:
+        """Apaga os pedidos já impressos e os logs (testes longos). Retorna quantos saíram."""
+        with self._lock:
+            printed = [order_id for order_id, order in self.orders.items() if order["print_status"] != "pending"]
+            for order_id in printed:
+                del self.orders[order_id]
+            self.print_logs.clear()
+        return len(printed)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for order in self.orders.values() if order["print_status"] == "pending")
+
+    # ---- rotas ----
+    def handle(self, method: str, path: str, query: Dict[str, str], payload, etag: Optional[str]):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if path == "/rest/v1/orders" and method == "GET":
+                return self._get_orders(query, etag)
+            if path == "/rest/v1/orders" and method == "PATCH":
+                order_id = query.get("id", "")[3:]
+                order = self.orders.get(order_id)
+                if order is not None and payload:
+                    order.update({key: value for key, value in payload.items()})
+                callback = self.on_ack
+            elif path == "/rest/v1/print_logs" and method == "POST":
+                self.print_logs.append(payload)
+                return 201, b"", {}
+            elif path == "/functions/v1/printer-heartbeat" and method == "POST":
+                self.heartbeats += 1
+                return 200, b'{"ok":true}', {}
+            else:
+                return 404, b'{"message":"not found"}', {}
+        if callback and order_id:
+            callback(order_id)
+        return 204, b"", {}
+
+    def _get_orders(self, query: Dict[str, str], etag: Optional[str]):
+        if "id" in query:
+            order = self.orders.get(query["id"][3:])
+            return 200, json.dumps([order] if order else []).encode("utf-8"), {}
+        if "ready_at" in query:
+            # Histórico de preparo: pedidos que já ficaram prontos
+            ready = [order for order in self.orders.values() if order.get("ready_at")]
+            return 200, json.dumps(ready).encode("utf-8"), {}
+        if self.first_poll_at is None:
+            self.first_poll_at = time.perf_counter()
+        pending = [order for order in self.orders.values() if order["print_status"] == "pending"]
+        pending.sort(key=lambda order: order.get("created_at") or "")
+        body = json.dumps(pending).encode("utf-8")
+        tag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if etag == tag:
+            return 304, b"", {"ETag": tag}
+        return 200, body, {"ETag": tag}
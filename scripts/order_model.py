@@ -0,0 +1,200 @@
+"""
+Modelo compacto dos pedidos usados na impressão.
+
+A API devolve cada pedido com todas as colunas de `orders` e `order_items`,
+mas o recibo usa só uma parte delas. Aqui ficam:
+
+- a projeção (ORDERS_SELECT) pedida ao PostgREST, com apenas as colunas
+  que o recibo e o roteamento usam;
+- as classes Order/OrderItem com __slots__, validadas uma única vez na
+  chegada, para que o JSON bruto possa ser descartado logo em seguida.
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+# Colunas realmente usadas pelo serviço de impressão
+ORDER_COLUMNS = (
+    "id",
+    "created_at",
+    "updated_at",
+    "order_type",
+    "customer_name",
+    "table_id",
+    "delivery_address",
+    "delivery_phone",
+    "delivery_fee",
+    "total",
+    "notes",
+)
+ITEM_COLUMNS = (
+    "product_name",
+    "product_price",
+    "quantity",
+    "notes",
+)
+ORDERS_SELECT = f"{','.join(ORDER_COLUMNS)},order_items({','.join(ITEM_COLUMNS)})"
+
+
+class OrderValidationError(ValueError):
+    """Pedido recebido da API com dados inválidos."""
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value) or None
+
+
+def _number(value, field: str) -> float:
+    if value is None or value == "":
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise OrderValidationError(f"{field} inválido: {value!r}")
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+class OrderItem:
+    """Item de um pedido."""
+
+    __slots__ = ("product_name", "product_price", "quantity", "notes")
+
+    def __init__(self, product_name: str, product_price: float, quantity: int, notes: Optional[str] = None):
+        self.product_name = product_name
+        self.product_price = product_price
+        self.quantity = quantity
+        self.notes = notes
+
+    @classmethod
+    def from_json(cls, data: dict) -> "OrderItem":
+        if not isinstance(data, dict):
+            raise OrderValidationError("item do pedido não é um objeto")
+        quantity = data.get('quantity', 1)
+        try:
+            quantity = int(quantity if quantity is not None else 1)
+        except (TypeError, ValueError):
+            raise OrderValidationError(f"quantity inválido: {quantity!r}")
+        return cls(
+            product_name=_text(data.get('product_name')) or 'Item',
+            product_price=_number(data.get('product_price'), 'product_price'),
+            quantity=quantity,
+            notes=_text(data.get('notes')),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "product_name": self.product_name,
+            "product_price": self.product_price,
+            "quantity": self.quantity,
+            "notes": self.notes,
+        }
+
+
+class Order:
+    """Pedido pronto para impressão."""
+
+    __slots__ = (
+        "id", "created_at", "updated_at", "order_type", "customer_name", "waiter_name",
+        "created_by_name", "table_id", "delivery_address", "delivery_phone", "delivery_fee",
+        "total", "notes", "items",
+    )
+
+    def __init__(self, id: str, created_at: Optional[datetime] = None, updated_at: Optional[str] = None,
+                 order_type: str = 'table', customer_name: Optional[str] = None,
+                 waiter_name: Optional[str] = None, created_by_name: Optional[str] = None,
+                 table_id: Optional[str] = None, delivery_address: Optional[str] = None,
+                 delivery_phone: Optional[str] = None, delivery_fee: float = 0.0, total: float = 0.0,
+                 notes: Optional[str] = None, items: Tuple[OrderItem, ...] = ()):
+        self.id = id
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.order_type = order_type
+        self.customer_name = customer_name
+        # Nomes resolvidos pelas funções de borda (não são colunas de orders)
+        self.waiter_name = waiter_name
+        self.created_by_name = created_by_name
+        self.table_id = table_id
+        self.delivery_address = delivery_address
+        self.delivery_phone = delivery_phone
+        self.delivery_fee = delivery_fee
+        self.total = total
+        self.notes = notes
+        self.items = items
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Order":
+        if not isinstance(data, dict):
+            raise OrderValidationError("pedido não é um objeto")
+        order_id = _text(data.get('id'))
+        if not order_id:
+            raise OrderValidationError("pedido sem id")
+        items = data.get('order_items') or []
+        if not isinstance(items, list):
+            raise OrderValidationError(f"order_items inválido no pedido {order_id[:8]}")
+        return cls(
+            id=order_id,
+            created_at=_timestamp(data.get('created_at')),
+            updated_at=_text(data.get('updated_at')),
+            order_type=_text(data.get('order_type')) or 'table',
+            customer_name=_text(data.get('customer_name')),
+            waiter_name=_text(data.get('waiter_name')),
+            created_by_name=_text(data.get('created_by_name')),
+            table_id=_text(data.get('table_id')),
+            delivery_address=_text(data.get('delivery_address')),
+            delivery_phone=_text(data.get('delivery_phone')),
+            delivery_fee=_number(data.get('delivery_fee'), 'delivery_fee'),
+            total=_number(data.get('total'), 'total'),
+            notes=_text(data.get('notes')),
+            items=tuple(OrderItem.from_json(item) for item in items),
+        )
+
+    def to_json(self) -> dict:
+        """Forma serializável (mesmas chaves da API)."""
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at,
+            "order_type": self.order_type,
+            "customer_name": self.customer_name,
+            "waiter_name": self.waiter_name,
+            "created_by_name": self.created_by_name,
+            "table_id": self.table_id,
+            "delivery_address": self.delivery_address,
+            "delivery_phone": self.delivery_phone,
+            "delivery_fee": self.delivery_fee,
+            "total": self.total,
+            "notes": self.notes,
+            "order_items": [item.to_json() for item in self.items],
+        }
+
+    @property
+    def short_id(self) -> str:
+        return self.id[:8]
+
+    def __repr__(self) -> str:
+        return f"Order({self.short_id}, {self.order_type}, {len(self.items)} itens)"
+
+
+def parse_orders(payload: Iterable) -> Tuple[List[Order], List[str]]:
+    """Valida a resposta da API.
+
+    Retorna (pedidos válidos, erros). Um pedido inválido não impede a
+    impressão dos demais.
+    """
+    orders, errors = [], []
+    for data in payload or ():
+        try:
+            orders.append(Order.from_json(data))
+        except OrderValidationError as e:
+            errors.append(str(e))
+    return orders, errors
@@ -8,20 +8,76 @@ INSTALAÇÃO:
 1. pip install requests pywin32
 2. Crie o arquivo config.ini (veja config.ini.example)
 3. Execute: python print_service.py
+   (use --profile para gerar um relatório de diagnóstico em logs/)
+
+REIMPRIMIR (funciona sem internet para recibos guardados em recibos/):
+python print_service.py --list-receipts
+python print_service.py --reprint <numero-do-pedido>
+
+RESUMO DO DIA (a partir das estatísticas locais):
+python print_service.py --summary [AAAA-MM-DD]
+
+CALIBRAR A IMPRESSORA (velocidade e pedidos por hora que ela aguenta):
+python print_service.py --calibrate
+
+GRAVAR O TRÁFEGO (para reproduzir depois com replay_capture.py):
+python print_service.py --record [ARQUIVO]
+
+SUPERVISIONADO (reabre o serviço sozinho se ele cair ou travar):
+python print_service.py --supervise
 
 CRIAR EXECUTÁVEL:
 pip install pyinstaller
-pyinstaller --onefile --name "ImpressoraPedidos" print_service.py
+pyinstaller --onedir --name "ImpressoraPedidos" print_service.py
+(--onedir abre bem mais rápido que --onefile)
 """
 
-import requests
+import argparse
 import time
 import sys
 import os
 import configparser
-from datetime import datetime
+import logging
+import uuid
+from datetime import date
 from typing import Optional, List, Dict
 
+# Primeiro import: marca o início do processo para medir a inicialização
+from startup import StartupTimer, preload
+
+from dispatch_queue import create_dispatch_scheduler, estimate_ticket_lines
+from print_stats import create_print_stats, format_summary, wait_ms_since
+from printer_calibration import (
+    CalibrationError,
+    TicketLines,
+    calibrate,
+    capacity_report,
+    create_profile_store,
+    format_capacity,
+)
+from printer_backends import create_backend, encode_receipt
+from order_model import Order
+from printer_health import create_health_monitor
+from process_usage import process_snapshot
+from profiling import profiler, stage
+from receipt_cache import create_receipt_cache
+from resilience import Backoff, Resilience
+from service_control import (
+    JOB_FAILED,
+    JOB_PRINTED,
+    JOB_REPRINT_FAILED,
+    JOB_REPRINTED,
+    JOB_SENT,
+    ServiceControl,
+    control_api_enabled,
+    request_service_calibration,
+    request_service_print,
+    request_service_reprint,
+)
+from service_log import LOGGER_NAME, fields, setup_logging, shutdown_logging
+from supervisor import HANDOFF_MAX_AGE, WorkerLink, worker_link
+from traffic_capture import CaptureWriter, default_capture_path
+
 # Tenta importar bibliotecas do Windows
 try:
     import win32print
@@ -29,19 +85,35 @@ except ImportError:
     win32print = None
 
 
+# Ligação com o supervisor (None quando o serviço foi aberto diretamente)
+SUPERVISED: Optional[WorkerLink] = worker_link()
+
+
 # ============ CARREGAR CONFIGURAÇÃO ============
+def get_base_path() -> str:
+    """Pasta do executável (ou do script), onde ficam config.ini e dados locais."""
+    if getattr(sys, 'frozen', False):
+        # Rodando como .exe
+        return os.path.dirname(sys.executable)
+    # Rodando como script Python
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def pause_before_exit(prompt: str):
+    """Segura o console aberto para quem está na frente ler a mensagem.
+
+    Sob o supervisor, ou sem console, sai na hora para o serviço ser reaberto.
+    """
+    if SUPERVISED is None and sys.stdin is not None and sys.stdin.isatty():
+        input(prompt)
+
+
 def load_config():
     """Carrega configurações do arquivo config.ini"""
     config = configparser.ConfigParser()
     
     # Caminho do config.ini (mesma pasta do executável)
-    if getattr(sys, 'frozen', False):
-        # Rodando como .exe
-        base_path = os.path.dirname(sys.executable)
-    else:
-        # Rodando como script Python
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    
+    base_path = get_base_path()
     config_path = os.path.join(base_path, 'config.ini')
     
     if not os.path.exists(config_path):
@@ -61,131 +133,164 @@ IMPRESSORA =
 
 [SISTEMA]
 INTERVALO = 5
-LARGURA_PAPEL = 48""")
+LARGURA_PAPEL = 48
+
+[IMPRESSAO]
+BACKEND = auto""")
         print("-" * 50)
-        input("Pressione Enter para sair...")
+        pause_before_exit("Pressione Enter para sair...")
         sys.exit(1)
     
     config.read(config_path, encoding='utf-8')
     return config
 
 
-# Carrega configuração
-cfg = load_config()
+def report_circuit(name: str, old: str, new: str):
+    """Registra as mudanças de estado dos circuit breakers."""
+    labels = {"closed": "fechado", "open": "aberto", "half_open": "meio-aberto (testando)"}
+    level = logging.WARNING if new == "open" else logging.INFO
+    log.log(level, f"Circuito '{name}': {labels.get(old, old)} -> {labels.get(new, new)}",
+            extra=fields(stage="circuit", circuit=name, state=new))
 
-# Variáveis carregadas do arquivo
-SUPABASE_URL = cfg.get('GERAL', 'SUPABASE_URL').strip()
-SUPABASE_KEY = cfg.get('GERAL', 'SUPABASE_KEY').strip()
-RESTAURANT_ID = cfg.get('RESTAURANTE', 'ID').strip()
-PRINTER_NAME = cfg.get('RESTAURANTE', 'IMPRESSORA', fallback='').strip() or None
-POLL_INTERVAL = cfg.getint('SISTEMA', 'INTERVALO', fallback=5)
-PAPER_WIDTH = cfg.getint('SISTEMA', 'LARGURA_PAPEL', fallback=48)
 
-# Se não especificou impressora, usa a padrão do Windows
-if not PRINTER_NAME and win32print:
-    try:
-        PRINTER_NAME = win32print.GetDefaultPrinter()
-    except Exception:
-        PRINTER_NAME = None
+# Componentes do serviço, criados por setup(): importar este módulo não lê
+# o config.ini nem carrega o requests
+cfg = None
+SUPABASE_URL = SUPABASE_KEY = RESTAURANT_ID = ""
+PRINTER_NAME: Optional[str] = None
+POLL_INTERVAL = 5
+PAPER_WIDTH = 48
+BASE_PATH = get_base_path()
+log = logging.getLogger(LOGGER_NAME)
+PRINTER = HEALTH = RESILIENCE = API = PRINTER_BREAKER = RECEIPTS = STATS = PROFILES = SCHEDULER = TICKET_LINES = None
 
+# Pedidos impressos cuja confirmação no banco ainda não foi aceita
+PENDING_ACKS: Dict[str, Order] = {}
 
-# ============ FUNÇÕES DE API ============
-def get_pending_orders() -> List[Dict]:
-    """Busca pedidos pendentes via API REST do Supabase."""
-    # Busca pedidos com print_status = 'pending'
-    endpoint = f"{SUPABASE_URL}/rest/v1/orders"
-    
-    params = {
-        "select": "*,order_items(*)",
-        "restaurant_id": f"eq.{RESTAURANT_ID}",
-        "print_status": "eq.pending",
-        "order": "created_at.asc"
-    }
+# Tempo de envio (ms) dos pedidos enviados e ainda não confirmados; entra
+# nas estatísticas junto com o ticket, quando a impressão é confirmada
+SEND_MS: Dict[str, float] = {}
+
+# Estado exposto pela API local ([CONTROLE] no config.ini)
+CONTROL = ServiceControl()
+
+# Tempo de cada etapa até a primeira verificação
+STARTUP = StartupTimer()
+
+# Gravação do tráfego (--record), para reproduzir com replay_capture.py
+RECORDER: Optional[CaptureWriter] = None
+
+
+def setup():
+    """Carrega o config.ini e cria a impressora, a API e os demais componentes."""
+    global cfg, SUPABASE_URL, SUPABASE_KEY, RESTAURANT_ID, PRINTER_NAME, POLL_INTERVAL, PAPER_WIDTH
+    global log, PRINTER, HEALTH, RESILIENCE, API, PRINTER_BREAKER, RECEIPTS, STATS, PROFILES, SCHEDULER, TICKET_LINES
+    
+    # O requests é o import mais lento: carrega enquanto o resto é preparado
+    preload("supabase_api")
+    
+    cfg = load_config()
+    SUPABASE_URL = cfg.get('GERAL', 'SUPABASE_URL').strip()
+    SUPABASE_KEY = cfg.get('GERAL', 'SUPABASE_KEY').strip()
+    RESTAURANT_ID = cfg.get('RESTAURANTE', 'ID').strip()
+    PRINTER_NAME = cfg.get('RESTAURANTE', 'IMPRESSORA', fallback='').strip() or None
+    POLL_INTERVAL = cfg.getfloat('SISTEMA', 'INTERVALO', fallback=5)
+    PAPER_WIDTH = cfg.getint('SISTEMA', 'LARGURA_PAPEL', fallback=48)
+    
+    # Se não especificou impressora, usa a padrão do Windows
+    if not PRINTER_NAME and win32print:
+        try:
+            PRINTER_NAME = win32print.GetDefaultPrinter()
+        except Exception:
+            PRINTER_NAME = None
     
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+    # Log estruturado em logs/impressora.log (JSON) e no console
+    log = setup_logging(BASE_PATH)
+    STARTUP.mark("config")
     
+    # Backend de impressão (spooler do Windows, TCP 9100, CUPS, arquivo...)
     try:
-        response = requests.get(endpoint, params=params, headers=headers, timeout=15)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.Timeout:
-        print("[AVISO] Timeout na conexão. Tentando novamente...")
-        return []
-    except requests.exceptions.ConnectionError:
-        print("[AVISO] Sem conexão com a internet. Verificando...")
-        return []
-    except requests.RequestException as e:
-        print(f"[ERRO] Falha na requisição: {e}")
-        return []
+        PRINTER = create_backend(cfg, PRINTER_NAME, BASE_PATH)
+    except ValueError as e:
+        log.error(f"Configuração de impressão inválida: {e}")
+        shutdown_logging()
+        pause_before_exit("Pressione Enter para sair...")
+        sys.exit(1)
+    
+    # Monitor da fila da impressora (retém pedidos enquanto ela está com problema)
+    HEALTH = create_health_monitor(cfg, PRINTER)
+    STARTUP.mark("printer")
+    
+    # Recibos já renderizados (reimpressão rápida, inclusive sem internet)
+    RECEIPTS = create_receipt_cache(cfg, BASE_PATH)
+    TICKET_LINES = TicketLines(RECEIPTS)
+    
+    # Estatísticas por hora (resumo do dia sem consultar a nuvem)
+    STATS = create_print_stats(cfg, BASE_PATH)
+    
+    # Velocidade medida de cada impressora (--calibrate)
+    PROFILES = create_profile_store(BASE_PATH)
+    STARTUP.mark("local_data")
+    
+    # Ordem de despacho por prazo (tipo do pedido e tempo de preparo)
+    SCHEDULER = create_dispatch_scheduler(cfg, PRINTER.describe(), print_ms=estimated_print_ms)
+    
+    # Circuit breakers por endpoint e por impressora
+    from supabase_api import SupabaseAPI
+    RESILIENCE = Resilience(on_state_change=report_circuit)
+    API = SupabaseAPI(SUPABASE_URL, SUPABASE_KEY, RESTAURANT_ID, RESILIENCE)
+    PRINTER_BREAKER = RESILIENCE.breaker(f"printer:{PRINTER.name}")
+    STARTUP.mark("api")
+    
+    CONTROL.add_source("printer", PRINTER.snapshot)
+    CONTROL.add_source("health", HEALTH.snapshot)
+    CONTROL.add_source("circuits", RESILIENCE.snapshot)
+    CONTROL.add_source("polls", API.poll_stats.snapshot)
+    CONTROL.add_source("pending_acks", lambda: len(PENDING_ACKS))
+    CONTROL.add_source("receipts", RECEIPTS.snapshot)
+    CONTROL.add_source("today", STATS.snapshot)
+    CONTROL.add_source("capacity", printer_capacity)
+    CONTROL.add_source("process", process_snapshot)
+    CONTROL.add_source("dispatch", SCHEDULER.snapshot)
+    if SUPERVISED:
+        CONTROL.add_source("supervisor", SUPERVISED.snapshot)
+
+
+# ============ FUNÇÕES DE API ============
+def get_pending_orders() -> Optional[List[Order]]:
+    """Busca pedidos pendentes via API REST do Supabase.
+
+    Retorna None quando o servidor não respondeu, para não confundir uma
+    queda de conexão com uma cozinha sem pedidos.
+    """
+    start = time.perf_counter()
+    orders = API.get_pending_orders()
+    if RECORDER:
+        RECORDER.record_poll(orders, API.unchanged, (time.perf_counter() - start) * 1000, API.last_error)
+    if orders is not None and not API.unchanged:
+        for error in API.invalid_orders:
+            log.warning(f"Pedido ignorado: {error}", extra=fields(stage="parse"))
+    return orders
 
 
 def mark_order_printed(order_id: str) -> bool:
     """Atualiza o status do pedido para 'printed'."""
-    endpoint = f"{SUPABASE_URL}/rest/v1/orders"
-    
-    params = {"id": f"eq.{order_id}"}
-    
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal"
-    }
-    
-    data = {
-        "print_status": "printed",
-        "printed_at": datetime.utcnow().isoformat() + "Z",
-        "print_count": 1
-    }
-    
-    try:
-        response = requests.patch(endpoint, params=params, json=data, headers=headers, timeout=10)
-        response.raise_for_status()
+    if API.mark_order_printed(order_id):
         return True
-    except Exception as e:
-        print(f"[ERRO] Falha ao atualizar status: {e}")
-        return False
+    log.error(f"Falha ao atualizar status: {API.last_error}", extra=fields(order_id=order_id, stage="ack"))
+    return False
 
 
-def log_print_event(order: Dict, event_type: str, status: str, error_message: str = None) -> bool:
+def log_print_event(order: Order, event_type: str, status: str, error_message: str = None) -> bool:
     """Registra um log de impressão no banco de dados."""
-    endpoint = f"{SUPABASE_URL}/rest/v1/print_logs"
-    
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal"
-    }
-    
-    items = order.get('order_items', [])
-    
-    data = {
-        "restaurant_id": RESTAURANT_ID,
-        "order_id": order.get('id'),
-        "event_type": event_type,
-        "status": status,
-        "printer_name": PRINTER_NAME,
-        "error_message": error_message,
-        "order_number": order.get('id', '')[:8],
-        "items_count": len(items) if isinstance(items, list) else 0
-    }
-    
-    try:
-        response = requests.post(endpoint, json=data, headers=headers, timeout=10)
-        response.raise_for_status()
+    if API.log_print_event(order, event_type, status, PRINTER_NAME or PRINTER.name, error_message):
         return True
-    except Exception as e:
-        print(f"[AVISO] Falha ao registrar log: {e}")
-        return False
+    log.warning(f"Falha ao registrar log: {API.last_error}", extra=fields(order_id=order.id, stage="print_log"))
+    return False
 
 
 # ============ FORMATAÇÃO DO RECIBO ============
-def format_receipt(order: Dict) -> str:
+def format_receipt(order: Order) -> str:
     """Formata o pedido para impressão térmica."""
     w = PAPER_WIDTH
     lines = []
@@ -196,18 +301,13 @@ def format_receipt(order: Dict) -> str:
     lines.append("=" * w)
     
     # Data/Hora
-    dt = order.get('created_at', '')
-    if dt:
-        try:
-            parsed_dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
-            lines.append(parsed_dt.strftime("%d/%m/%Y %H:%M").center(w))
-        except Exception:
-            pass
+    if order.created_at:
+        lines.append(order.created_at.strftime("%d/%m/%Y %H:%M").center(w))
     
     lines.append("")
     
     # Tipo de pedido
-    order_type = order.get('order_type', 'table')
+    order_type = order.order_type
     type_labels = {
         'table': 'MESA',
         'delivery': 'ENTREGA',
@@ -217,27 +317,27 @@ def format_receipt(order: Dict) -> str:
     lines.append(f"TIPO: {type_labels.get(order_type, order_type.upper())}")
     
     # Garçom ou atendente
-    waiter_name = order.get('waiter_name')
-    created_by_name = order.get('created_by_name')
+    waiter_name = order.waiter_name
+    created_by_name = order.created_by_name
     if waiter_name:
         lines.append(f"GARCOM: {waiter_name}")
     elif created_by_name:
         lines.append(f"ATENDENTE: {created_by_name}")
     
     # Mesa (se aplicável)
-    table_id = order.get('table_id')
+    table_id = order.table_id
     if table_id and order_type == 'table':
         lines.append(f"MESA ID: {table_id[:8]}...")
     
     # Cliente
-    customer_name = order.get('customer_name')
+    customer_name = order.customer_name
     if customer_name:
         lines.append(f"CLIENTE: {customer_name}")
     
     # Endereço de entrega
     if order_type == 'delivery':
-        delivery_address = order.get('delivery_address')
-        delivery_phone = order.get('delivery_phone')
+        delivery_address = order.delivery_address
+        delivery_phone = order.delivery_phone
         if delivery_address:
             lines.append(f"ENDERECO: {delivery_address}")
         if delivery_phone:
@@ -249,15 +349,15 @@ def format_receipt(order: Dict) -> str:
     lines.append("-" * w)
     
     # Itens do pedido
-    items = order.get('order_items', [])
+    items = order.items
     if not items:
         lines.append("(Sem itens)")
     else:
         for item in items:
-            qty = item.get('quantity', 1)
-            name = item.get('product_name', 'Item')
-            price = float(item.get('product_price', 0))
-            notes = item.get('notes', '')
+            qty = item.quantity
+            name = item.product_name
+            price = item.product_price
+            notes = item.notes
             
             # Linha do item
             item_line = f"{qty}x {name}"
@@ -280,18 +380,18 @@ def format_receipt(order: Dict) -> str:
     lines.append("-" * w)
     
     # Taxa de entrega
-    delivery_fee = float(order.get('delivery_fee', 0) or 0)
+    delivery_fee = order.delivery_fee
     if delivery_fee > 0:
         lines.append(f"Taxa Entrega: R${delivery_fee:.2f}".rjust(w))
     
     # Total
-    total = float(order.get('total', 0) or 0)
+    total = order.total
     lines.append("")
     lines.append(("TOTAL: R$ %.2f" % total).rjust(w))
     lines.append("")
     
     # Observações gerais
-    notes = order.get('notes')
+    notes = order.notes
     if notes:
         lines.append("-" * w)
         lines.append("OBSERVACOES:")
@@ -307,104 +407,584 @@ def format_receipt(order: Dict) -> str:
     return "\n".join(lines)
 
 
+def render_receipt(order: Order) -> bytes:
+    """Bytes do recibo prontos para a impressora, reaproveitando o cache."""
+    cached = RECEIPTS.get(order.id, order.updated_at)
+    if cached is not None:
+        return cached.data
+    data = encode_receipt(format_receipt(order))
+    RECEIPTS.put(order, data)
+    return data
+
+
 # ============ IMPRESSÃO ============
 def print_raw(text: str) -> bool:
-    """Envia texto para a impressora do Windows."""
-    if not win32print:
-        print(">>> SIMULACAO (win32print não instalado) <<<")
-        print("-" * 40)
-        print(text)
-        print("-" * 40)
+    """Envia texto para a impressora pelo backend configurado."""
+    return send_receipt(encode_receipt(text))
+
+
+def send_receipt(data: bytes, order_id: Optional[str] = None) -> bool:
+    """Envia bytes já codificados para a impressora."""
+    start = time.perf_counter()
+    printed = PRINTER.send(data)
+    if RECORDER and order_id:
+        RECORDER.record_print(order_id, printed, (time.perf_counter() - start) * 1000, len(data),
+                              PRINTER.last_error)
+    if printed:
+        PRINTER_BREAKER.record_success()
         return True
-    
-    if not PRINTER_NAME:
-        print("[ERRO] Nenhuma impressora configurada ou detectada!")
+    PRINTER_BREAKER.record_failure()
+    log.error(f"Erro na impressora: {PRINTER.last_error}", extra=fields(stage="print", printer=PRINTER.describe()))
+    return False
+
+
+def ack_order(order: Order):
+    """Marca o pedido como impresso no banco e registra o log."""
+    order_id = order.id
+    if order_id not in PENDING_ACKS:
+        # Primeira confirmação (papel confirmado): conta o ticket uma vez só
+        STATS.record_ticket(len(order.items), wait_ms_since(order.created_at), SEND_MS.pop(order_id, None))
+    start = time.perf_counter()
+    if mark_order_printed(order_id):
+        PENDING_ACKS.pop(order_id, None)
+        CONTROL.record_job(order_id, JOB_PRINTED)
+        log.info(f"Pedido {order.short_id} impresso e marcado com sucesso",
+                 extra=fields(order_id=order_id, stage="ack", latency_ms=(time.perf_counter() - start) * 1000))
+        log_print_event(order, 'print', 'success')
+    elif order_id not in PENDING_ACKS:
+        # Já está no papel: não reimprime, só repete a confirmação nos próximos ciclos
+        PENDING_ACKS[order_id] = order
+        log.warning(f"Pedido {order.short_id} impresso, mas falhou ao marcar no banco. Tentando novamente...",
+                    extra=fields(order_id=order_id, stage="ack"))
+
+
+def retry_pending_acks():
+    """Repete as confirmações que falharam (pedidos já impressos)."""
+    for order in list(PENDING_ACKS.values()):
+        if order.id not in PENDING_ACKS:
+            continue
+        ack_order(order)
+        if order.id in PENDING_ACKS:
+            # Servidor ainda fora: tenta o restante no próximo ciclo
+            break
+
+
+def settle_spooled_jobs():
+    """Confirma os trabalhos que saíram do spooler e descarta os que ficaram presos."""
+    done, failed = HEALTH.reap()
+    for order in done:
+        ack_order(order)
+    if failed:
+        # Os pedidos voltam a ser despachados mesmo que a lista não mude
+        API.invalidate_poll_cache()
+    for order, reason in failed:
+        SEND_MS.pop(order.id, None)
+        log.error(f"Pedido {order.short_id} {reason}; será reimpresso", extra=fields(order_id=order.id, stage="spool"))
+        CONTROL.record_job(order.id, JOB_FAILED, detail=reason)
+        STATS.record_failure(PRINTER.describe())
+        log_print_event(order, 'print', 'failed', f'Trabalho removido do spooler: {reason}')
+
+
+def wait_next_poll():
+    """Aguarda o próximo ciclo, confirmando os trabalhos do spooler no meio tempo.
+
+    Retorna antes do prazo quando a API local pede uma ação.
+    """
+    deadline = time.monotonic() + POLL_INTERVAL
+    while HEALTH.in_flight_count():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if CONTROL.wait(min(HEALTH.interval, remaining)):
+            return
+        settle_spooled_jobs()
+    CONTROL.wait(deadline - time.monotonic())
+
+
+def reprint_order(order_id: str) -> bool:
+    """Imprime o pedido de novo, sem alterar o status no banco.
+
+    Usa o recibo guardado quando existe (aceita o número curto de 8
+    caracteres); senão busca o pedido no servidor.
+    """
+    start = time.perf_counter()
+    cached = RECEIPTS.find(order_id)
+    if cached is not None:
+        order, data = cached.order, cached.data
+    else:
+        order, error = None, "Pedido não encontrado nos recibos guardados"
+        if _is_uuid(order_id):
+            order, error = API.get_order(order_id), API.last_error
+        if order is None:
+            log.warning(f"Reimpressão do pedido {order_id[:8]} falhou: {error}",
+                        extra=fields(order_id=order_id, stage="reprint"))
+            CONTROL.record_job(order_id, JOB_REPRINT_FAILED, detail=error)
+            return False
+        with stage("render"):
+            data = render_receipt(order)
+    
+    order_id = order.id
+    with stage("write"):
+        printed = send_receipt(data, order_id)
+    latency_ms = (time.perf_counter() - start) * 1000
+    if not printed:
+        CONTROL.record_job(order_id, JOB_REPRINT_FAILED, latency_ms, PRINTER.last_error)
+        log_print_event(order, 'reprint', 'failed', 'Falha na impressão')
         return False
-    
+    log.info(f"Pedido {order.short_id} reimpresso", extra=fields(order_id=order_id, stage="reprint",
+                                                                 latency_ms=latency_ms, cached=cached is not None))
+    CONTROL.record_job(order_id, JOB_REPRINTED, latency_ms)
+    STATS.record_reprint()
+    log_print_event(order, 'reprint', 'success')
+    return True
+
+
+def _is_uuid(value: str) -> bool:
     try:
-        hprinter = win32print.OpenPrinter(PRINTER_NAME)
-        try:
-            job = win32print.StartDocPrinter(hprinter, 1, ("Pedido", None, "RAW"))
-            try:
-                win32print.StartPagePrinter(hprinter)
-                # cp850 é o padrão para acentos em impressoras térmicas brasileiras
-                win32print.WritePrinter(hprinter, text.encode('cp850', errors='replace'))
-                win32print.EndPagePrinter(hprinter)
-            finally:
-                win32print.EndDocPrinter(hprinter)
-        finally:
-            win32print.ClosePrinter(hprinter)
-        return True
-    except Exception as e:
-        print(f"[ERRO IMPRESSORA] {e}")
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+def process_control_requests():
+    """Executa as ações enfileiradas pela API local."""
+    for order_id in CONTROL.take_reprints():
+        reprint_order(order_id)
+    for text, on_done in CONTROL.take_prints():
+        on_done(print_raw(text))
+    if CONTROL.take_poll_request():
+        # Verificação forçada: despacha a lista completa mesmo que não tenha mudado
+        API.invalidate_poll_cache()
+    if CONTROL.take_calibration_request():
+        # Começa com a fila vazia para a medida não incluir pedidos anteriores
+        deadline = time.monotonic() + HEALTH.spool_timeout
+        while HEALTH.in_flight_count() and time.monotonic() < deadline:
+            time.sleep(HEALTH.interval)
+            settle_spooled_jobs()
+        run_calibration()
+
+
+# ============ CALIBRAÇÃO ============
+def printer_capacity() -> Optional[Dict]:
+    """Capacidade da impressora ativa pelo perfil salvo (None se nunca calibrada)."""
+    profile = PROFILES.get(PRINTER.describe())
+    if profile is None:
+        return None
+    return capacity_report(profile, TICKET_LINES.value, STATS.peak_hour())
+
+
+def run_calibration() -> bool:
+    """Imprime a série de calibração e salva o perfil da impressora."""
+    log.info("Calibrando a impressora...", extra=fields(stage="calibrate", printer=PRINTER.describe()))
+    try:
+        profile = calibrate(PRINTER, PAPER_WIDTH,
+                            on_progress=lambda message: log.info(message, extra=fields(stage="calibrate")))
+    except CalibrationError as e:
+        log.error(f"Calibração falhou: {e}", extra=fields(stage="calibrate"))
+        return False
+    PROFILES.put(profile)
+    TICKET_LINES.refresh()
+    report = printer_capacity()
+    log.info(format_capacity(report).replace("\n", "; "), extra=fields(stage="calibrate", **report))
+    return True
+
+
+def estimated_print_ms(order: Order) -> float:
+    """Tempo de impressão do pedido pelo perfil da calibração (0 se nunca calibrada)."""
+    profile = PROFILES.get(PRINTER.describe())
+    return profile.ticket_ms(estimate_ticket_lines(order)) if profile else 0.0
+
+
+# ============ FILA DE DESPACHO ============
+def refresh_prep_times():
+    """Atualiza as estimativas de preparo com os pedidos que ficaram prontos."""
+    history = API.get_prep_history()
+    SCHEDULER.update_history(history)
+    if history is None:
+        log.warning(f"Histórico de preparo indisponível: {API.last_error}", extra=fields(stage="schedule"))
+        return
+    prep = SCHEDULER.prep.snapshot()
+    log.info(f"Tempos de preparo atualizados: {prep['orders']} pedidos, {prep['products']} produtos",
+             extra=fields(stage="schedule", **prep))
+
+
+def dispatch_order(order: Order) -> bool:
+    """Formata e envia um pedido para a impressora. Retorna False se falhou."""
+    customer = order.customer_name or 'Cliente'
+    log.info(f"Imprimindo pedido {order.short_id}... ({customer})", extra=fields(order_id=order.id, stage="dispatch"))
+    
+    start = time.perf_counter()
+    with stage("render"):
+        data = render_receipt(order)
+    rendered = time.perf_counter()
+    
+    with stage("write"):
+        printed = send_receipt(data, order.id)
+    if not printed:
+        CONTROL.record_job(order.id, JOB_FAILED, (time.perf_counter() - start) * 1000, PRINTER.last_error)
+        STATS.record_failure(PRINTER.describe())
+        log_print_event(order, 'print', 'failed', 'Falha na impressão')
         return False
+    
+    sent = time.perf_counter()
+    CONTROL.record_job(order.id, JOB_SENT, (sent - start) * 1000)
+    SEND_MS[order.id] = (sent - start) * 1000
+    log.debug("Recibo enviado", extra=fields(order_id=order.id, stage="print", latency_ms=(sent - start) * 1000,
+                                               render_ms=round((rendered - start) * 1000, 2),
+                                               write_ms=round((sent - rendered) * 1000, 2)))
+    if HEALTH.track(order.id, order, PRINTER.last_job_id):
+        log.info(f"Pedido {order.short_id} enviado ao spooler, aguardando a impressora",
+                 extra=fields(order_id=order.id, stage="spool"))
+    else:
+        ack_order(order)
+    return True
+
+
+# ============ SUPERVISOR ============
+def handoff_state() -> Dict:
+    """Estado que o próximo processo precisa para não reimprimir nem baixar tudo de novo."""
+    return {
+        "pending_acks": [order.to_json() for order in PENDING_ACKS.values()],
+        "in_flight": [{"order": order.to_json(), "job_id": job_id, "age": round(age, 1)}
+                      for order, job_id, age in HEALTH.in_flight_jobs()],
+        "poll": API.poll_cursor(),
+    }
+
+
+def report_to_supervisor():
+    """Sinal de vida e estado atual para o supervisor (--supervise)."""
+    if SUPERVISED:
+        SUPERVISED.beat(handoff_state())
+
+
+def restore_handoff():
+    """Retoma o estado deixado pelo processo anterior, quando reaberto pelo supervisor."""
+    state = SUPERVISED.load() if SUPERVISED else None
+    if not state:
+        return
+    age = time.time() - state.get("beat_at", 0)
+    try:
+        # Já estão no papel: só falta a confirmação no banco
+        for data in state.get("pending_acks", []):
+            order = Order.from_json(data)
+            PENDING_ACKS[order.id] = order
+        jobs = 0
+        if age <= HANDOFF_MAX_AGE:
+            for job in state.get("in_flight", []):
+                order = Order.from_json(job["order"])
+                if HEALTH.track(order.id, order, job["job_id"], age=job["age"] + age):
+                    jobs += 1
+            if state.get("poll"):
+                API.restore_poll_cursor(state["poll"])
+    except (ValueError, KeyError, TypeError) as e:
+        log.warning(f"Estado do processo anterior ignorado: {e}", extra=fields(stage="supervisor"))
+        return
+    SUPERVISED.restored = {"pending_acks": len(PENDING_ACKS), "in_flight": jobs}
+    log.info(f"Reaberto pelo supervisor ({SUPERVISED.reason or 'primeira execução'}): "
+             f"{len(PENDING_ACKS)} confirmações pendentes e {jobs} trabalhos no spooler retomados",
+             extra=fields(stage="supervisor", restarts=SUPERVISED.restarts, **SUPERVISED.restored))
+
+
+def worker_command(argv: List[str]) -> List[str]:
+    """Linha de comando do serviço supervisionado (a mesma, sem --supervise)."""
+    args = [arg for arg in argv if arg != "--supervise"]
+    if getattr(sys, 'frozen', False):
+        return [sys.executable] + args
+    return [sys.executable, os.path.abspath(__file__)] + args
 
 
 # ============ LOOP PRINCIPAL ============
+def parse_args(argv=None):
+    """Opções de linha de comando."""
+    parser = argparse.ArgumentParser(description="Serviço de impressão de pedidos")
+    parser.add_argument("--profile", action="store_true",
+                        help="ativa o modo de diagnóstico (tempos por etapa, amostragem e memória)")
+    parser.add_argument("--reprint", metavar="PEDIDO",
+                        help="reimprime um pedido (id ou número de 8 caracteres) e encerra")
+    parser.add_argument("--list-receipts", action="store_true",
+                        help="lista os recibos guardados para reimpressão e encerra")
+    parser.add_argument("--summary", nargs="?", const="", metavar="AAAA-MM-DD",
+                        help="imprime o resumo do dia (padrão: hoje) e encerra")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="imprime a série de calibração, mostra a capacidade da impressora e encerra")
+    parser.add_argument("--record", nargs="?", const="", metavar="ARQUIVO",
+                        help="grava as buscas e impressões (padrão: logs/captura-*.jsonl.gz)")
+    parser.add_argument("--supervise", action="store_true",
+                        help="roda o serviço como processo filho e o reabre se cair, travar ou crescer demais")
+    return parser.parse_args(argv)
+
+
+def list_receipts():
+    """Mostra os recibos guardados, do mais recente para o mais antigo."""
+    entries = RECEIPTS.recent()
+    if not entries:
+        print("Nenhum recibo guardado.")
+    for entry in entries:
+        order = entry.order
+        when = time.strftime("%d/%m %H:%M", time.localtime(entry.stored_at))
+        print(f"{order.short_id}  {when}  {order.order_type:<8}  {order.customer_name or '-'}  "
+              f"({len(order.items)} itens)")
+
+
+def handed_to_service(status: Optional[int], action: str, **extra) -> Optional[int]:
+    """Fecha um comando de linha de comando entregue ao serviço em execução.
+
+    Recebe o código HTTP da API local (None: nenhum serviço respondeu) e
+    retorna o código de saída, ou None para o comando ser feito aqui mesmo.
+    """
+    if status is None:
+        return None
+    if status == 202:
+        log.info(f"{action}: enviado ao serviço em execução", extra=fields(**extra))
+    else:
+        log.warning(f"{action}: recusado pelo serviço em execução (HTTP {status})",
+                    extra=fields(status=status, **extra))
+    PRINTER.close()
+    API.close()
+    shutdown_logging()
+    return 0 if status == 202 else 1
+
+
+def run_summary(day: str) -> int:
+    """Imprime o ticket de fechamento do dia. Retorna o código de saída."""
+    try:
+        summary = STATS.day_summary(date.fromisoformat(day) if day else None)
+    except ValueError:
+        print(f"Data inválida: {day} (use AAAA-MM-DD)")
+        return 2
+    texto = format_summary(summary, PAPER_WIDTH)
+    print(texto)
+    # Com um serviço rodando, ele imprime: é quem está com a impressora
+    code = handed_to_service(request_service_print(cfg, BASE_PATH, texto), "Resumo do dia", stage="summary")
+    if code is not None:
+        return code
+    printed = print_raw(texto)
+    PRINTER.close()
+    shutdown_logging()
+    return 0 if printed else 1
+
+
+def run_calibrate() -> int:
+    """Calibra a impressora pela linha de comando. Retorna o código de saída.
+
+    Com um serviço rodando, a calibração é feita por ele (POST /calibrate),
+    sem os pedidos dele no meio da série e sem uma segunda conexão com a
+    impressora; a capacidade aparece no log e no /status do serviço.
+    """
+    code = handed_to_service(request_service_calibration(cfg, BASE_PATH), "Calibração da impressora",
+                             stage="calibrate")
+    if code is not None:
+        return code
+    calibrated = run_calibration()
+    if calibrated:
+        print("")
+        print(format_capacity(printer_capacity()))
+    PRINTER.close()
+    shutdown_logging()
+    return 0 if calibrated else 1
+
+
+def run_reprint(order_id: str) -> int:
+    """Reimprime um pedido pela linha de comando. Retorna o código de saída.
+
+    Com a API local ligada, o pedido vai para o serviço em execução, que é
+    quem usa a impressora; só imprime direto se nenhum serviço responder.
+    """
+    cached = RECEIPTS.find(order_id)
+    full_id = cached.order.id if cached is not None else order_id
+    status = request_service_reprint(cfg, BASE_PATH, full_id) if _is_uuid(full_id) else None
+    code = handed_to_service(status, f"Reimpressão do pedido {full_id[:8]}", order_id=full_id, stage="reprint")
+    if code is not None:
+        return code
+    printed = reprint_order(order_id)
+    STATS.flush()
+    PRINTER.close()
+    API.close()
+    shutdown_logging()
+    return 0 if printed else 1
+
+
 def main():
     """Loop principal do serviço de impressão."""
+    global RECORDER
+    args = parse_args()
+    if args.supervise:
+        # O supervisor não abre a impressora nem o Supabase: só vigia o filho
+        from supervisor import run_supervisor
+        sys.exit(run_supervisor(BASE_PATH, worker_command(sys.argv[1:])))
+    setup()
+    from supabase_api import HEARTBEAT_INTERVAL
+    
+    if args.list_receipts:
+        list_receipts()
+        shutdown_logging()
+        return
+    if args.reprint:
+        sys.exit(run_reprint(args.reprint))
+    if args.summary is not None:
+        sys.exit(run_summary(args.summary))
+    if args.calibrate:
+        sys.exit(run_calibrate())
+    
     print("=" * 50)
     print(" SISTEMA DE IMPRESSAO DE PEDIDOS v2.0")
     print("=" * 50)
     print(f" Restaurante: {RESTAURANT_ID[:20]}..." if len(RESTAURANT_ID) > 20 else f" Restaurante: {RESTAURANT_ID}")
-    print(f" Impressora:  {PRINTER_NAME or 'SIMULACAO'}")
-    print(f" Intervalo:   {POLL_INTERVAL}s")
+    print(f" Impressora:  {PRINTER.describe()}")
+    print(f" Intervalo:   {POLL_INTERVAL:g}s")
     print("=" * 50)
     print(" Aguardando pedidos... (Ctrl+C para sair)")
     print("")
-    
-    consecutive_errors = 0
-    max_errors = 10
+    log.info("Serviço iniciado", extra=fields(stage="startup", printer=PRINTER.describe(),
+                                              poll_interval=POLL_INTERVAL))
+    if args.profile:
+        profiler.enable(os.path.join(BASE_PATH, "logs"))
+        log.info("Modo de diagnóstico ativo (--profile)", extra=fields(stage="profile"))
+    if args.record is not None:
+        RECORDER = CaptureWriter(args.record or default_capture_path(BASE_PATH), poll_interval=POLL_INTERVAL)
+        log.info(f"Gravando tráfego em {RECORDER.path}", extra=fields(stage="record"))
+    
+    control_server = None
+    if control_api_enabled(cfg):
+        # http.server só é carregado quando a API local está ligada
+        from control_api import create_control_server
+        try:
+            control_server = create_control_server(
+                cfg, CONTROL, BASE_PATH, notify=lambda message, **extra: log.info(message, extra=fields(stage="control", **extra)))
+        except OSError as e:
+            log.error(f"API local não iniciada: {e}", extra=fields(stage="control"))
+    if control_server:
+        control_server.start()
+        log.info(f"API local em http://127.0.0.1:{control_server.port}", extra=fields(stage="control"))
+    
+    backoff = Backoff(POLL_INTERVAL)
+    printer_was_healthy = True
+    server_was_online = True
+    next_heartbeat = 0.0
+    # False quando algum pedido da última lista ficou sem despachar
+    dispatch_complete = False
+    
+    HEALTH.start()
+    restore_handoff()
     
     while True:
         try:
+            report_to_supervisor()
+            if SUPERVISED and SUPERVISED.stop_requested():
+                log.info("Saída pedida pelo supervisor", extra=fields(stage="supervisor"))
+                break
+            
+            with stage("settle"):
+                settle_spooled_jobs()
+                retry_pending_acks()
+            process_control_requests()
+            if STATS.flush_if_due() or not TICKET_LINES.measured:
+                # Pedido típico para a capacidade no /status, fora da thread da API
+                TICKET_LINES.refresh()
+            
+            health = HEALTH.health
+            if health.healthy != printer_was_healthy:
+                if health.healthy:
+                    log.info("Impressora normalizada. Retomando impressão.", extra=fields(stage="health"))
+                else:
+                    log.warning(f"Impressora com problema ({health.describe()}). Pedidos retidos.",
+                                extra=fields(stage="health", **health.to_dict()))
+                printer_was_healthy = health.healthy
+            
             orders = get_pending_orders()
+            CONTROL.record_poll(len(orders) if orders is not None else None)
+            if not STARTUP.done:
+                STARTUP.mark("first_poll")
+                STARTUP.done = True
+                log.info(f"Primeira verificação {STARTUP.total_ms:.0f} ms após iniciar",
+                         extra=fields(stage="startup", latency_ms=STARTUP.total_ms, phases=STARTUP.to_dict()))
+            
+            if orders is None:
+                # Servidor fora do ar: espera crescente, sem encerrar o serviço
+                if server_was_online:
+                    log.warning(f"{API.last_error}. Tentando novamente...", extra=fields(stage="poll"))
+                    server_was_online = False
+                CONTROL.wait(backoff.next_delay())
+                continue
+            
+            if not server_was_online:
+                log.info("Conexão restabelecida.", extra=fields(stage="poll"))
+                server_was_online = True
+            backoff.reset()
+            
+            if time.monotonic() >= next_heartbeat:
+                API.send_heartbeat(pending_orders=len(orders), is_printing=bool(HEALTH.in_flight_count()))
+                next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+            if SCHEDULER.history_due():
+                refresh_prep_times()
             
+            # Impressão automática pausada pela API local: pedidos continuam pendentes
+            if CONTROL.paused:
+                dispatch_complete = False
+                wait_next_poll()
+                continue
+            
+            # Mesma lista da verificação anterior e tudo já despachado: nada a fazer
+            if API.unchanged and dispatch_complete:
+                wait_next_poll()
+                continue
+            
+            dispatch_complete = True
             if orders:
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Encontrados {len(orders)} pedidos pendentes")
+                log.info(f"Encontrados {len(orders)} pedidos pendentes", extra=fields(stage="poll", pending=len(orders)))
                 
-                for order in orders:
-                    order_id = order.get('id', 'N/A')
-                    customer = order.get('customer_name', 'Cliente')
-                    
-                    print(f"  > Imprimindo pedido {order_id[:8]}... ({customer})")
+                # Fora os que já estão no spooler ou impressos aguardando confirmação,
+                # na ordem da fila de despacho (menor prazo primeiro)
+                queue = SCHEDULER.plan([order for order in orders
+                                        if not HEALTH.is_in_flight(order.id) and order.id not in PENDING_ACKS])
+                for order in queue:
+                    # Impressora com problema ou fila cheia: pedido continua pendente
+                    if not HEALTH.can_dispatch() or not PRINTER_BREAKER.allow():
+                        dispatch_complete = False
+                        break
                     
-                    texto = format_receipt(order)
-                    
-                    if print_raw(texto):
-                        if mark_order_printed(order_id):
-                            log_print_event(order, 'print', 'success')
-                            print(f"    [OK] Impresso e marcado com sucesso")
-                        else:
-                            log_print_event(order, 'print', 'success', 'Falha ao atualizar status no banco')
-                            print(f"    [AVISO] Impresso, mas falhou ao marcar no banco")
+                    if dispatch_order(order):
+                        SCHEDULER.dispatched(order)
                     else:
-                        log_print_event(order, 'print', 'failed', 'Falha na impressão')
-                        print(f"    [ERRO] Falha na impressão")
-                
-                consecutive_errors = 0
+                        dispatch_complete = False
+                # Os trabalhos recém-enviados já valem para o próximo processo
+                report_to_supervisor()
             else:
-                # Mostra ponto a cada verificação para indicar que está rodando
-                print(".", end="", flush=True)
-                consecutive_errors = 0
+                log.debug("Nenhum pedido pendente", extra=fields(stage="poll"))
             
-            time.sleep(POLL_INTERVAL)
+            wait_next_poll()
             
         except KeyboardInterrupt:
-            print("\n\n[INFO] Encerrando serviço...")
+            log.info("Encerrando serviço...")
             break
         except Exception as e:
-            consecutive_errors += 1
-            print(f"\n[ERRO] Erro no loop principal: {e}")
-            
-            if consecutive_errors >= max_errors:
-                print(f"[FATAL] Muitos erros consecutivos ({max_errors}). Encerrando...")
-                break
-            
-            time.sleep(POLL_INTERVAL * 2)  # Espera mais em caso de erro
-    
-    print("\nServico encerrado.")
-    input("Pressione Enter para fechar...")
+            log.exception(f"Erro no loop principal: {e}")
+            time.sleep(backoff.next_delay())  # Espera mais a cada erro seguido
+    
+    if control_server:
+        control_server.stop()
+    report = profiler.disable()
+    if report:
+        log.info(f"Relatório de diagnóstico: {report}", extra=fields(stage="profile", report=report))
+    HEALTH.stop()
+    report_to_supervisor()
+    STATS.flush()
+    if RECORDER:
+        RECORDER.close()
+    PRINTER.close()
+    API.close()
+    polls = API.poll_stats.snapshot()
+    log.info(f"Verificações: {polls['polls']} ({polls['unchanged']} sem mudança), "
+             f"{polls['wire_bytes']} bytes recebidos, {polls['avg_idle_cpu_ms']:.2f} ms de CPU por verificação ociosa",
+             extra=fields(stage="shutdown", **polls))
+    stats = PRINTER.snapshot()
+    log.info(f"Impressora: {stats['jobs']} trabalhos, {stats['bytes_written']} bytes, "
+             f"{stats['bytes_per_second']:.0f} B/s, {stats['errors']} erros",
+             extra=fields(stage="shutdown", printer=stats))
+    log.info("Serviço encerrado.")
+    shutdown_logging()
+    pause_before_exit("Pressione Enter para fechar...")
 
 
 if __name__ == "__main__":
@@ -8,20 +8,29 @@ INSTALAÇÃO:
 1. pip install requests pywin32
 2. Configure o arquivo config.ini
 3. Execute: python print_service_gui.py
+   (use --profile para iniciar com o modo de diagnóstico ativo e
+   --record [ARQUIVO] para gravar o tráfego para o replay_capture.py)
 
 CRIAR EXECUTÁVEL:
 pip install pyinstaller
-pyinstaller --onefile --noconsole --name "ImpressoraPedidos" --icon=printer.ico print_service_gui.py
+pyinstaller --onedir --noconsole --name "ImpressoraPedidos" --icon=printer.ico print_service_gui.py
+(--onedir abre bem mais rápido que --onefile, que descompacta tudo a cada início)
 """
 
-import requests
+from startup import StartupTimer, preload
+
+import argparse
 import time
 import sys
 import os
 import threading
 import configparser
+import logging
+import queue
+import uuid
+from collections import deque
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Optional
 
 # GUI imports
 try:
@@ -37,9 +46,47 @@ try:
 except ImportError:
     win32print = None
 
+from dispatch_queue import create_dispatch_scheduler, estimate_ticket_lines
+from print_stats import create_print_stats, format_summary, wait_ms_since
+from printer_calibration import (
+    CalibrationError,
+    TicketLines,
+    calibrate,
+    capacity_report,
+    create_profile_store,
+    format_capacity,
+)
+from printer_backends import create_backend, encode_receipt
+from order_model import Order
+from printer_health import create_health_monitor
+from process_usage import process_snapshot
+from profiling import profiler, stage
+from receipt_cache import create_receipt_cache
+from resilience import Backoff, Resilience
+from service_control import (
+    JOB_FAILED,
+    JOB_PRINTED,
+    JOB_REPRINT_FAILED,
+    JOB_REPRINTED,
+    JOB_SENT,
+    ServiceControl,
+    control_api_enabled,
+)
+from service_log import fields, setup_logging, shutdown_logging
+from traffic_capture import CaptureWriter, default_capture_path
+
+# Linhas mantidas no log da janela (o histórico completo fica em logs/)
+MAX_LOG_LINES = 200
+
+# Intervalo de atualização da janela com o estado do serviço (ms)
+UI_REFRESH_MS = 500
+
 
 class PrintServiceApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=False, record=None):
+        # requests/supabase_api carregam em paralelo com o config e a janela
+        preload("supabase_api")
+        self.startup = StartupTimer()
         self.root = root
         self.root.title("Impressora de Pedidos")
         self.root.geometry("450x550")
@@ -51,28 +98,101 @@ class PrintServiceApp:
         self.print_thread = None
         self.orders_printed = 0
         self.last_check = None
+        # (conectado, mensagem); None até a primeira verificação
+        self.connection = None
+        self.start_profiling = profile
+        
+        # As outras threads não tocam no Tk: deixam mensagens e ações aqui,
+        # e refresh_ui() as aplica na thread da interface
+        self.ui_messages = deque(maxlen=MAX_LOG_LINES)
+        self.ui_calls = queue.SimpleQueue()
+        self._shown = {}
+        self._refresh_job = None
         
         # Load config
         self.config = self.load_config()
         if not self.config:
             return
         
-        # Setup UI
-        self.setup_ui()
+        # Log estruturado em logs/impressora.log (sem console no executável)
+        self.log = setup_logging(self.get_base_path(), console=False)
+        self.startup.mark("config")
         
-        # Start checking
+        # Backend de impressão
+        try:
+            self.printer = create_backend(self.config, self.get_configured_printer(), self.get_base_path())
+        except ValueError as e:
+            messagebox.showerror("Erro de Configuração", f"Configuração de impressão inválida:\n\n{e}")
+            self.root.destroy()
+            self.config = None
+            return
+        self.health = create_health_monitor(self.config, self.printer)
+        self.printer_was_healthy = True
+        
+        # Circuit breakers por endpoint e por impressora
+        self.resilience = Resilience(on_state_change=self.on_circuit_change)
+        # A conexão com o Supabase é criada pela thread de impressão (ver connect_api)
+        self.api = None
+        self.printer_breaker = self.resilience.breaker(f"printer:{self.printer.name}")
+        # Pedidos já impressos cuja confirmação no banco falhou
+        self.pending_acks = {}
+        # Tempo de envio (ms) dos pedidos ainda não confirmados (estatísticas)
+        self.send_ms = {}
+        # Recibos já renderizados (reimpressão rápida, inclusive sem internet)
+        self.receipts = create_receipt_cache(self.config, self.get_base_path())
+        # Linhas de um pedido típico para a capacidade no /status (ver TicketLines)
+        self.ticket_lines = TicketLines(self.receipts)
+        # Estatísticas por hora (resumo do dia sem consultar a nuvem)
+        self.stats = create_print_stats(self.config, self.get_base_path())
+        # Velocidade medida de cada impressora (Opções > Calibrar impressora)
+        self.profiles = create_profile_store(self.get_base_path())
+        # Ordem de despacho por prazo (tipo do pedido e tempo de preparo)
+        self.scheduler = create_dispatch_scheduler(self.config, self.printer.describe(),
+                                                   print_ms=self.estimated_print_ms)
+        # Gravação do tráfego (--record), para reproduzir com replay_capture.py
+        self.recorder = None
+        if record is not None:
+            self.recorder = CaptureWriter(record or default_capture_path(self.get_base_path()),
+                                          source="print_service_gui",
+                                          poll_interval=self.config.getfloat('SISTEMA', 'INTERVALO', fallback=5))
+        
+        # Estado exposto pela API local ([CONTROLE] no config.ini)
+        self.control = ServiceControl()
+        self.control.add_source("printer", self.printer.snapshot)
+        self.control.add_source("health", self.health.snapshot)
+        self.control.add_source("circuits", self.resilience.snapshot)
+        self.control.add_source("pending_acks", lambda: len(self.pending_acks))
+        self.control.add_source("receipts", self.receipts.snapshot)
+        self.control.add_source("today", self.stats.snapshot)
+        self.control.add_source("capacity", self.printer_capacity)
+        self.control.add_source("process", process_snapshot)
+        self.control.add_source("dispatch", self.scheduler.snapshot)
+        self.control_server = None
+        
+        # Start checking: a primeira verificação corre enquanto a janela é montada
         self.start_service()
+        
+        # Setup UI
+        self.setup_ui()
+        self.startup.mark("ui")
+        self.refresh_ui()
+        if self.start_profiling:
+            self.profile_var.set(True)
+            self.toggle_profiling()
+        self.notify("Serviço iniciado", stage="startup", printer=self.printer.describe())
+        self.start_control_server()
+    
+    def get_base_path(self):
+        """Pasta do executável (ou do script)"""
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
     
     def load_config(self):
         """Carrega configurações do arquivo config.ini"""
         config = configparser.ConfigParser()
         
-        if getattr(sys, 'frozen', False):
-            base_path = os.path.dirname(sys.executable)
-        else:
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        config_path = os.path.join(base_path, 'config.ini')
+        config_path = os.path.join(self.get_base_path(), 'config.ini')
         
         if not os.path.exists(config_path):
             messagebox.showerror(
@@ -289,8 +409,14 @@ class PrintServiceApp:
         options_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Opções", menu=options_menu)
         options_menu.add_command(label="Testar Impressão", command=self.test_print)
+        options_menu.add_command(label="Calibrar impressora...", command=self.request_calibration)
+        options_menu.add_command(label="Reimprimir pedido...", command=self.show_reprint_dialog)
+        options_menu.add_command(label="Imprimir resumo do dia", command=self.print_summary)
         options_menu.add_separator()
         options_menu.add_command(label="Abrir config.ini", command=self.open_config)
+        self.profile_var = tk.BooleanVar(value=profiler.enabled)
+        options_menu.add_checkbutton(label="Modo de diagnóstico", variable=self.profile_var,
+                                     command=self.toggle_profiling)
         options_menu.add_separator()
         options_menu.add_command(label="Sair", command=self.on_closing)
         
@@ -299,24 +425,75 @@ class PrintServiceApp:
         menubar.add_cascade(label="Ajuda", menu=help_menu)
         help_menu.add_command(label="Sobre", command=self.show_about)
     
-    def get_printer_name(self):
-        """Obtém nome da impressora configurada"""
+    def get_configured_printer(self):
+        """Obtém nome da impressora configurada (ou a padrão do Windows)"""
         printer = self.config.get('RESTAURANTE', 'IMPRESSORA', fallback='').strip()
         if not printer and win32print:
             try:
                 printer = win32print.GetDefaultPrinter()
             except Exception:
                 pass
-        return printer or "Padrão do Sistema"
+        return printer or None
     
-    def add_log(self, message):
-        """Adiciona mensagem ao log"""
+    def get_printer_name(self):
+        """Nome da impressora para exibição"""
+        if self.printer.kind != "windows":
+            return self.printer.describe()
+        return self.printer.name or "Padrão do Sistema"
+    
+    def add_log(self, message, when=None):
+        """Adiciona mensagem ao log (mantém só as últimas MAX_LOG_LINES)"""
         self.log_text.configure(state=tk.NORMAL)
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = (when or datetime.now()).strftime("%H:%M:%S")
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        # A última linha do widget é sempre vazia (depois do \n final)
+        lines = int(self.log_text.index("end-1c").split(".")[0]) - 1
+        if lines > MAX_LOG_LINES:
+            self.log_text.delete("1.0", f"{lines - MAX_LOG_LINES + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.configure(state=tk.DISABLED)
     
+    def notify(self, message, level=logging.INFO, exc_info=False, **extra):
+        """Registra o evento no log estruturado e mostra na janela"""
+        self.log.log(level, message, exc_info=exc_info, extra=fields(**extra))
+        self.ui_messages.append((datetime.now(), message))
+    
+    def run_in_ui(self, callback):
+        """Executa callback na thread da interface, na próxima atualização"""
+        self.ui_calls.put(callback)
+    
+    def refresh_ui(self):
+        """Aplica na janela o estado deixado pelas outras threads.
+        
+        Roda a cada UI_REFRESH_MS na thread da interface e só mexe nos
+        widgets que mudaram; as threads do serviço nunca agendam callbacks
+        no Tk, então nada se acumula com a janela minimizada.
+        """
+        self._refresh_job = None
+        if not self.running:
+            return
+        while self.ui_messages:
+            when, message = self.ui_messages.popleft()
+            self.add_log(message, when)
+        
+        if self.connection is not None and self.connection != self._shown.get("connection"):
+            self.update_status(*self.connection)
+            self._shown["connection"] = self.connection
+        if self.last_check is not None and self.last_check != self._shown.get("last_check"):
+            self.check_label.config(text=self.last_check.strftime("%H:%M:%S"))
+            self._shown["last_check"] = self.last_check
+        if self.orders_printed != self._shown.get("orders_printed", 0):
+            self.printed_label.config(text=str(self.orders_printed))
+            self._shown["orders_printed"] = self.orders_printed
+        
+        while True:
+            try:
+                callback = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        self._refresh_job = self.root.after(UI_REFRESH_MS, self.refresh_ui)
+    
     def update_status(self, connected, message=""):
         """Atualiza indicador de status"""
         if connected:
@@ -332,90 +509,328 @@ class PrintServiceApp:
     def start_service(self):
         """Inicia o serviço de verificação de pedidos"""
         self.running = True
+        self.health.start()
         self.print_thread = threading.Thread(target=self.print_loop, daemon=True)
         self.print_thread.start()
-        self.add_log("Serviço iniciado")
+    
+    def connect_api(self):
+        """Cria o cliente do Supabase (importa requests; roda na thread de impressão)"""
+        from supabase_api import SupabaseAPI
+        self.api = SupabaseAPI(
+            self.config.get('GERAL', 'SUPABASE_URL').strip(),
+            self.config.get('GERAL', 'SUPABASE_KEY').strip(),
+            self.config.get('RESTAURANTE', 'ID').strip(),
+            self.resilience,
+            client_version="3.0",
+        )
+        self.control.add_source("polls", self.api.poll_stats.snapshot)
+        self.startup.mark("api")
+    
+    def start_control_server(self):
+        """Inicia a API local de status e controle, se ativada no config.ini"""
+        if not control_api_enabled(self.config):
+            return
+        from control_api import create_control_server
+        try:
+            self.control_server = create_control_server(
+                self.config, self.control, self.get_base_path(),
+                notify=lambda message, **extra: self.notify(message, stage="control", **extra))
+        except OSError as e:
+            self.notify(f"API local não iniciada: {e}", logging.ERROR, stage="control")
+            return
+        if self.control_server:
+            self.control_server.start()
+            self.notify(f"API local em http://127.0.0.1:{self.control_server.port}", stage="control")
     
     def print_loop(self):
         """Loop principal de verificação e impressão"""
-        poll_interval = self.config.getint('SISTEMA', 'INTERVALO', fallback=5)
+        poll_interval = self.config.getfloat('SISTEMA', 'INTERVALO', fallback=5)
+        backoff = Backoff(poll_interval)
+        next_heartbeat = 0.0
+        # False quando algum pedido da última lista ficou sem despachar
+        dispatch_complete = False
         
         while self.running:
             try:
+                if self.api is None:
+                    # Falha aqui (config.ini incompleto, requests ausente) é
+                    # mostrada na janela e tentada de novo com espera crescente
+                    self.connect_api()
+                self.settle_spooled_jobs()
+                self.retry_pending_acks()
+                self.process_control_requests()
+                if self.stats.flush_if_due() or not self.ticket_lines.measured:
+                    # Pedido típico para a capacidade no /status, fora da thread da API
+                    self.ticket_lines.refresh()
+                self.check_printer_health()
+                
                 orders = self.get_pending_orders()
+                self.control.record_poll(len(orders) if orders is not None else None)
+                if not self.startup.done:
+                    self.startup.mark("first_poll")
+                    self.startup.done = True
+                    self.log.info(f"Primeira verificação {self.startup.total_ms:.0f} ms após iniciar",
+                                  extra=fields(stage="startup", latency_ms=self.startup.total_ms,
+                                               phases=self.startup.to_dict()))
                 
                 self.last_check = datetime.now()
-                self.root.after(0, lambda: self.check_label.config(
-                    text=self.last_check.strftime("%H:%M:%S")
-                ))
                 
                 if orders is None:
-                    self.root.after(0, lambda: self.update_status(False, "Erro de conexão"))
-                elif orders:
-                    self.root.after(0, lambda: self.update_status(True))
-                    for order in orders:
-                        self.print_order(order)
-                else:
-                    self.root.after(0, lambda: self.update_status(True))
+                    error = self.api.last_error or "Erro de conexão"
+                    self.connection = (False, error[:40])
+                    # Servidor fora do ar: espera crescente, sem encerrar
+                    self.control.wait(backoff.next_delay())
+                    continue
+                
+                backoff.reset()
+                self.connection = (True, "")
+                
+                if time.monotonic() >= next_heartbeat:
+                    from supabase_api import HEARTBEAT_INTERVAL
+                    self.api.send_heartbeat(pending_orders=len(orders),
+                                            is_printing=bool(self.health.in_flight_count()))
+                    next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+                if self.scheduler.history_due():
+                    self.refresh_prep_times()
+                
+                # Impressão automática pausada pela API local
+                if self.control.paused:
+                    dispatch_complete = False
+                    self.wait_next_poll(poll_interval)
+                    continue
                 
-                time.sleep(poll_interval)
+                # Mesma lista da verificação anterior e tudo já despachado
+                if self.api.unchanged and dispatch_complete:
+                    self.wait_next_poll(poll_interval)
+                    continue
+                
+                dispatch_complete = True
+                # Pedidos ainda não enviados, na ordem da fila de despacho (menor prazo primeiro)
+                queue = self.scheduler.plan([order for order in orders if not self.health.is_in_flight(order.id)
+                                             and order.id not in self.pending_acks])
+                for order in queue:
+                    if not self.health.can_dispatch() or not self.printer_breaker.allow():
+                        dispatch_complete = False
+                        break
+                    if self.print_order(order):
+                        self.scheduler.dispatched(order)
+                    else:
+                        dispatch_complete = False
+                
+                self.wait_next_poll(poll_interval)
                 
             except Exception as e:
-                self.root.after(0, lambda: self.add_log(f"Erro: {str(e)}"))
-                time.sleep(poll_interval * 2)
-    
-    def get_pending_orders(self) -> List[Dict]:
-        """Busca pedidos pendentes"""
-        supabase_url = self.config.get('GERAL', 'SUPABASE_URL').strip()
-        supabase_key = self.config.get('GERAL', 'SUPABASE_KEY').strip()
-        restaurant_id = self.config.get('RESTAURANTE', 'ID').strip()
-        
-        endpoint = f"{supabase_url}/rest/v1/orders"
-        
-        params = {
-            "select": "*,order_items(*)",
-            "restaurant_id": f"eq.{restaurant_id}",
-            "print_status": "eq.pending",
-            "order": "created_at.asc"
-        }
-        
-        headers = {
-            "apikey": supabase_key,
-            "Authorization": f"Bearer {supabase_key}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            response = requests.get(endpoint, params=params, headers=headers, timeout=15)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.Timeout:
-            return None
-        except requests.exceptions.ConnectionError:
-            return None
-        except Exception:
+                if self.api is None:
+                    self.connection = (False, f"Erro: {e}"[:40])
+                    self.notify(f"Erro ao conectar ao servidor: {e}", logging.ERROR, stage="startup", exc_info=True)
+                else:
+                    self.notify(f"Erro: {str(e)}", logging.ERROR, stage="loop", exc_info=True)
+                time.sleep(backoff.next_delay())
+    
+    def on_circuit_change(self, name, old, new):
+        """Registra no log a abertura/fechamento dos circuit breakers"""
+        labels = {"closed": "normalizado", "open": "suspenso", "half_open": "testando"}
+        level = logging.WARNING if new == "open" else logging.INFO
+        self.notify(f"Circuito {name}: {labels.get(new, new)}", level, stage="circuit", circuit=name, state=new)
+    
+    def wait_next_poll(self, poll_interval):
+        """Aguarda o próximo ciclo, confirmando os trabalhos do spooler no meio tempo"""
+        deadline = time.monotonic() + poll_interval
+        while self.running and self.health.in_flight_count():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.control.wait(min(self.health.interval, remaining)):
+                return
+            self.settle_spooled_jobs()
+        self.control.wait(deadline - time.monotonic())
+    
+    def process_control_requests(self):
+        """Executa as ações enfileiradas pela API local"""
+        for order_id in self.control.take_reprints():
+            self.reprint_order(order_id)
+        for text, on_done in self.control.take_prints():
+            on_done(self.print_raw(text))
+        if self.control.take_poll_request():
+            self.api.invalidate_poll_cache()
+        if self.control.take_calibration_request():
+            # Começa com a fila vazia para a medida não incluir pedidos anteriores
+            deadline = time.monotonic() + self.health.spool_timeout
+            while self.health.in_flight_count() and time.monotonic() < deadline:
+                time.sleep(self.health.interval)
+                self.settle_spooled_jobs()
+            self.run_calibration()
+    
+    def estimated_print_ms(self, order):
+        """Tempo de impressão do pedido pelo perfil da calibração (0 se nunca calibrada)"""
+        profile = self.profiles.get(self.printer.describe())
+        return profile.ticket_ms(estimate_ticket_lines(order)) if profile else 0.0
+    
+    def refresh_prep_times(self):
+        """Atualiza as estimativas de preparo com os pedidos que ficaram prontos"""
+        history = self.api.get_prep_history()
+        self.scheduler.update_history(history)
+        if history is None:
+            self.log.warning(f"Histórico de preparo indisponível: {self.api.last_error}",
+                             extra=fields(stage="schedule"))
+            return
+        prep = self.scheduler.prep.snapshot()
+        self.log.info(f"Tempos de preparo atualizados: {prep['orders']} pedidos, {prep['products']} produtos",
+                      extra=fields(stage="schedule", **prep))
+    
+    def printer_capacity(self):
+        """Capacidade da impressora ativa pelo perfil salvo (None se nunca calibrada)"""
+        profile = self.profiles.get(self.printer.describe())
+        if profile is None:
             return None
+        return capacity_report(profile, self.ticket_lines.value, self.stats.peak_hour())
     
-    def print_order(self, order: Dict):
+    def run_calibration(self):
+        """Imprime a série de calibração e mostra a capacidade (thread do serviço)"""
+        self.notify("Calibrando a impressora...", stage="calibrate", printer=self.printer.describe())
+        width = self.config.getint('SISTEMA', 'LARGURA_PAPEL', fallback=48)
+        try:
+            profile = calibrate(self.printer, width,
+                                on_progress=lambda message: self.notify(message, stage="calibrate"))
+        except CalibrationError as e:
+            error = str(e)
+            self.notify(f"✗ Calibração falhou: {error}", logging.ERROR, stage="calibrate")
+            self.run_in_ui(lambda: messagebox.showerror("Calibração", f"A calibração falhou:\n\n{error}"))
+            return
+        self.profiles.put(profile)
+        self.ticket_lines.refresh()
+        report = self.printer_capacity()
+        self.notify("Calibração concluída", stage="calibrate", **report)
+        self.run_in_ui(lambda: messagebox.showinfo("Calibração", format_capacity(report)))
+    
+
+    def check_printer_health(self):
+        """Avisa no log quando a impressora entra ou sai de estado de erro"""
+        health = self.health.health
+        if health.healthy == self.printer_was_healthy:
+            return
+        self.printer_was_healthy = health.healthy
+        if health.healthy:
+            self.notify("Impressora normalizada", stage="health")
+        else:
+            problem = health.describe()
+            self.notify(f"⚠ Impressora: {problem}. Pedidos retidos", logging.WARNING, stage="health")
+    
+    def settle_spooled_jobs(self):
+        """Confirma os trabalhos que saíram do spooler e descarta os presos"""
+        done, failed = self.health.reap()
+        for order in done:
+            self.ack_order(order)
+        if failed:
+            self.api.invalidate_poll_cache()
+        for order, reason in failed:
+            self.send_ms.pop(order.id, None)
+            self.control.record_job(order.id, JOB_FAILED, detail=reason)
+            self.stats.record_failure(self.printer.describe())
+            self.notify(f"✗ Pedido #{order.short_id} {reason}; será reimpresso", logging.ERROR,
+                        order_id=order.id, stage="spool")
+    
+    def get_pending_orders(self) -> Optional[List[Order]]:
+        """Busca pedidos pendentes (None se o servidor não respondeu)"""
+        start = time.perf_counter()
+        orders = self.api.get_pending_orders()
+        if self.recorder:
+            self.recorder.record_poll(orders, self.api.unchanged, (time.perf_counter() - start) * 1000,
+                                      self.api.last_error)
+        return orders
+    
+    def print_order(self, order: Order) -> bool:
         """Imprime um pedido"""
-        order_id = order.get('id', 'N/A')
-        customer = order.get('customer_name', 'Cliente')
-        
-        self.root.after(0, lambda: self.add_log(f"Imprimindo pedido #{order_id[:8]}..."))
-        
-        texto = self.format_receipt(order)
-        
-        if self.print_raw(texto):
-            if self.mark_order_printed(order_id):
-                self.orders_printed += 1
-                self.root.after(0, lambda: self.printed_label.config(text=str(self.orders_printed)))
-                self.root.after(0, lambda: self.add_log(f"✓ Pedido #{order_id[:8]} impresso"))
-            else:
-                self.root.after(0, lambda: self.add_log(f"⚠ Impresso, erro ao marcar"))
+        order_id = order.id
+        
+        self.notify(f"Imprimindo pedido #{order_id[:8]}...", order_id=order_id, stage="dispatch")
+        start = time.perf_counter()
+        
+        with stage("render"):
+            data = self.render_receipt(order)
+        
+        with stage("write"):
+            printed = self.send_receipt(data, order_id)
+        if printed:
+            print_ms = (time.perf_counter() - start) * 1000
+            self.control.record_job(order_id, JOB_SENT, print_ms)
+            self.send_ms[order_id] = print_ms
+            # Pedidos no spooler só são confirmados depois que a impressora os recebe
+            if not self.health.track(order_id, order, self.printer.last_job_id):
+                self.ack_order(order)
+            return True
+        self.control.record_job(order_id, JOB_FAILED, (time.perf_counter() - start) * 1000,
+                                self.printer.last_error)
+        self.stats.record_failure(self.printer.describe())
+        self.notify(f"✗ Erro ao imprimir #{order_id[:8]}", logging.ERROR, order_id=order_id, stage="print",
+                    latency_ms=(time.perf_counter() - start) * 1000)
+        return False
+    
+    def ack_order(self, order: Order):
+        """Marca o pedido como impresso no banco"""
+        order_id = order.id
+        if order_id not in self.pending_acks:
+            # Primeira confirmação (papel confirmado): conta o ticket uma vez só
+            self.stats.record_ticket(len(order.items), wait_ms_since(order.created_at),
+                                     self.send_ms.pop(order_id, None))
+        start = time.perf_counter()
+        if self.mark_order_printed(order_id):
+            self.pending_acks.pop(order_id, None)
+            self.control.record_job(order_id, JOB_PRINTED)
+            self.orders_printed += 1
+            self.notify(f"✓ Pedido #{order_id[:8]} impresso", order_id=order_id, stage="ack",
+                        latency_ms=(time.perf_counter() - start) * 1000)
+        elif order_id not in self.pending_acks:
+            # Já está no papel: não reimprime, só repete a confirmação
+            self.pending_acks[order_id] = order
+            self.notify(f"⚠ Impresso, erro ao marcar. Tentando novamente...", logging.WARNING,
+                        order_id=order_id, stage="ack", error=self.api.last_error)
+    
+    def reprint_order(self, order_id: str) -> bool:
+        """Imprime o pedido de novo (recibo guardado ou buscado no servidor)"""
+        start = time.perf_counter()
+        cached = self.receipts.find(order_id)
+        if cached is not None:
+            order, data = cached.order, cached.data
         else:
-            self.root.after(0, lambda: self.add_log(f"✗ Erro ao imprimir #{order_id[:8]}"))
+            order, error = None, "não encontrado nos recibos guardados"
+            try:
+                uuid.UUID(order_id)
+            except ValueError:
+                pass
+            else:
+                order, error = self.api.get_order(order_id), self.api.last_error
+            if order is None:
+                self.control.record_job(order_id, JOB_REPRINT_FAILED, detail=error)
+                self.notify(f"✗ Reimpressão #{order_id[:8]}: {error}", logging.WARNING,
+                            order_id=order_id, stage="reprint")
+                return False
+            with stage("render"):
+                data = self.render_receipt(order)
+        
+        order_id = order.id
+        with stage("write"):
+            printed = self.send_receipt(data, order_id)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if not printed:
+            self.control.record_job(order_id, JOB_REPRINT_FAILED, latency_ms, self.printer.last_error)
+            self.api.log_print_event(order, 'reprint', 'failed', self.printer.name, 'Falha na impressão')
+            return False
+        self.control.record_job(order_id, JOB_REPRINTED, latency_ms)
+        self.stats.record_reprint()
+        self.notify(f"✓ Pedido #{order.short_id} reimpresso", order_id=order_id, stage="reprint",
+                    latency_ms=latency_ms)
+        self.api.log_print_event(order, 'reprint', 'success', self.printer.name)
+        return True
     
-    def format_receipt(self, order: Dict) -> str:
+    def retry_pending_acks(self):
+        """Repete as confirmações que falharam"""
+        for order_id, order in list(self.pending_acks.items()):
+            self.ack_order(order)
+            if order_id in self.pending_acks:
+                break
+    
+    def format_receipt(self, order: Order) -> str:
         """Formata o recibo para impressão"""
         w = self.config.getint('SISTEMA', 'LARGURA_PAPEL', fallback=48)
         lines = []
@@ -424,17 +839,12 @@ class PrintServiceApp:
         lines.append("NOVO PEDIDO".center(w))
         lines.append("=" * w)
         
-        dt = order.get('created_at', '')
-        if dt:
-            try:
-                parsed_dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
-                lines.append(parsed_dt.strftime("%d/%m/%Y %H:%M").center(w))
-            except Exception:
-                pass
+        if order.created_at:
+            lines.append(order.created_at.strftime("%d/%m/%Y %H:%M").center(w))
         
         lines.append("")
         
-        order_type = order.get('order_type', 'table')
+        order_type = order.order_type
         type_labels = {
             'table': 'MESA',
             'delivery': 'ENTREGA',
@@ -443,13 +853,13 @@ class PrintServiceApp:
         }
         lines.append(f"TIPO: {type_labels.get(order_type, order_type.upper())}")
         
-        customer_name = order.get('customer_name')
+        customer_name = order.customer_name
         if customer_name:
             lines.append(f"CLIENTE: {customer_name}")
         
         if order_type == 'delivery':
-            delivery_address = order.get('delivery_address')
-            delivery_phone = order.get('delivery_phone')
+            delivery_address = order.delivery_address
+            delivery_phone = order.delivery_phone
             if delivery_address:
                 lines.append(f"ENDERECO: {delivery_address}")
             if delivery_phone:
@@ -460,15 +870,15 @@ class PrintServiceApp:
         lines.append("ITENS:".center(w))
         lines.append("-" * w)
         
-        items = order.get('order_items', [])
+        items = order.items
         if not items:
             lines.append("(Sem itens)")
         else:
             for item in items:
-                qty = item.get('quantity', 1)
-                name = item.get('product_name', 'Item')
-                price = float(item.get('product_price', 0))
-                notes = item.get('notes', '')
+                qty = item.quantity
+                name = item.product_name
+                price = item.product_price
+                notes = item.notes
                 
                 item_line = f"{qty}x {name}"
                 price_str = f"R${price * qty:.2f}"
@@ -487,12 +897,12 @@ class PrintServiceApp:
         
         lines.append("-" * w)
         
-        total = float(order.get('total', 0) or 0)
+        total = order.total
         lines.append("")
         lines.append(("TOTAL: R$ %.2f" % total).rjust(w))
         lines.append("")
         
-        notes = order.get('notes')
+        notes = order.notes
         if notes:
             lines.append("-" * w)
             lines.append("OBSERVACOES:")
@@ -507,67 +917,41 @@ class PrintServiceApp:
         
         return "\n".join(lines)
     
+    def render_receipt(self, order: Order) -> bytes:
+        """Bytes do recibo prontos para a impressora, reaproveitando o cache"""
+        cached = self.receipts.get(order.id, order.updated_at)
+        if cached is not None:
+            return cached.data
+        data = encode_receipt(self.format_receipt(order))
+        self.receipts.put(order, data)
+        return data
+    
     def print_raw(self, text: str) -> bool:
         """Envia texto para a impressora"""
-        if not win32print:
-            self.root.after(0, lambda: self.add_log("(Simulação - win32print não disponível)"))
+        return self.send_receipt(encode_receipt(text))
+    
+    def send_receipt(self, data: bytes, order_id: Optional[str] = None) -> bool:
+        """Envia bytes já codificados para a impressora"""
+        if self.printer.kind == "console":
+            self.notify("(Simulação - win32print não disponível)", stage="print")
             return True
         
-        printer_name = self.config.get('RESTAURANTE', 'IMPRESSORA', fallback='').strip()
-        if not printer_name:
-            try:
-                printer_name = win32print.GetDefaultPrinter()
-            except Exception:
-                return False
-        
-        if not printer_name:
-            return False
-        
-        try:
-            hprinter = win32print.OpenPrinter(printer_name)
-            try:
-                job = win32print.StartDocPrinter(hprinter, 1, ("Pedido", None, "RAW"))
-                try:
-                    win32print.StartPagePrinter(hprinter)
-                    win32print.WritePrinter(hprinter, text.encode('cp850', errors='replace'))
-                    win32print.EndPagePrinter(hprinter)
-                finally:
-                    win32print.EndDocPrinter(hprinter)
-            finally:
-                win32print.ClosePrinter(hprinter)
+        start = time.perf_counter()
+        printed = self.printer.send(data)
+        if self.recorder and order_id:
+            self.recorder.record_print(order_id, printed, (time.perf_counter() - start) * 1000, len(data),
+                                       self.printer.last_error)
+        if printed:
+            self.printer_breaker.record_success()
             return True
-        except Exception as e:
-            self.root.after(0, lambda: self.add_log(f"Erro impressora: {str(e)}"))
-            return False
+        self.printer_breaker.record_failure()
+        error = self.printer.last_error
+        self.notify(f"Erro impressora: {error}", logging.ERROR, stage="print", printer=self.printer.describe())
+        return False
     
     def mark_order_printed(self, order_id: str) -> bool:
         """Marca pedido como impresso"""
-        supabase_url = self.config.get('GERAL', 'SUPABASE_URL').strip()
-        supabase_key = self.config.get('GERAL', 'SUPABASE_KEY').strip()
-        
-        endpoint = f"{supabase_url}/rest/v1/orders"
-        
-        params = {"id": f"eq.{order_id}"}
-        
-        headers = {
-            "apikey": supabase_key,
-            "Authorization": f"Bearer {supabase_key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=minimal"
-        }
-        
-        data = {
-            "print_status": "printed",
-            "printed_at": datetime.utcnow().isoformat() + "Z",
-            "print_count": 1
-        }
-        
-        try:
-            response = requests.patch(endpoint, params=params, json=data, headers=headers, timeout=10)
-            response.raise_for_status()
-            return True
-        except Exception:
-            return False
+        return self.api.mark_order_printed(order_id)
     
     def test_print(self):
         """Imprime uma página de teste"""
@@ -584,20 +968,87 @@ Data: {}
 ================================================
 """.format(datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
         
-        if self.print_raw(texto):
-            self.add_log("Teste de impressão enviado")
-            messagebox.showinfo("Teste", "Página de teste enviada para a impressora!")
+        def done(printed):
+            if printed:
+                self.notify("Teste de impressão enviado", stage="print")
+                self.run_in_ui(lambda: messagebox.showinfo("Teste", "Página de teste enviada para a impressora!"))
+            else:
+                self.run_in_ui(lambda: messagebox.showerror("Erro", "Não foi possível imprimir a página de teste."))
+        
+        # A impressão é feita pela thread do serviço, que é a única a usar a impressora
+        self.control.request_print(texto, done)
+    
+    def request_calibration(self):
+        """Pede confirmação e agenda a calibração na thread do serviço"""
+        if not messagebox.askyesno(
+                "Calibrar impressora",
+                "Serão impressos 4 tickets de teste (cerca de 50 cm de papel) para medir "
+                "a velocidade da impressora.\n\nContinuar?"):
+            return
+        self.control.request_calibration()
+    
+    def show_reprint_dialog(self):
+        """Lista os recibos guardados para reimpressão (funciona sem internet)"""
+        entries = self.receipts.recent()
+        if not entries:
+            messagebox.showinfo("Reimprimir", "Nenhum recibo guardado neste computador.")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Reimprimir pedido")
+        dialog.geometry("420x320")
+        dialog.transient(self.root)
+        
+        type_labels = {'table': 'Mesa', 'delivery': 'Entrega', 'takeout': 'Retirada', 'counter': 'Balcão'}
+        listbox = tk.Listbox(dialog, font=("Consolas", 9), activestyle=tk.NONE)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        for entry in entries:
+            order = entry.order
+            when = datetime.fromtimestamp(entry.stored_at).strftime("%d/%m %H:%M")
+            label = type_labels.get(order.order_type, order.order_type)
+            listbox.insert(tk.END, f"#{order.short_id}  {when}  {label:<8}  {order.customer_name or ''}")
+        listbox.selection_set(0)
+        
+        def reprint():
+            selection = listbox.curselection()
+            if not selection:
+                return
+            order = entries[selection[0]].order
+            # A impressão é feita pela thread do serviço, que é a única a usar a impressora
+            self.control.request_reprint(order.id)
+            self.notify(f"Reimpressão do pedido #{order.short_id} solicitada", order_id=order.id, stage="reprint")
+            dialog.destroy()
+        
+        listbox.bind("<Double-Button-1>", lambda event: reprint())
+        tk.Button(dialog, text="Reimprimir", command=reprint).pack(pady=(0, 10))
+    
+    def print_summary(self):
+        """Imprime o resumo do dia a partir das estatísticas locais"""
+        width = self.config.getint('SISTEMA', 'LARGURA_PAPEL', fallback=48)
+        texto = format_summary(self.stats.day_summary(), width)
+        
+        def done(printed):
+            if printed:
+                self.notify("Resumo do dia enviado", stage="summary")
+            else:
+                self.run_in_ui(lambda: messagebox.showerror("Erro", "Não foi possível imprimir o resumo do dia."))
+        
+        self.control.request_print(texto, done)
+    
+    def toggle_profiling(self):
+        """Liga/desliga o modo de diagnóstico do loop de impressão"""
+        if self.profile_var.get():
+            profiler.enable(os.path.join(self.get_base_path(), "logs"), target_thread=self.print_thread.ident)
+            self.notify("Modo de diagnóstico ativado", stage="profile")
         else:
-            messagebox.showerror("Erro", "Não foi possível imprimir a página de teste.")
+            report = profiler.disable()
+            if report:
+                self.notify("Relatório de diagnóstico gravado", stage="profile", report=report)
+                messagebox.showinfo("Diagnóstico", f"Relatório gravado em:\n\n{report}")
     
     def open_config(self):
         """Abre o arquivo de configuração"""
-        if getattr(sys, 'frozen', False):
-            base_path = os.path.dirname(sys.executable)
-        else:
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        config_path = os.path.join(base_path, 'config.ini')
+        config_path = os.path.join(self.get_base_path(), 'config.ini')
         os.startfile(config_path)
     
     def show_about(self):
@@ -614,12 +1065,32 @@ Data: {}
     def on_closing(self):
         """Fecha o aplicativo"""
         self.running = False
+        if self._refresh_job:
+            self.root.after_cancel(self._refresh_job)
+        if self.control_server:
+            self.control_server.stop()
+        profiler.disable()
+        self.health.stop()
+        self.stats.flush()
+        if self.recorder:
+            self.recorder.close()
+        self.printer.close()
+        if self.api:
+            self.api.close()
+        self.log.info("Serviço encerrado")
+        shutdown_logging()
         self.root.destroy()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Impressora de Pedidos")
+    parser.add_argument("--profile", action="store_true", help="inicia com o modo de diagnóstico ativo")
+    parser.add_argument("--record", nargs="?", const="", metavar="ARQUIVO",
+                        help="grava as buscas e impressões (padrão: logs/captura-*.jsonl.gz)")
+    args, _ = parser.parse_known_args()
+    
     root = tk.Tk()
-    app = PrintServiceApp(root)
+    app = PrintServiceApp(root, profile=args.profile, record=args.record)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
@@ -0,0 +1,467 @@
+"""
+Estatísticas locais de impressão, atualizadas a cada evento.
+
+Em vez de consultar `print_logs` na nuvem, o serviço mantém contadores por
+hora (tickets, itens, reimpressões, falhas por impressora) e histogramas de
+latência mescláveis. O resumo do dia é só a soma de até 24 buckets, então
+o ticket de fechamento sai em milissegundos e sem internet.
+
+Os dados ficam em `estatisticas.json` ao lado do executável, gravado no
+máximo a cada minuto. Como o serviço, a interface e a linha de comando
+(--reprint, --summary) podem usar o arquivo ao mesmo tempo, cada gravação
+relê o arquivo e soma só os eventos registrados desde a anterior, com o
+arquivo `estatisticas.json.lock` impedindo duas gravações simultâneas.
+Buckets por hora com mais de 7 dias são compactados em um bucket por dia;
+dias com mais de DIAS dias são descartados.
+
+[ESTATISTICAS]
+DIAS = 90      (dias de histórico guardados)
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# Buckets por hora mantidos antes de virarem um bucket por dia
+HOURLY_DAYS = 7
+
+# Espera pela trava do arquivo e idade a partir da qual ela é considerada
+# abandonada (processo encerrado no meio da gravação), em segundos
+LOCK_TIMEOUT = 5.0
+LOCK_STALE = 30.0
+
+
+class LatencySketch:
+    """Histograma logarítmico mesclável (erro relativo de ~2% nos percentis).
+
+    Cada valor cai no bucket ceil(log_gamma(valor)); somar os contadores de
+    dois sketches dá exatamente o sketch do conjunto unido.
+    """
+
+    __slots__ = ("relative_accuracy", "_log_gamma", "counts", "zeros", "count", "total", "max")
+
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.relative_accuracy = relative_accuracy
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self.counts: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= 1e-3:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def merge(self, other: "LatencySketch"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if rank < seen:
+                # Ponto médio do bucket: erro relativo <= relative_accuracy
+                return min(2 * gamma ** index / (gamma + 1), self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else None,
+            "p50": _round(self.quantile(0.5)),
+            "p90": _round(self.quantile(0.9)),
+            "p99": _round(self.quantile(0.99)),
+            "max": round(self.max, 1) if self.count else None,
+        }
+
+    def to_json(self) -> Dict:
+        return {"counts": {str(index): count for index, count in self.counts.items()}, "zeros": self.zeros,
+                "count": self.count, "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "LatencySketch":
+        sketch = cls()
+        sketch.counts = {int(index): int(count) for index, count in data.get("counts", {}).items()}
+        sketch.zeros = int(data.get("zeros", 0))
+        sketch.count = int(data.get("count", 0))
+        sketch.total = float(data.get("total", 0.0))
+        sketch.max = float(data.get("max", 0.0))
+        return sketch
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class StatsBucket:
+    """Contadores de uma hora (ou de um dia, depois de compactado)."""
+
+    __slots__ = ("tickets", "items", "reprints", "failures", "latency")
+
+    def __init__(self):
+        self.tickets = 0
+        self.items = 0
+        self.reprints = 0
+        # Falhas por impressora
+        self.failures: Dict[str, int] = {}
+        # Latências em ms: "wait" (pedido criado -> impressão confirmada) e "print" (render + envio)
+        self.latency: Dict[str, LatencySketch] = {}
+
+    def merge(self, other: "StatsBucket"):
+        self.tickets += other.tickets
+        self.items += other.items
+        self.reprints += other.reprints
+        for printer, count in other.failures.items():
+            self.failures[printer] = self.failures.get(printer, 0) + count
+        for name, sketch in other.latency.items():
+            self.latency.setdefault(name, LatencySketch()).merge(sketch)
+
+    def to_json(self) -> Dict:
+        return {"tickets": self.tickets, "items": self.items, "reprints": self.reprints,
+                "failures": self.failures,
+                "latency": {name: sketch.to_json() for name, sketch in self.latency.items()}}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "StatsBucket":
+        bucket = cls()
+        bucket.tickets = int(data.get("tickets", 0))
+        bucket.items = int(data.get("items", 0))
+        bucket.reprints = int(data.get("reprints", 0))
+        bucket.failures = {str(printer): int(count) for printer, count in data.get("failures", {}).items()}
+        bucket.latency = {name: LatencySketch.from_json(sketch) for name, sketch in data.get("latency", {}).items()}
+        return bucket
+
+
+def _copy_buckets(buckets: Dict[str, StatsBucket]) -> Dict[str, StatsBucket]:
+    copies = {}
+    for key, bucket in buckets.items():
+        copies[key] = StatsBucket()
+        copies[key].merge(bucket)
+    return copies
+
+
+class _FileLock:
+    """Trava entre processos: um arquivo criado com O_EXCL enquanto a gravação dura."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.acquired = False
+
+    def __enter__(self) -> bool:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                self.acquired = True
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+            except OSError:
+                return False
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            self.acquired = False
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def wait_ms_since(created_at: Optional[datetime]) -> Optional[float]:
+    """Milissegundos desde a criação do pedido (None se a data não tem fuso)."""
+    if created_at is None or created_at.tzinfo is None:
+        return None
+    return (datetime.now(timezone.utc) - created_at).total_seconds() * 1000
+
+
+def _hour_key(when: datetime) -> str:
+    return when.strftime("%Y-%m-%dT%H")
+
+
+class PrintStats:
+    """Buckets por hora em memória, gravados periodicamente em JSON.
+
+    `_hours`/`_days` refletem o arquivo na última leitura; os eventos novos
+    ficam em `_pending` até a próxima gravação somá-los ao arquivo.
+    """
+
+    def __init__(self, path: Optional[str], retention_days: int = 90, flush_interval: float = 60.0):
+        self.path = path
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        # "AAAA-MM-DDTHH" -> bucket da hora; "AAAA-MM-DD" -> bucket do dia (compactado)
+        self._hours: Dict[str, StatsBucket] = {}
+        self._days: Dict[str, StatsBucket] = {}
+        # Eventos ainda não gravados, por hora
+        self._pending: Dict[str, StatsBucket] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._compacted_on: Optional[date] = None
+        self._load()
+
+    # ---- eventos ----
+    def _bucket(self, when: Optional[datetime]) -> StatsBucket:
+        key = _hour_key(when or datetime.now())
+        bucket = self._pending.get(key)
+        if bucket is None:
+            bucket = self._pending[key] = StatsBucket()
+        self._dirty = True
+        return bucket
+
+    def _hour(self, key: str) -> StatsBucket:
+        """Bucket da hora somando o arquivo e os eventos não gravados (chamar com _lock)."""
+        bucket = StatsBucket()
+        for source in (self._hours, self._pending):
+            if key in source:
+                bucket.merge(source[key])
+        return bucket
+
+    def record_ticket(self, items: int, wait_ms: Optional[float] = None, print_ms: Optional[float] = None,
+                      when: Optional[datetime] = None):
+        with self._lock:
+            bucket = self._bucket(when)
+            bucket.tickets += 1
+            bucket.items += items
+            if wait_ms is not None:
+                bucket.latency.setdefault("wait", LatencySketch()).add(max(0.0, wait_ms))
+            if print_ms is not None:
+                bucket.latency.setdefault("print", LatencySketch()).add(print_ms)
+
+    def record_failure(self, printer: str, when: Optional[datetime] = None):
+        with self._lock:
+            bucket = self._bucket(when)
+            bucket.failures[printer] = bucket.failures.get(printer, 0) + 1
+
+    def record_reprint(self, when: Optional[datetime] = None):
+        with self._lock:
+            self._bucket(when).reprints += 1
+
+    # ---- consultas ----
+    def day_summary(self, day: Optional[date] = None) -> Dict:
+        """Totais do dia, tickets/itens por hora, falhas por impressora e percentis."""
+        day = day or date.today()
+        prefix = day.isoformat()
+        total = StatsBucket()
+        per_hour: List[Dict] = []
+        with self._lock:
+            compacted = self._days.get(prefix)
+            if compacted is not None:
+                total.merge(compacted)
+            for key in sorted(set(self._hours) | set(self._pending)):
+                if key.startswith(prefix):
+                    bucket = self._hour(key)
+                    total.merge(bucket)
+                    per_hour.append({"hour": int(key[-2:]), "tickets": bucket.tickets, "items": bucket.items})
+        return {
+            "day": prefix,
+            "tickets": total.tickets,
+            "items": total.items,
+            "reprints": total.reprints,
+            "failures": dict(total.failures),
+            "per_hour": per_hour,
+            "latency_ms": {name: sketch.summary() for name, sketch in total.latency.items()},
+        }
+
+    def peak_hour(self) -> int:
+        """Maior número de tickets numa mesma hora nos últimos HOURLY_DAYS dias."""
+        with self._lock:
+            tickets = {key: bucket.tickets for key, bucket in self._hours.items()}
+            for key, bucket in self._pending.items():
+                tickets[key] = tickets.get(key, 0) + bucket.tickets
+        return max(tickets.values(), default=0)
+
+    def snapshot(self) -> Dict:
+        summary = self.day_summary()
+        summary.pop("per_hour")
+        return summary
+
+    # ---- persistência ----
+    def _read(self):
+        """(horas, dias) do arquivo; ({}, {}) se não existe e None se está ilegível."""
+        if not self.path or not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return ({key: StatsBucket.from_json(value) for key, value in data.get("hours", {}).items()},
+                    {key: StatsBucket.from_json(value) for key, value in data.get("days", {}).items()})
+        except (OSError, ValueError, TypeError, AttributeError):
+            return None
+
+    def _load(self):
+        # Arquivo corrompido: recomeça sem histórico em vez de parar o serviço
+        self._hours, self._days = self._read() or ({}, {})
+
+    def _compact(self, hours: Dict[str, StatsBucket], days: Dict[str, StatsBucket], today: date) -> bool:
+        """Compacta os buckets informados; retorna True se algo mudou."""
+        hourly_cutoff = (today - timedelta(days=HOURLY_DAYS)).isoformat()
+        retention_cutoff = (today - timedelta(days=self.retention_days)).isoformat()
+        changed = False
+        for key in [key for key in hours if key[:10] < hourly_cutoff]:
+            days.setdefault(key[:10], StatsBucket()).merge(hours.pop(key))
+            changed = True
+        for key in [key for key in days if key < retention_cutoff]:
+            del days[key]
+            changed = True
+        return changed
+
+    def compact(self, today: Optional[date] = None):
+        """Junta as horas antigas em dias e descarta os dias fora da retenção."""
+        today = today or date.today()
+        with self._lock:
+            if self._compact(self._hours, self._days, today):
+                self._dirty = True
+        self._compacted_on = today
+
+    def flush_if_due(self) -> bool:
+        """Grava o arquivo se houve mudanças e o intervalo já passou (chamado pelo loop).
+
+        Retorna True quando gravou.
+        """
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Soma os eventos novos ao arquivo atual e grava; a memória passa a refletir o resultado."""
+        if self._compacted_on != date.today():
+            self.compact()
+        self._last_flush = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        with _FileLock(self.path + ".lock") as locked:
+            if not locked:
+                # Outro processo gravando: tenta de novo no próximo intervalo
+                return
+            stored = self._read()
+            with self._lock:
+                if stored is None:
+                    stored = _copy_buckets(self._hours), _copy_buckets(self._days)
+                hours, days = stored
+                pending, self._pending = self._pending, {}
+                for key, bucket in pending.items():
+                    hours.setdefault(key, StatsBucket()).merge(bucket)
+                self._compact(hours, days, date.today())
+                previous = self._hours, self._days
+                self._hours, self._days = hours, days
+                data = {
+                    "hours": {key: bucket.to_json() for key, bucket in hours.items()},
+                    "days": {key: bucket.to_json() for key, bucket in days.items()},
+                }
+                self._dirty = False
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # Não gravou: os eventos voltam a ficar pendentes
+                with self._lock:
+                    self._hours, self._days = previous
+                    for key, bucket in pending.items():
+                        self._pending.setdefault(key, StatsBucket()).merge(bucket)
+                    self._dirty = True
+
+
+def format_summary(summary: Dict, width: int = 48) -> str:
+    """Ticket de fechamento do dia para a impressora térmica."""
+    w = width
+    lines = [
+        "=" * w,
+        "RESUMO DO DIA".center(w),
+        datetime.strptime(summary["day"], "%Y-%m-%d").strftime("%d/%m/%Y").center(w),
+        "=" * w,
+        "",
+        f"Pedidos impressos: {summary['tickets']}",
+        f"Itens:             {summary['items']}",
+        f"Reimpressoes:      {summary['reprints']}",
+        "",
+    ]
+
+    per_hour = [row for row in summary["per_hour"] if row["tickets"]]
+    if per_hour:
+        lines += ["-" * w, "PEDIDOS POR HORA".center(w), "-" * w]
+        peak = max(row["tickets"] for row in per_hour)
+        bar_width = max(1, w - 20)
+        for row in per_hour:
+            bar = "#" * max(1, round(row["tickets"] * bar_width / peak))
+            lines.append(f"{row['hour']:02d}h {row['tickets']:>4} {row['items']:>5}i {bar}")
+        lines.append("")
+
+    failures = summary["failures"]
+    lines += ["-" * w, "FALHAS POR IMPRESSORA".center(w), "-" * w]
+    if failures:
+        for printer, count in sorted(failures.items(), key=lambda item: -item[1]):
+            name = printer if len(printer) <= w - 8 else printer[:w - 11] + "..."
+            lines.append(f"{name:<{w - 6}}{count:>6}")
+    else:
+        lines.append("Nenhuma falha")
+    lines.append("")
+
+    labels = {"wait": "Pedido ate o papel", "print": "Envio a impressora"}
+    latency = summary["latency_ms"]
+    if latency:
+        lines += ["-" * w, "TEMPOS (p50 / p90 / p99)".center(w), "-" * w]
+        for name in ("wait", "print"):
+            stats = latency.get(name)
+            if not stats or not stats["count"]:
+                continue
+            lines.append(labels[name] + ":")
+            lines.append(f"  {_format_ms(stats['p50'])} / {_format_ms(stats['p90'])} / {_format_ms(stats['p99'])}")
+        lines.append("")
+
+    lines += ["=" * w, "", "", ""]
+    return "\n".join(lines)
+
+
+def _format_ms(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if value >= 60000:
+        return f"{value / 60000:.1f}min"
+    if value >= 1000:
+        return f"{value / 1000:.1f}s"
+    return f"{value:.0f}ms"
+
+
+def create_print_stats(config, base_path: str) -> PrintStats:
+    """Cria o armazenamento com a retenção da seção [ESTATISTICAS] do config.ini."""
+    return PrintStats(
+        os.path.join(base_path, "estatisticas.json"),
+        retention_days=config.getint('ESTATISTICAS', 'DIAS', fallback=90),
+    )
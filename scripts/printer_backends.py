@@ -0,0 +1,512 @@
+"""
+Backends de impressão para o serviço de pedidos.
+
+Cada backend recebe os bytes já codificados do recibo e os entrega a um
+destino diferente:
+
+- windows: spooler do Windows (win32print, modo RAW)
+- tcp:     conexão persistente na porta 9100 (impressoras de rede)
+- cups:    comando `lp` do CUPS (Linux/macOS)
+- arquivo: anexa os bytes em um arquivo (testes e auditoria)
+- nulo:    descarta os bytes (testes de carga)
+- console: mostra o texto no console (simulação)
+
+Configuração na seção [IMPRESSAO] do config.ini:
+
+[IMPRESSAO]
+BACKEND = auto        (auto, windows, tcp, cups, arquivo, nulo, console)
+HOST =                (IP da impressora para o backend tcp)
+PORTA = 9100
+ARQUIVO = impressoes.bin
+TIMEOUT = 10
+"""
+
+import os
+import select
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from typing import Dict, Optional
+
+# Tenta importar bibliotecas do Windows
+try:
+    import win32print
+except ImportError:
+    win32print = None
+
+
+# cp850 é o padrão para acentos em impressoras térmicas brasileiras
+RECEIPT_ENCODING = 'cp850'
+
+
+def encode_receipt(text: str) -> bytes:
+    """Codifica o texto do recibo para a impressora térmica."""
+    return text.encode(RECEIPT_ENCODING, errors='replace')
+
+
+# ============ SPOOLER (winspool.h) ============
+JOB_DONE = 'done'
+JOB_PENDING = 'pending'
+JOB_ERROR = 'error'
+
+PRINTER_STATUS_PAUSED = 0x00000001
+PRINTER_STATUS_ERROR = 0x00000002
+PRINTER_STATUS_PENDING_DELETION = 0x00000004
+PRINTER_STATUS_PAPER_JAM = 0x00000008
+PRINTER_STATUS_PAPER_OUT = 0x00000010
+PRINTER_STATUS_PAPER_PROBLEM = 0x00000040
+PRINTER_STATUS_OFFLINE = 0x00000080
+PRINTER_STATUS_OUTPUT_BIN_FULL = 0x00000800
+PRINTER_STATUS_NOT_AVAILABLE = 0x00001000
+PRINTER_STATUS_USER_INTERVENTION = 0x00100000
+PRINTER_STATUS_DOOR_OPEN = 0x00400000
+
+PRINTER_ATTRIBUTE_WORK_OFFLINE = 0x00000400
+
+JOB_STATUS_ERROR = 0x00000002
+JOB_STATUS_DELETING = 0x00000004
+JOB_STATUS_PRINTING = 0x00000010
+JOB_STATUS_OFFLINE = 0x00000020
+JOB_STATUS_PAPEROUT = 0x00000040
+JOB_STATUS_PRINTED = 0x00000080
+JOB_STATUS_DELETED = 0x00000100
+JOB_STATUS_BLOCKED_DEVQ = 0x00000200
+JOB_STATUS_USER_INTERVENTION = 0x00000400
+JOB_STATUS_COMPLETE = 0x00001000
+JOB_STATUS_RETAINED = 0x00002000
+
+JOB_STATUS_ERROR_FLAGS = (JOB_STATUS_ERROR | JOB_STATUS_OFFLINE | JOB_STATUS_PAPEROUT
+                          | JOB_STATUS_BLOCKED_DEVQ | JOB_STATUS_USER_INTERVENTION)
+JOB_STATUS_DONE_FLAGS = JOB_STATUS_PRINTED | JOB_STATUS_COMPLETE
+JOB_STATUS_DELETED_FLAGS = JOB_STATUS_DELETED | JOB_STATUS_DELETING
+
+JOB_CONTROL_DELETE = 5
+JOB_CONTROL_RETAIN = 8
+
+
+# ============ ESTATÍSTICAS ============
+class BackendStats:
+    """Contadores de vazão e erros de um backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.busy_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, nbytes: int, elapsed: float, error: Optional[str] = None):
+        with self._lock:
+            self.busy_seconds += elapsed
+            if error is None:
+                self.jobs += 1
+                self.bytes_written += nbytes
+            else:
+                self.errors += 1
+                self.last_error = error
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            throughput = self.bytes_written / self.busy_seconds if self.busy_seconds > 0 else 0.0
+            return {
+                "jobs": self.jobs,
+                "errors": self.errors,
+                "bytes_written": self.bytes_written,
+                "busy_seconds": round(self.busy_seconds, 4),
+                "bytes_per_second": round(throughput, 1),
+                "last_error": self.last_error,
+            }
+
+
+# ============ BACKENDS ============
+class PrinterBackend:
+    """Interface comum dos backends de impressão."""
+
+    kind = "base"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = BackendStats()
+        # ID do último trabalho no spooler (somente backends com fila própria)
+        self.last_job_id: Optional[int] = None
+
+    def send(self, data: bytes) -> bool:
+        """Envia um trabalho para a impressora e registra as estatísticas."""
+        start = time.perf_counter()
+        self.last_job_id = None
+        try:
+            self.last_job_id = self._write(data)
+        except Exception as e:
+            self.stats.record(len(data), time.perf_counter() - start, error=str(e))
+            return False
+        self.stats.record(len(data), time.perf_counter() - start)
+        return True
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return self.stats.last_error
+
+    def _write(self, data: bytes) -> Optional[int]:
+        raise NotImplementedError
+
+    def query_status(self) -> Optional[Dict]:
+        """Estado da fila da impressora, ou None se o backend não tem spooler.
+
+        Retorna um dict com "status" (flags PRINTER_STATUS_*), "attributes",
+        "queue_depth" e "job_errors" (trabalhos da fila com erro).
+        """
+        return None
+
+    def job_state(self, job_id: int) -> str:
+        """Situação de um trabalho no spooler: 'done', 'pending' ou 'error'."""
+        return JOB_DONE
+
+    def cancel_job(self, job_id: int):
+        """Remove um trabalho preso no spooler."""
+
+    def wait_printed(self, timeout: float) -> Optional[bool]:
+        """Espera o último trabalho enviado terminar de imprimir.
+
+        True quando confirmado, False em erro ou tempo esgotado e None quando
+        o backend não tem como saber (só o envio pode ser medido).
+        """
+        if self.last_job_id is None:
+            return None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            state = self.job_state(self.last_job_id)
+            if state != JOB_PENDING:
+                return state == JOB_DONE
+            time.sleep(0.05)
+        return False
+
+    def close(self):
+        """Libera recursos (conexões, handles)."""
+
+    def describe(self) -> str:
+        return f"{self.kind}:{self.name}"
+
+    def snapshot(self) -> Dict:
+        """Estatísticas atuais do backend."""
+        data = self.stats.snapshot()
+        data.update(kind=self.kind, name=self.name)
+        return data
+
+
+class Win32Backend(PrinterBackend):
+    """Spooler do Windows em modo RAW."""
+
+    kind = "windows"
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        # Trabalhos mantidos na fila após a impressão e última situação vista
+        # dos demais (sem retenção, o trabalho some logo depois de impresso)
+        self._retained = set()
+        self._last_status: Dict[int, int] = {}
+
+    def _write(self, data: bytes) -> Optional[int]:
+        if not win32print:
+            raise RuntimeError("win32print não instalado")
+        if not self.name:
+            raise RuntimeError("Nenhuma impressora configurada ou detectada!")
+        hprinter = win32print.OpenPrinter(self.name)
+        try:
+            job_id = win32print.StartDocPrinter(hprinter, 1, ("Pedido", None, "RAW"))
+            try:
+                # Mantém o trabalho na fila depois de impresso, para a marca
+                # PRINTED ser vista por job_state (Windows 8 ou mais novo)
+                win32print.SetJob(hprinter, job_id, 0, None, JOB_CONTROL_RETAIN)
+                self._retained.add(job_id)
+            except Exception:
+                pass
+            try:
+                win32print.StartPagePrinter(hprinter)
+                win32print.WritePrinter(hprinter, data)
+                win32print.EndPagePrinter(hprinter)
+            finally:
+                win32print.EndDocPrinter(hprinter)
+        finally:
+            win32print.ClosePrinter(hprinter)
+        return job_id
+
+    def query_status(self) -> Optional[Dict]:
+        if not win32print or not self.name:
+            return None
+        hprinter = win32print.OpenPrinter(self.name)
+        try:
+            info = win32print.GetPrinter(hprinter, 2)
+            jobs = win32print.EnumJobs(hprinter, 0, -1, 1)
+        finally:
+            win32print.ClosePrinter(hprinter)
+        return {
+            "status": info.get('Status', 0),
+            "attributes": info.get('Attributes', 0),
+            "queue_depth": sum(1 for job in jobs if not job.get('Status', 0) & JOB_STATUS_DONE_FLAGS),
+            "job_errors": sum(1 for job in jobs if job.get('Status', 0) & JOB_STATUS_ERROR_FLAGS),
+        }
+
+    def job_state(self, job_id: int) -> str:
+        hprinter = win32print.OpenPrinter(self.name)
+        try:
+            try:
+                info = win32print.GetJob(hprinter, job_id, 1)
+            except Exception:
+                return self._vanished_state(job_id)
+        finally:
+            win32print.ClosePrinter(hprinter)
+        status = info.get('Status', 0)
+        if status & JOB_STATUS_DONE_FLAGS and not status & JOB_STATUS_DELETED_FLAGS:
+            self._forget(job_id)
+            if status & JOB_STATUS_RETAINED:
+                # Já confirmado: tira da fila o trabalho retido
+                try:
+                    self.cancel_job(job_id)
+                except Exception:
+                    pass
+            return JOB_DONE
+        if status & (JOB_STATUS_ERROR_FLAGS | JOB_STATUS_DELETED_FLAGS):
+            self._forget(job_id)
+            return JOB_ERROR
+        self._last_status[job_id] = status
+        return JOB_PENDING
+
+    def _vanished_state(self, job_id: int) -> str:
+        """Situação de um trabalho que saiu do spooler sem ser visto como impresso.
+
+        Retido, ele só sai se foi apagado. Sem retenção, conta como impresso
+        apenas se já tinha sido visto imprimindo; senão não há como saber e
+        o pedido volta a ficar pendente.
+        """
+        retained = job_id in self._retained
+        status = self._forget(job_id)
+        if not retained and status & JOB_STATUS_PRINTING and not status & JOB_STATUS_DELETED_FLAGS:
+            return JOB_DONE
+        return JOB_ERROR
+
+    def _forget(self, job_id: int) -> int:
+        self._retained.discard(job_id)
+        return self._last_status.pop(job_id, 0)
+
+    def cancel_job(self, job_id: int):
+        hprinter = win32print.OpenPrinter(self.name)
+        try:
+            win32print.SetJob(hprinter, job_id, 0, None, JOB_CONTROL_DELETE)
+        finally:
+            win32print.ClosePrinter(hprinter)
+
+
+class TcpBackend(PrinterBackend):
+    """Impressora de rede via socket RAW (JetDirect, porta 9100).
+
+    A conexão é mantida aberta entre os trabalhos, com keep-alive do TCP,
+    e é refeita automaticamente quando a impressora fecha o socket.
+    """
+
+    kind = "tcp"
+
+    def __init__(self, host: str, port: int = 9100, timeout: float = 10.0):
+        super().__init__(f"{host}:{port}")
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reconnects = 0
+        # None até a primeira consulta de status (GS r) ser respondida ou não
+        self.status_supported: Optional[bool] = None
+        self._connected_once = False
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _is_stale(self, sock: socket.socket) -> bool:
+        """Verifica se o outro lado fechou a conexão enquanto estava ociosa."""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return False
+            # Descarta bytes de status que a impressora possa ter enviado
+            return sock.recv(4096) == b""
+        except OSError:
+            return True
+
+    def _drop(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _write(self, data: bytes):
+        with self._lock:
+            if self._sock is not None and self._is_stale(self._sock):
+                self._drop()
+            for attempt in (1, 2):
+                if self._sock is None:
+                    self._sock = self._connect()
+                    if self._connected_once:
+                        self.reconnects += 1
+                    self._connected_once = True
+                try:
+                    self._sock.sendall(data)
+                    return
+                except OSError:
+                    self._drop()
+                    if attempt == 2:
+                        raise
+
+    def wait_printed(self, timeout: float) -> Optional[bool]:
+        """Confirma a impressão com o comando ESC/POS GS r 1 (status do papel).
+
+        O comando entra na fila da impressora depois do recibo, então a
+        resposta só chega quando tudo o que veio antes foi impresso.
+        Impressoras que não respondem ficam marcadas e não são consultadas
+        de novo.
+        """
+        if self.status_supported is False:
+            return None
+        with self._lock:
+            if self._sock is None:
+                return False
+            try:
+                self._sock.sendall(b"\x1dr\x01")
+                self._sock.settimeout(timeout)
+                answered = self._sock.recv(1) != b""
+            except socket.timeout:
+                answered = None
+            except OSError:
+                self._drop()
+                return False
+            finally:
+                if self._sock is not None:
+                    self._sock.settimeout(self.timeout)
+        if answered is None and self.status_supported is None:
+            self.status_supported = False
+            return None
+        self.status_supported = self.status_supported or bool(answered)
+        return bool(answered)
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def snapshot(self) -> Dict:
+        data = super().snapshot()
+        data["reconnects"] = self.reconnects
+        data["connected"] = self._sock is not None
+        return data
+
+
+class CupsBackend(PrinterBackend):
+    """Fila do CUPS via comando `lp` em modo raw."""
+
+    kind = "cups"
+
+    def __init__(self, name: str, timeout: float = 30.0):
+        super().__init__(name or "padrao")
+        self.queue = name
+        self.timeout = timeout
+
+    def _write(self, data: bytes):
+        cmd = ["lp", "-s", "-o", "raw"]
+        if self.queue:
+            cmd += ["-d", self.queue]
+        result = subprocess.run(cmd, input=data, capture_output=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors='replace').strip() or f"lp saiu com {result.returncode}")
+
+
+class FileBackend(PrinterBackend):
+    """Anexa cada trabalho ao final de um arquivo."""
+
+    kind = "arquivo"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, data: bytes):
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(data)
+
+
+class NullBackend(PrinterBackend):
+    """Descarta os trabalhos (testes de carga)."""
+
+    kind = "nulo"
+
+    def __init__(self, name: str = "nulo"):
+        super().__init__(name)
+
+    def _write(self, data: bytes):
+        pass
+
+
+class ConsoleBackend(PrinterBackend):
+    """Mostra o recibo no console (modo simulação)."""
+
+    kind = "console"
+
+    def __init__(self, name: str = "SIMULACAO"):
+        super().__init__(name)
+
+    def _write(self, data: bytes):
+        print(">>> SIMULACAO (win32print não instalado) <<<")
+        print("-" * 40)
+        print(data.decode(RECEIPT_ENCODING, errors='replace'))
+        print("-" * 40)
+
+
+# ============ FÁBRICA ============
+BACKEND_KINDS = ("auto", "windows", "tcp", "cups", "arquivo", "nulo", "console")
+
+
+def create_backend(config, printer_name: Optional[str] = None,
+                   base_path: Optional[str] = None) -> PrinterBackend:
+    """Cria o backend configurado na seção [IMPRESSAO] do config.ini.
+
+    Caminhos relativos (ARQUIVO) são resolvidos a partir de base_path,
+    normalmente a pasta do executável.
+    """
+    kind = config.get('IMPRESSAO', 'BACKEND', fallback='auto').strip().lower() or 'auto'
+    host = config.get('IMPRESSAO', 'HOST', fallback='').strip()
+    port = config.getint('IMPRESSAO', 'PORTA', fallback=9100)
+    path = config.get('IMPRESSAO', 'ARQUIVO', fallback='').strip() or 'impressoes.bin'
+    timeout = config.getfloat('IMPRESSAO', 'TIMEOUT', fallback=10.0)
+
+    if kind not in BACKEND_KINDS:
+        raise ValueError(f"BACKEND inválido: {kind} (opções: {', '.join(BACKEND_KINDS)})")
+
+    if kind == 'auto':
+        if host:
+            kind = 'tcp'
+        elif win32print:
+            kind = 'windows'
+        elif printer_name and shutil.which('lp'):
+            kind = 'cups'
+        else:
+            kind = 'console'
+
+    if kind == 'windows':
+        return Win32Backend(printer_name or '')
+    if kind == 'tcp':
+        if not host:
+            raise ValueError("BACKEND = tcp exige HOST na seção [IMPRESSAO]")
+        return TcpBackend(host, port, timeout)
+    if kind == 'cups':
+        return CupsBackend(printer_name or '', timeout)
+    if kind == 'arquivo':
+        return FileBackend(os.path.join(base_path or os.getcwd(), path))
+    if kind == 'nulo':
+        return NullBackend()
+    return ConsoleBackend()
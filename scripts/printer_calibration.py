@@ -0,0 +1,245 @@
+"""
+Calibração da impressora: quanto ela imprime por segundo e por hora.
+
+Imprime uma série curta de tickets de comprimento crescente pelo backend
+ativo e mede, para cada um, do envio até a impressora terminar (spooler do
+Windows: o trabalho sai da fila; rede: resposta ao status ESC/POS GS r).
+Uma reta tempo = fixo + linhas / velocidade separa:
+
+- linhas por segundo e bytes por segundo (velocidade de impressão);
+- o tempo fixo por ticket (abertura do trabalho, avanço e corte do papel).
+
+O perfil fica em `calibracao.json` ao lado do executável, um por
+impressora, e permite estimar quantos pedidos por hora ela aguenta
+comparando com o pico de pedidos por hora das estatísticas locais.
+Backends sem confirmação (arquivo, nulo, console) medem só o envio.
+"""
+
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from printer_backends import PrinterBackend, encode_receipt
+
+# Linhas de cada ticket da série (~130 linhas de papel no total)
+CALIBRATION_LINES = (10, 20, 40, 60)
+
+# Pausa entre os tickets, para cada um começar com a impressora parada
+PAUSE_SECONDS = 0.5
+
+# Espera máxima pela confirmação de um ticket
+PRINT_TIMEOUT = 30.0
+
+# Linhas de um pedido típico quando ainda não há recibos guardados
+DEFAULT_TICKET_LINES = 30
+
+MEASURED_PRINT = "impressão"
+MEASURED_SEND = "envio"
+
+
+class CalibrationError(Exception):
+    """A impressora recusou ou não terminou um ticket da calibração."""
+
+
+class PrinterProfile:
+    """Velocidade medida de uma impressora."""
+
+    __slots__ = ("printer", "calibrated_at", "measured", "lines_per_second", "bytes_per_second",
+                 "ticket_overhead_ms", "samples")
+
+    def __init__(self, printer: str, calibrated_at: str, measured: str,
+                 lines_per_second: Optional[float], bytes_per_second: Optional[float],
+                 ticket_overhead_ms: float, samples: List[Dict]):
+        self.printer = printer
+        self.calibrated_at = calibrated_at
+        self.measured = measured
+        self.lines_per_second = lines_per_second
+        self.bytes_per_second = bytes_per_second
+        self.ticket_overhead_ms = ticket_overhead_ms
+        self.samples = samples
+
+    def ticket_ms(self, lines: int) -> float:
+        """Tempo estimado para imprimir um ticket com essa quantidade de linhas."""
+        if not self.lines_per_second:
+            return self.ticket_overhead_ms
+        return self.ticket_overhead_ms + lines / self.lines_per_second * 1000
+
+    def tickets_per_hour(self, lines: int) -> Optional[float]:
+        """Capacidade com a impressora imprimindo sem parar (None se instantânea)."""
+        ms = self.ticket_ms(lines)
+        return 3600 * 1000 / ms if ms > 0 else None
+
+    def to_json(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "PrinterProfile":
+        return cls(**{name: data[name] for name in cls.__slots__})
+
+
+def fit_line(points: Sequence[Tuple[float, float]]) -> Tuple[float, float]:
+    """Mínimos quadrados: retorna (intercepto, inclinação) de y = a + b·x."""
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else 0.0
+    return mean_y - slope * mean_x, slope
+
+
+def calibration_ticket(index: int, total: int, lines: int, width: int = 48) -> str:
+    """Ticket de teste com `lines` linhas no total, preenchidas como um pedido real."""
+    body = [
+        "=" * width,
+        f"CALIBRACAO {index}/{total}".center(width),
+        datetime.now().strftime("%d/%m/%Y %H:%M:%S").center(width),
+        "=" * width,
+    ]
+    filler = "1x PRODUTO DE TESTE COM NOME LONGO"
+    number = 1
+    while len(body) < lines - 1:
+        price = f"R${number * 1.5:.2f}"
+        body.append(f"{filler[:width - len(price) - 1]:<{width - len(price)}}{price}")
+        number += 1
+    body.append("-" * width)
+    return "\n".join(body[:lines]) + "\n"
+
+
+def calibrate(backend: PrinterBackend, width: int = 48, series: Sequence[int] = CALIBRATION_LINES,
+              on_progress: Optional[Callable[[str], None]] = None) -> PrinterProfile:
+    """Imprime a série de calibração e calcula o perfil da impressora.
+
+    Levanta CalibrationError se algum ticket falhar.
+    """
+    samples = []
+    confirmed = True
+    for index, lines in enumerate(series, start=1):
+        data = encode_receipt(calibration_ticket(index, len(series), lines, width))
+        start = time.perf_counter()
+        if not backend.send(data):
+            raise CalibrationError(f"falha ao enviar o ticket {index}: {backend.last_error}")
+        printed = backend.wait_printed(PRINT_TIMEOUT)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if printed is False:
+            raise CalibrationError(f"a impressora não terminou o ticket {index} em {PRINT_TIMEOUT:.0f}s")
+        confirmed = confirmed and printed is True
+        samples.append({"lines": lines, "bytes": len(data), "ms": round(elapsed_ms, 1)})
+        if on_progress:
+            on_progress(f"Ticket {index}/{len(series)}: {lines} linhas em {elapsed_ms:.0f} ms")
+        if index < len(series):
+            time.sleep(PAUSE_SECONDS)
+
+    overhead_ms, ms_per_line = fit_line([(sample["lines"], sample["ms"]) for sample in samples])
+    _, ms_per_byte = fit_line([(sample["bytes"], sample["ms"]) for sample in samples])
+    return PrinterProfile(
+        printer=backend.describe(),
+        calibrated_at=datetime.now().isoformat(timespec="seconds"),
+        measured=MEASURED_PRINT if confirmed else MEASURED_SEND,
+        lines_per_second=round(1000 / ms_per_line, 2) if ms_per_line > 0 else None,
+        bytes_per_second=round(1000 / ms_per_byte, 1) if ms_per_byte > 0 else None,
+        ticket_overhead_ms=round(max(0.0, overhead_ms), 1),
+        samples=samples,
+    )
+
+
+def typical_ticket_lines(receipts) -> int:
+    """Linhas de um pedido típico, pela mediana dos recibos guardados."""
+    counts = [entry.data.count(b"\n") + 1 for entry in receipts.recent(50)]
+    return int(statistics.median(counts)) if counts else DEFAULT_TICKET_LINES
+
+
+class TicketLines:
+    """Linhas de um pedido típico, guardadas para o relatório de capacidade.
+
+    Os recibos só são lidos em refresh() (na calibração e quando as
+    estatísticas são gravadas); o /status usa apenas `value`.
+    """
+
+    def __init__(self, receipts):
+        self.receipts = receipts
+        self.value = DEFAULT_TICKET_LINES
+        self.measured = False
+
+    def refresh(self) -> int:
+        self.value = typical_ticket_lines(self.receipts)
+        self.measured = True
+        return self.value
+
+
+def capacity_report(profile: PrinterProfile, ticket_lines: int, peak_per_hour: int) -> Dict:
+    """Capacidade da impressora comparada com o pico de pedidos por hora."""
+    capacity = profile.tickets_per_hour(ticket_lines)
+    return {
+        "printer": profile.printer,
+        "calibrated_at": profile.calibrated_at,
+        "measured": profile.measured,
+        "lines_per_second": profile.lines_per_second,
+        "bytes_per_second": profile.bytes_per_second,
+        "ticket_overhead_ms": profile.ticket_overhead_ms,
+        "ticket_lines": ticket_lines,
+        "ticket_ms": round(profile.ticket_ms(ticket_lines), 1),
+        "tickets_per_hour": round(capacity) if capacity else None,
+        "peak_per_hour": peak_per_hour,
+        "utilization": round(peak_per_hour / capacity, 3) if capacity else 0.0,
+    }
+
+
+def format_capacity(report: Dict) -> str:
+    """Resumo da capacidade para o console ou a janela."""
+    lines = [f"Impressora: {report['printer']} (medido: {report['measured']})"]
+    if report["lines_per_second"]:
+        lines.append(f"Velocidade: {report['lines_per_second']:.1f} linhas/s"
+                     + (f", {report['bytes_per_second']:.0f} bytes/s" if report["bytes_per_second"] else ""))
+    lines.append(f"Tempo fixo por ticket (corte): {report['ticket_overhead_ms']:.0f} ms")
+    lines.append(f"Pedido típico: {report['ticket_lines']} linhas, {report['ticket_ms']:.0f} ms")
+    if report["measured"] == MEASURED_SEND:
+        lines.append("Capacidade: não medida (este backend não confirma a impressão, só o envio)")
+    elif report["tickets_per_hour"]:
+        lines.append(f"Capacidade: {report['tickets_per_hour']} pedidos/hora"
+                     f" (pico recente: {report['peak_per_hour']}/hora,"
+                     f" {report['utilization'] * 100:.0f}% de uso)")
+        if report["utilization"] > 0.8:
+            lines.append("ATENÇÃO: no pico a impressora fica no limite; considere uma segunda impressora.")
+    else:
+        lines.append("Capacidade: sem limite medido")
+    return "\n".join(lines)
+
+
+class ProfileStore:
+    """Perfis de calibração por impressora, em JSON."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._profiles: Dict[str, PrinterProfile] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._profiles = {name: PrinterProfile.from_json(value) for name, value in data.items()}
+            except (OSError, ValueError, TypeError, KeyError):
+                # Arquivo corrompido: basta calibrar de novo
+                self._profiles = {}
+
+    def get(self, printer: str) -> Optional[PrinterProfile]:
+        return self._profiles.get(printer)
+
+    def put(self, profile: PrinterProfile):
+        self._profiles[profile.printer] = profile
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({name: value.to_json() for name, value in self._profiles.items()}, f,
+                          ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def create_profile_store(base_path: str) -> ProfileStore:
+    """Perfis em calibracao.json na pasta do executável."""
+    return ProfileStore(os.path.join(base_path, "calibracao.json"))
@@ -0,0 +1,252 @@
+"""
+Monitor de saúde da impressora (backpressure do spooler).
+
+Consulta periodicamente o estado da fila da impressora (GetPrinter/EnumJobs
+no Windows) e mantém o último resultado em cache. Enquanto a impressora
+estiver sem papel, offline ou com a fila acumulada, novos pedidos ficam
+retidos (continuam 'pending' no banco).
+
+Os trabalhos enviados ao spooler só são confirmados depois que saem da
+fila. Se um trabalho ficar preso além do TIMEOUT_SPOOL ele é removido do
+spooler e o pedido volta a ser impresso quando a impressora se recuperar,
+evitando tickets marcados como impressos que nunca saíram do papel.
+
+Configuração na seção [IMPRESSAO] do config.ini:
+
+[IMPRESSAO]
+MAX_FILA = 3            (trabalhos na fila do Windows antes de reter pedidos)
+MAX_EM_ANDAMENTO = 2    (trabalhos nossos aguardando a impressora)
+INTERVALO_STATUS = 2    (segundos entre consultas ao spooler)
+TIMEOUT_SPOOL = 60      (segundos até considerar um trabalho preso)
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from printer_backends import (
+    JOB_DONE,
+    JOB_ERROR,
+    PRINTER_ATTRIBUTE_WORK_OFFLINE,
+    PRINTER_STATUS_DOOR_OPEN,
+    PRINTER_STATUS_ERROR,
+    PRINTER_STATUS_NOT_AVAILABLE,
+    PRINTER_STATUS_OFFLINE,
+    PRINTER_STATUS_OUTPUT_BIN_FULL,
+    PRINTER_STATUS_PAPER_JAM,
+    PRINTER_STATUS_PAPER_OUT,
+    PRINTER_STATUS_PAPER_PROBLEM,
+    PRINTER_STATUS_PAUSED,
+    PRINTER_STATUS_PENDING_DELETION,
+    PRINTER_STATUS_USER_INTERVENTION,
+    PrinterBackend,
+)
+
+
+# Flags que impedem a impressão, com a descrição exibida no log
+STATUS_PROBLEMS = (
+    (PRINTER_STATUS_PAPER_OUT, "sem papel"),
+    (PRINTER_STATUS_PAPER_JAM, "papel atolado"),
+    (PRINTER_STATUS_PAPER_PROBLEM, "problema no papel"),
+    (PRINTER_STATUS_DOOR_OPEN, "tampa aberta"),
+    (PRINTER_STATUS_OFFLINE, "offline"),
+    (PRINTER_STATUS_NOT_AVAILABLE, "indisponível"),
+    (PRINTER_STATUS_PAUSED, "pausada"),
+    (PRINTER_STATUS_ERROR, "erro"),
+    (PRINTER_STATUS_OUTPUT_BIN_FULL, "bandeja cheia"),
+    (PRINTER_STATUS_USER_INTERVENTION, "requer intervenção"),
+    (PRINTER_STATUS_PENDING_DELETION, "sendo removida"),
+)
+
+
+class PrinterHealth:
+    """Última leitura do estado da impressora."""
+
+    __slots__ = ("healthy", "supported", "queue_depth", "status", "problems", "sampled_at")
+
+    def __init__(self, healthy: bool = True, supported: bool = False, queue_depth: int = 0,
+                 status: int = 0, problems: Optional[List[str]] = None, sampled_at: float = 0.0):
+        self.healthy = healthy
+        self.supported = supported
+        self.queue_depth = queue_depth
+        self.status = status
+        self.problems = problems or []
+        self.sampled_at = sampled_at
+
+    def describe(self) -> str:
+        if self.healthy:
+            return "OK"
+        return ", ".join(self.problems)
+
+    def to_dict(self) -> Dict:
+        return {
+            "healthy": self.healthy,
+            "supported": self.supported,
+            "queue_depth": self.queue_depth,
+            "status": self.status,
+            "problems": list(self.problems),
+            "sampled_at": self.sampled_at,
+        }
+
+
+class InFlightJob:
+    """Trabalho enviado ao spooler aguardando confirmação."""
+
+    __slots__ = ("order", "job_id", "sent_at")
+
+    def __init__(self, order, job_id: int, sent_at: float):
+        self.order = order
+        self.job_id = job_id
+        self.sent_at = sent_at
+
+
+class PrinterHealthMonitor:
+    """Consulta o spooler em segundo plano e controla os trabalhos em andamento."""
+
+    def __init__(self, backend: PrinterBackend, interval: float = 2.0, max_queue_depth: int = 3,
+                 max_in_flight: int = 2, spool_timeout: float = 60.0):
+        self.backend = backend
+        self.interval = interval
+        self.max_queue_depth = max_queue_depth
+        self.max_in_flight = max_in_flight
+        self.spool_timeout = spool_timeout
+
+        self._health = PrinterHealth(sampled_at=time.time())
+        self._in_flight: Dict[str, InFlightJob] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- amostragem ----
+    def start(self):
+        """Inicia a consulta periódica (somente backends com spooler)."""
+        self.sample()
+        if not self._health.supported or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="printer-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> PrinterHealth:
+        """Lê o estado atual do spooler e atualiza o cache."""
+        now = time.time()
+        try:
+            info = self.backend.query_status()
+        except Exception as e:
+            health = PrinterHealth(healthy=False, supported=True, problems=[f"falha ao consultar: {e}"],
+                                   sampled_at=now)
+        else:
+            if info is None:
+                health = PrinterHealth(sampled_at=now)
+            else:
+                health = self._evaluate(info, now)
+        self._health = health
+        return health
+
+    def _evaluate(self, info: Dict, now: float) -> PrinterHealth:
+        status = info.get("status", 0)
+        queue_depth = info.get("queue_depth", 0)
+        problems = [label for flag, label in STATUS_PROBLEMS if status & flag]
+        if info.get("attributes", 0) & PRINTER_ATTRIBUTE_WORK_OFFLINE and "offline" not in problems:
+            problems.append("offline")
+        if info.get("job_errors", 0):
+            problems.append(f"{info['job_errors']} trabalho(s) com erro na fila")
+        if queue_depth > self.max_queue_depth:
+            problems.append(f"fila com {queue_depth} trabalhos")
+        return PrinterHealth(healthy=not problems, supported=True, queue_depth=queue_depth,
+                             status=status, problems=problems, sampled_at=now)
+
+    @property
+    def health(self) -> PrinterHealth:
+        """Última leitura em cache (não bloqueia)."""
+        return self._health
+
+    # ---- controle de trabalhos ----
+    def is_in_flight(self, order_id: str) -> bool:
+        with self._lock:
+            return order_id in self._in_flight
+
+    def in_flight_count(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def can_dispatch(self) -> bool:
+        """Indica se um novo pedido pode ser enviado à impressora agora."""
+        if not self._health.healthy:
+            return False
+        return self.in_flight_count() < self.max_in_flight
+
+    def track(self, order_id: str, order, job_id: Optional[int], age: float = 0.0) -> bool:
+        """Registra um trabalho enviado há `age` segundos.
+
+        Retorna False quando o backend não tem spooler (job_id None): nesse
+        caso o pedido pode ser confirmado imediatamente.
+        """
+        if job_id is None or not self._health.supported:
+            return False
+        with self._lock:
+            self._in_flight[order_id] = InFlightJob(order, job_id, time.monotonic() - age)
+        return True
+
+    def in_flight_jobs(self) -> List[Tuple[object, int, float]]:
+        """(pedido, job_id, segundos desde o envio) de cada trabalho em andamento."""
+        now = time.monotonic()
+        with self._lock:
+            return [(job.order, job.job_id, now - job.sent_at) for job in self._in_flight.values()]
+
+    def reap(self) -> Tuple[List, List[Tuple[object, str]]]:
+        """Verifica os trabalhos em andamento.
+
+        Retorna (pedidos impressos, [(pedido, motivo)] que falharam). Os
+        trabalhos que falharam são removidos do spooler para que o pedido
+        seja reimpresso, sem duplicar, depois que a impressora se recuperar.
+        """
+        with self._lock:
+            jobs = list(self._in_flight.items())
+        done, failed = [], []
+        now = time.monotonic()
+        for order_id, job in jobs:
+            try:
+                state = self.backend.job_state(job.job_id)
+            except Exception as e:
+                state, reason = JOB_ERROR, f"falha ao consultar trabalho: {e}"
+            else:
+                reason = "erro no spooler"
+            if state == JOB_DONE:
+                done.append(job.order)
+            elif state == JOB_ERROR or now - job.sent_at > self.spool_timeout:
+                if state != JOB_ERROR:
+                    reason = f"preso no spooler há mais de {self.spool_timeout:.0f}s"
+                try:
+                    self.backend.cancel_job(job.job_id)
+                except Exception:
+                    pass
+                failed.append((job.order, reason))
+            else:
+                continue
+            with self._lock:
+                self._in_flight.pop(order_id, None)
+        return done, failed
+
+    def snapshot(self) -> Dict:
+        data = self._health.to_dict()
+        data["in_flight"] = self.in_flight_count()
+        data["max_in_flight"] = self.max_in_flight
+        return data
+
+
+def create_health_monitor(config, backend: PrinterBackend) -> PrinterHealthMonitor:
+    """Cria o monitor com os limites da seção [IMPRESSAO] do config.ini."""
+    return PrinterHealthMonitor(
+        backend,
+        interval=config.getfloat('IMPRESSAO', 'INTERVALO_STATUS', fallback=2.0),
+        max_queue_depth=config.getint('IMPRESSAO', 'MAX_FILA', fallback=3),
+        max_in_flight=max(1, config.getint('IMPRESSAO', 'MAX_EM_ANDAMENTO', fallback=2)),
+        spool_timeout=config.getfloat('IMPRESSAO', 'TIMEOUT_SPOOL', fallback=60.0),
+    )
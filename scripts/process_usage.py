@@ -0,0 +1,74 @@
+"""
+Uso de recursos do próprio processo: memória, threads e handles.
+
+Aparece em `process` no /status da API local e é o que o soak_test.py
+acompanha para achar vazamentos. Só biblioteca padrão: no Windows usa a
+psapi/kernel32 via ctypes; no Linux, /proc/self.
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    _kernel32 = ctypes.WinDLL("kernel32")
+    _psapi = ctypes.WinDLL("psapi")
+    _kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    _kernel32.GetProcessHandleCount.argtypes = [wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD)]
+    _psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters),
+                                            wintypes.DWORD]
+
+    def _rss_bytes() -> Optional[int]:
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not _psapi.GetProcessMemoryInfo(_kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+
+    def _open_handles() -> Optional[int]:
+        count = wintypes.DWORD()
+        if not _kernel32.GetProcessHandleCount(_kernel32.GetCurrentProcess(), ctypes.byref(count)):
+            return None
+        return count.value
+
+else:
+    def _rss_bytes() -> Optional[int]:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _open_handles() -> Optional[int]:
+        try:
+            return len(os.listdir("/proc/self/fd"))
+        except OSError:
+            return None
+
+
+def process_snapshot() -> Dict:
+    """Memória residente (MB), threads Python e handles/arquivos abertos."""
+    rss = _rss_bytes()
+    return {
+        "rss_mb": round(rss / (1024 * 1024), 1) if rss is not None else None,
+        "threads": threading.active_count(),
+        "handles": _open_handles(),
+    }
@@ -0,0 +1,231 @@
+"""
+Modo de diagnóstico (profiling) do loop de impressão.
+
+Quando ativado (--profile ou pelo menu da interface) coleta:
+
+- tempo por etapa (http, json, render, write, ack...) via `stage()`;
+- amostras de pilha da thread do loop, para saber quais funções consomem
+  o tempo (amostragem periódica de sys._current_frames, sem dependências);
+- snapshots do tracemalloc em intervalos, para ver o crescimento de memória.
+
+O relatório é gravado em logs/profile-AAAAMMDD-HHMMSS.txt ao desativar e
+periodicamente enquanto ativo. Desativado, `stage()` devolve um contexto
+vazio compartilhado e o custo é só uma verificação de atributo.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+_NULL_CONTEXT = nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Profiler:
+    """Coleta tempos por etapa, amostras de pilha e crescimento de memória."""
+
+    def __init__(self, sample_interval: float = 0.01, snapshot_interval: float = 60.0,
+                 report_interval: float = 300.0):
+        self.sample_interval = sample_interval
+        self.snapshot_interval = snapshot_interval
+        self.report_interval = report_interval
+        self.enabled = False
+        self.report_dir: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = {}
+        self._self_samples: Counter = Counter()
+        self._total_samples: Counter = Counter()
+        self._sample_count = 0
+        self._target_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._first_snapshot = None
+        self._last_snapshot = None
+        # True quando foi enable() que ligou o tracemalloc (só então disable() desliga)
+        self._started_tracing = False
+        self._started_at = 0.0
+        self._started_wall: Optional[datetime] = None
+
+    # ---- etapas ----
+    def stage(self, name: str):
+        """Contexto que mede uma etapa (sem custo quando desativado)."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _StageTimer(self, name)
+
+    def record_stage(self, name: str, elapsed: float):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.count += 1
+            stats.total += elapsed
+            if elapsed > stats.max:
+                stats.max = elapsed
+
+    # ---- ativação ----
+    def enable(self, report_dir: str, target_thread: Optional[int] = None):
+        """Ativa a coleta. target_thread: ident da thread do loop (padrão: a atual)."""
+        if self.enabled:
+            return
+        self.report_dir = report_dir
+        self._target_thread = target_thread or threading.get_ident()
+        with self._lock:
+            self._stages.clear()
+            self._self_samples.clear()
+            self._total_samples.clear()
+            self._sample_count = 0
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(10)
+        self._first_snapshot = tracemalloc.take_snapshot()
+        self._last_snapshot = self._first_snapshot
+        self._started_at = time.monotonic()
+        self._started_wall = datetime.now()
+        self._stop.clear()
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def disable(self) -> Optional[str]:
+        """Desativa a coleta e grava o relatório final. Retorna o caminho do arquivo."""
+        if not self.enabled:
+            return None
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._last_snapshot = tracemalloc.take_snapshot()
+        path = self.write_report()
+        if self._started_tracing:
+            # Rastreamento ligado de fora (PYTHONTRACEMALLOC) continua ligado
+            tracemalloc.stop()
+            self._started_tracing = False
+        return path
+
+    # ---- amostragem ----
+    def _run(self):
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        next_report = time.monotonic() + self.report_interval
+        while not self._stop.wait(self.sample_interval):
+            self._sample()
+            now = time.monotonic()
+            if now >= next_snapshot:
+                self._last_snapshot = tracemalloc.take_snapshot()
+                next_snapshot = now + self.snapshot_interval
+            if now >= next_report:
+                self.write_report()
+                next_report = now + self.report_interval
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._target_thread)
+        if frame is None:
+            return
+        seen = set()
+        top = True
+        with self._lock:
+            self._sample_count += 1
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+                if top:
+                    self._self_samples[key] += 1
+                    top = False
+                if key not in seen:
+                    self._total_samples[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    # ---- relatório ----
+    def stage_summary(self) -> List[Tuple[str, int, float, float, float]]:
+        """[(etapa, chamadas, total_s, média_ms, máx_ms)] ordenado pelo total."""
+        with self._lock:
+            rows = [(name, s.count, s.total, s.total * 1000 / s.count, s.max * 1000)
+                    for name, s in self._stages.items() if s.count]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def write_report(self, top: int = 25) -> Optional[str]:
+        if not self.report_dir or self._started_wall is None:
+            return None
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"profile-{self._started_wall.strftime('%Y%m%d-%H%M%S')}.txt")
+        elapsed = time.monotonic() - self._started_at
+
+        lines = [
+            "RELATORIO DE DIAGNOSTICO - LOOP DE IMPRESSAO",
+            f"Inicio: {self._started_wall.strftime('%d/%m/%Y %H:%M:%S')}  Duracao: {elapsed:.0f}s",
+            "",
+            "ETAPAS",
+            f"{'etapa':<14}{'chamadas':>10}{'total s':>10}{'media ms':>10}{'max ms':>10}",
+        ]
+        for name, count, total, avg_ms, max_ms in self.stage_summary():
+            lines.append(f"{name:<14}{count:>10}{total:>10.2f}{avg_ms:>10.2f}{max_ms:>10.2f}")
+
+        with self._lock:
+            samples = self._sample_count
+            self_top = self._self_samples.most_common(top)
+            total_top = self._total_samples.most_common(top)
+        lines += ["", f"FUNCOES (amostras da thread do loop: {samples}, a cada {self.sample_interval * 1000:.0f} ms)",
+                  "Tempo proprio:"]
+        for (func, filename, lineno), count in self_top:
+            lines.append(f"  {count * 100 / max(samples, 1):6.1f}%  {func} ({filename}:{lineno})")
+        lines.append("Tempo acumulado (inclui chamadas internas):")
+        for (func, filename, lineno), count in total_top:
+            lines.append(f"  {count * 100 / max(samples, 1):6.1f}%  {func} ({filename}:{lineno})")
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines += ["", f"MEMORIA (atual {current / 1024:.0f} KB, pico {peak / 1024:.0f} KB)",
+                      "Crescimento desde o inicio:"]
+            if self._first_snapshot is not None and self._last_snapshot is not None:
+                snapshot_filter = (tracemalloc.Filter(False, tracemalloc.__file__),)
+                last = self._last_snapshot.filter_traces(snapshot_filter)
+                first = self._first_snapshot.filter_traces(snapshot_filter)
+                for stat in last.compare_to(first, "lineno")[:top]:
+                    if stat.size_diff == 0:
+                        continue
+                    frame = stat.traceback[0]
+                    lines.append(f"  {stat.size_diff / 1024:+9.1f} KB  {stat.count_diff:+7d} blocos  "
+                                 f"{os.path.basename(frame.filename)}:{frame.lineno}")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+
+# Instância usada pelos módulos do serviço
+profiler = Profiler()
+stage = profiler.stage
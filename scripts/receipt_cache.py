@@ -0,0 +1,217 @@
+"""
+Cache dos recibos já renderizados, para reimpressão rápida e offline.
+
+Cada recibo enviado à impressora fica guardado (bytes prontos, já
+codificados) em memória e em `recibos/` ao lado do executável, junto com
+os dados do pedido. A chave é o id do pedido mais o `updated_at`: se o
+pedido for alterado no sistema, a versão antiga deixa de valer e o recibo
+é renderizado de novo.
+
+- Em memória: LRU com os últimos 64 recibos.
+- Em disco: um arquivo por pedido; recibos com mais de DIAS dias são
+  apagados e, acima de MAX_MB, os usados há mais tempo saem primeiro.
+
+Configuração na seção [RECIBOS] do config.ini:
+
+[RECIBOS]
+DIAS = 7        (validade dos recibos guardados)
+MAX_MB = 20     (espaço máximo em disco)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from order_model import Order, OrderValidationError
+
+_SUFFIX = ".rcpt"
+
+
+class CachedReceipt:
+    """Recibo guardado: bytes prontos para a impressora e o pedido de origem."""
+
+    __slots__ = ("order", "data", "stored_at")
+
+    def __init__(self, order: Order, data: bytes, stored_at: float):
+        self.order = order
+        self.data = data
+        self.stored_at = stored_at
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        return self.order.updated_at
+
+
+class ReceiptCache:
+    """LRU de recibos renderizados, em memória e em disco."""
+
+    def __init__(self, directory: Optional[str], max_age_days: float = 7.0,
+                 max_bytes: int = 20 * 1024 * 1024, max_memory_entries: int = 64):
+        self.directory = directory
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self.max_memory_entries = max_memory_entries
+
+        self._memory: "OrderedDict[str, CachedReceipt]" = OrderedDict()
+        # Índice dos arquivos em disco: order_id -> [tamanho, gravado em, último uso]
+        self._files: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._scan()
+            except OSError:
+                # Pasta sem permissão de escrita: funciona só em memória
+                self.directory = None
+
+    def _path(self, order_id: str) -> str:
+        return os.path.join(self.directory, order_id + _SUFFIX)
+
+    def _scan(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._files[name[:-len(_SUFFIX)]] = [stat.st_size, stat.st_mtime, stat.st_mtime]
+        self._evict()
+
+    # ---- leitura ----
+    def get(self, order_id: str, updated_at: Optional[str] = None) -> Optional[CachedReceipt]:
+        """Recibo do pedido; com updated_at, só se for da mesma versão."""
+        with self._lock:
+            entry = self._memory.get(order_id)
+            if entry is None and order_id in self._files:
+                entry = self._load(order_id)
+            if entry is None or time.time() - entry.stored_at > self.max_age \
+                    or (updated_at is not None and entry.updated_at != updated_at):
+                self.misses += 1
+                return None
+            self._remember(order_id, entry)
+            if order_id in self._files:
+                self._files[order_id][2] = time.time()
+            self.hits += 1
+            return entry
+
+    def find(self, order_id_or_prefix: str) -> Optional[CachedReceipt]:
+        """Como get(), aceitando também o número curto impresso no recibo (8 caracteres)."""
+        key = order_id_or_prefix.strip().lower()
+        with self._lock:
+            if key in self._memory or key in self._files:
+                matches = {key}
+            else:
+                matches = {order_id for order_id in list(self._memory) + list(self._files)
+                           if order_id.startswith(key)}
+        if len(matches) != 1:
+            return None
+        return self.get(matches.pop())
+
+    def recent(self, limit: int = 30) -> List[CachedReceipt]:
+        """Recibos guardados, do mais recente para o mais antigo."""
+        with self._lock:
+            order_ids = sorted(self._files, key=lambda order_id: self._files[order_id][1], reverse=True)
+            for order_id in self._memory:
+                if order_id not in self._files:
+                    order_ids.insert(0, order_id)
+        entries = []
+        cutoff = time.time() - self.max_age
+        for order_id in order_ids:
+            # Só consulta: não altera a ordem de uso nem as estatísticas
+            with self._lock:
+                entry = self._memory.get(order_id)
+                if entry is None and order_id in self._files:
+                    entry = self._load(order_id)
+            if entry is not None and entry.stored_at >= cutoff:
+                entries.append(entry)
+                if len(entries) >= limit:
+                    break
+        return sorted(entries, key=lambda entry: entry.stored_at, reverse=True)
+
+    # ---- escrita ----
+    def put(self, order: Order, data: bytes) -> CachedReceipt:
+        entry = CachedReceipt(order, data, time.time())
+        with self._lock:
+            self._remember(order.id, entry)
+            if self.directory:
+                self._store(entry)
+                self._evict()
+        return entry
+
+    def _remember(self, order_id: str, entry: CachedReceipt):
+        self._memory.pop(order_id, None)
+        self._memory[order_id] = entry
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, entry: CachedReceipt):
+        header = json.dumps({"stored_at": entry.stored_at, "order": entry.order.to_json()},
+                            ensure_ascii=False).encode("utf-8")
+        path = self._path(entry.order.id)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(header + b"\n" + entry.data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._files[entry.order.id] = [len(header) + 1 + len(entry.data), entry.stored_at, entry.stored_at]
+
+    def _load(self, order_id: str) -> Optional[CachedReceipt]:
+        try:
+            with open(self._path(order_id), "rb") as f:
+                header, _, data = f.read().partition(b"\n")
+            meta = json.loads(header)
+            return CachedReceipt(Order.from_json(meta["order"]), data, float(meta["stored_at"]))
+        except (OSError, ValueError, KeyError, OrderValidationError):
+            self._remove(order_id)
+            return None
+
+    def _remove(self, order_id: str):
+        self._files.pop(order_id, None)
+        self._memory.pop(order_id, None)
+        try:
+            os.remove(self._path(order_id))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Apaga os arquivos vencidos e os menos usados acima do limite de espaço."""
+        cutoff = time.time() - self.max_age
+        for order_id, (_, stored_at, _) in list(self._files.items()):
+            if stored_at < cutoff:
+                self._remove(order_id)
+        total = sum(size for size, _, _ in self._files.values())
+        if total <= self.max_bytes:
+            return
+        for order_id in sorted(self._files, key=lambda order_id: self._files[order_id][2]):
+            total -= self._files[order_id][0]
+            self._remove(order_id)
+            if total <= self.max_bytes:
+                break
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._files),
+                "disk_bytes": sum(size for size, _, _ in self._files.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def create_receipt_cache(config, base_path: str) -> ReceiptCache:
+    """Cria o cache com os limites da seção [RECIBOS] do config.ini."""
+    return ReceiptCache(
+        os.path.join(base_path, "recibos"),
+        max_age_days=config.getfloat('RECIBOS', 'DIAS', fallback=7.0),
+        max_bytes=int(config.getfloat('RECIBOS', 'MAX_MB', fallback=20.0) * 1024 * 1024),
+    )
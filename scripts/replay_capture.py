@@ -0,0 +1,199 @@
+"""
+Reproduz uma captura gravada com --record contra um servidor local.
+
+Cada pedido da captura é inserido no servidor local (local_supabase.py) no
+mesmo instante relativo em que apareceu na produção, dividido pela
+velocidade. O serviço roda numa pasta temporária com a impressora `nulo`
+e o intervalo de verificação também dividido pela velocidade; o tempo de
+resposta do servidor local imita a mediana medida na captura.
+
+Mede, por pedido, o tempo da inserção até a confirmação (PATCH) e a vazão,
+e compara com os tempos gravados na produção ou com outro relatório:
+
+    python replay_capture.py logs\\captura-20250101-180000.jsonl.gz
+    python replay_capture.py captura.jsonl.gz --speed 10 --report atual.json
+    python replay_capture.py captura.jsonl.gz --speed 10 --service ..\\versao-anterior --report anterior.json
+    python replay_capture.py captura.jsonl.gz --speed 10 --compare anterior.json
+
+Termina com código 1 se algum pedido não foi impresso ou foi impresso
+mais de uma vez.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+from bench_startup import SCRIPTS_DIR, TEST_CONFIG, prepare
+from local_supabase import LocalSupabase
+from print_stats import LatencySketch
+from traffic_capture import Capture
+
+# Tempo extra, depois do último pedido, para o serviço terminar a fila (segundos)
+DRAIN_TIMEOUT = 30.0
+
+
+def sketch_of(values) -> Dict:
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+    return sketch.summary()
+
+
+def replay(capture: Capture, speed: float, source: str, timeout: float = DRAIN_TIMEOUT) -> Dict:
+    """Roda o serviço de source contra a captura e retorna o relatório."""
+    latency = statistics.median(capture.poll_ms) / 1000 / speed if capture.poll_ms else 0.0
+    server = LocalSupabase(latency=latency)
+    added: Dict[str, float] = {}
+    acked: Dict[str, float] = {}
+    acks = Counter()
+    lock = threading.Lock()
+
+    def on_ack(order_id: str):
+        with lock:
+            acks[order_id] += 1
+            acked.setdefault(order_id, time.perf_counter())
+
+    server.on_ack = on_ack
+    server.start()
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    try:
+        command = prepare(workdir, [sys.executable, "print_service.py"], source)
+        with open(os.path.join(workdir, "config.ini"), "w", encoding="utf-8") as f:
+            f.write(TEST_CONFIG.format(url=server.url, interval=round(capture.poll_interval / speed, 3)))
+        process = subprocess.Popen(command, cwd=workdir, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            # Espera o serviço fazer a primeira busca antes de soltar os pedidos
+            deadline = time.perf_counter() + 30
+            while server.first_poll_at is None and time.perf_counter() < deadline and process.poll() is None:
+                time.sleep(0.01)
+            if server.first_poll_at is None:
+                raise RuntimeError("o serviço não iniciou (veja logs/ na pasta do serviço)")
+
+            first_arrival = capture.arrivals[0][0] if capture.arrivals else 0.0
+            start = time.perf_counter()
+            for at, order in capture.arrivals:
+                delay = start + (at - first_arrival) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                added[order["id"]] = time.perf_counter()
+                server.add_order(order)
+            fed = time.perf_counter()
+
+            deadline = fed + timeout
+            while server.pending_count() and time.perf_counter() < deadline and process.poll() is None:
+                time.sleep(0.05)
+            # Dá tempo para confirmações repetidas (impressão duplicada) aparecerem
+            time.sleep(min(2.0, capture.poll_interval / speed * 2))
+        finally:
+            process.kill()
+            process.wait()
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with lock:
+        latencies = [(acked[order_id] - added[order_id]) * 1000 for order_id in added if order_id in acked]
+        elapsed = (max(acked.values()) - start) if acked else 0.0
+        duplicates = sum(1 for count in acks.values() if count > 1)
+    return {
+        "capture": os.path.basename(capture.path),
+        "service": os.path.abspath(source),
+        "speed": speed,
+        "orders": len(added),
+        "printed": len(latencies),
+        "missing": len(added) - len(latencies),
+        "duplicates": duplicates,
+        "throughput_per_min": round(len(latencies) / elapsed * 60, 1) if elapsed else None,
+        "latency_ms": sketch_of(latencies),
+        "requests": server.requests,
+        "production": {
+            "duration_s": round(capture.duration, 1),
+            "orders": len(capture.arrivals),
+            "poll_ms": sketch_of(capture.poll_ms),
+            "poll_errors": capture.poll_errors,
+            "seen_to_print_ms": sketch_of(capture.print_ms.values()),
+            "print_failures": capture.print_failures,
+        },
+    }
+
+
+def format_latency(summary: Dict) -> str:
+    if not summary.get("count"):
+        return "-"
+    return f"p50 {summary['p50']:.0f}  p90 {summary['p90']:.0f}  p99 {summary['p99']:.0f}  máx {summary['max']:.0f} ms"
+
+
+def print_report(report: Dict):
+    production = report["production"]
+    print(f"Captura:     {report['capture']}  ({production['orders']} pedidos em {production['duration_s']:.0f}s)")
+    print(f"Serviço:     {report['service']}")
+    print(f"Velocidade:  {report['speed']:g}x")
+    print(f"Impressos:   {report['printed']}/{report['orders']}"
+          f"  (faltando {report['missing']}, duplicados {report['duplicates']})")
+    print(f"Vazão:       {report['throughput_per_min']} pedidos/min")
+    print(f"Latência:    {format_latency(report['latency_ms'])}  (inserção -> confirmação)")
+    print("Produção:")
+    print(f"  busca      {format_latency(production['poll_ms'])}  ({production['poll_errors']} falhas)")
+    print(f"  impressão  {format_latency(production['seen_to_print_ms'])}  (visto -> enviado)"
+          f"  ({production['print_failures']} falhas)")
+
+
+def print_comparison(previous: Dict, current: Dict):
+    """Diferença entre dois relatórios (anterior -> atual)."""
+    print(f"\nComparação com {previous['service']} ({previous['speed']:g}x):")
+    if previous["capture"] != current["capture"] or previous["speed"] != current["speed"]:
+        print("  Atenção: captura ou velocidade diferentes, a comparação é só indicativa.")
+    for key in ("p50", "p90", "p99", "max"):
+        before, after = previous["latency_ms"].get(key), current["latency_ms"].get(key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"  latência {key:<4} {before:>8.0f} -> {after:>8.0f} ms  ({change:+.1f}%)")
+    before, after = previous.get("throughput_per_min"), current.get("throughput_per_min")
+    if before and after:
+        print(f"  vazão         {before:>8.1f} -> {after:>8.1f} /min  ({(after - before) / before * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz uma captura de tráfego (--record)")
+    parser.add_argument("capture", help="arquivo .jsonl.gz gravado com --record")
+    parser.add_argument("--speed", type=float, default=1.0, help="aceleração (padrão: 1x, tempo real)")
+    parser.add_argument("--service", default=SCRIPTS_DIR, help="pasta com o print_service.py a testar")
+    parser.add_argument("--report", help="grava o relatório em JSON")
+    parser.add_argument("--compare", help="relatório JSON de outra execução para comparar")
+    parser.add_argument("--timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="espera máxima após o último pedido (segundos)")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed deve ser maior que zero")
+
+    capture = Capture(args.capture)
+    if not capture.arrivals:
+        print("A captura não tem pedidos.")
+        sys.exit(1)
+    report = replay(capture, args.speed, args.service, args.timeout)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+    if report["missing"] or report["duplicates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
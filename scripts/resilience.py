@@ -0,0 +1,283 @@
+"""
+Circuit breakers e políticas de retentativa para as chamadas de API e impressora.
+
+- CircuitBreaker: após N falhas seguidas o circuito abre e as chamadas são
+  recusadas sem tocar a rede. Passado o tempo de espera, uma única chamada
+  de teste (meio-aberto) decide se o circuito fecha ou volta a abrir, com
+  espera dobrada até o limite.
+- RetryBudget: limita as retentativas a uma fração das chamadas, para que
+  uma conexão instável não vire uma tempestade de requisições.
+- RetryPolicy: retentativas com backoff exponencial e jitter completo.
+- Backoff: espera crescente do loop principal durante quedas longas.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuito está aberto."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuito '{name}' aberto (nova tentativa em {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Circuit breaker de um endpoint ou impressora."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 15.0,
+                 max_reset_timeout: float = 300.0,
+                 on_state_change: Optional[Callable[[str, str, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.on_state_change = on_state_change
+        self.clock = clock
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._open_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        # Contadores para diagnóstico
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opens = 0
+        self.probes = 0
+        self.probe_failures = 0
+
+    def _set_state(self, state: str):
+        old, self.state = self.state, state
+        if old != state and self.on_state_change:
+            self.on_state_change(self.name, old, state)
+
+    def retry_in(self) -> float:
+        """Segundos até o circuito aceitar uma chamada de teste."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._open_timeout - self.clock())
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita agora."""
+        with self._lock:
+            if self.state == CLOSED:
+                self.calls += 1
+                return True
+            if self.state == OPEN and self.clock() - self._opened_at >= self._open_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.probes += 1
+                self.calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """Como allow(), mas levanta CircuitOpenError quando recusada."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                self._open_timeout = self.reset_timeout
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                # Teste falhou: volta a abrir com espera maior
+                self.probe_failures += 1
+                self._probe_in_flight = False
+                self._open_timeout = min(self._open_timeout * 2, self.max_reset_timeout)
+                self._opened_at = self.clock()
+                self._set_state(OPEN)
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.opens += 1
+                self._opened_at = self.clock()
+                self._set_state(OPEN)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "retry_in": round(self.retry_in(), 1),
+                "calls": self.calls,
+                "failures": self.failures,
+                "error_rate": round(self.failures / self.calls, 3) if self.calls else 0.0,
+                "rejected": self.rejected,
+                "opens": self.opens,
+                "probes": self.probes,
+                "probe_failures": self.probe_failures,
+            }
+
+
+class RetryBudget:
+    """Orçamento de retentativas (token bucket).
+
+    Cada chamada deposita `ratio` fichas e cada retentativa gasta uma. Um
+    reabastecimento lento por tempo garante algumas retentativas mesmo com
+    pouco tráfego.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0, refill_per_second: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.refill_per_second = refill_per_second
+        self.clock = clock
+        self._tokens = max_tokens
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            self.exhausted += 1
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+def jittered_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial com jitter completo: uniforme em [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryPolicy:
+    """Retentativas com backoff exponencial, jitter e orçamento compartilhado."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 budget: Optional[RetryBudget] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retries = 0
+
+    def call(self, fn: Callable, breaker: Optional[CircuitBreaker] = None,
+             retryable: Callable[[Exception], bool] = lambda e: True,
+             sleep: Callable[[float], None] = time.sleep):
+        """Executa fn() com retentativas.
+
+        Levanta CircuitOpenError se o circuito estiver aberto. Exceções para
+        as quais retryable() retorna False não contam como falha do circuito
+        (o servidor respondeu) e são propagadas sem nova tentativa.
+        """
+        if breaker:
+            breaker.check()
+        if self.budget:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                result = fn()
+            except Exception as e:
+                if not retryable(e):
+                    if breaker:
+                        breaker.record_success()
+                    raise
+                if breaker:
+                    breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                if self.budget and not self.budget.try_spend():
+                    raise
+                if breaker and not breaker.allow():
+                    raise
+                self.retries += 1
+                sleep(jittered_delay(attempt - 1, self.base_delay, self.max_delay))
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+class Backoff:
+    """Espera crescente com jitter para o loop principal."""
+
+    def __init__(self, base: float, cap: float = 120.0):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next_delay(self) -> float:
+        """Registra uma falha e retorna quanto esperar (nunca menos que base)."""
+        self.failures += 1
+        return self.base + jittered_delay(self.failures, self.base, self.cap - self.base)
+
+    def reset(self):
+        self.failures = 0
+
+
+class Resilience:
+    """Registro dos circuit breakers e do orçamento de retentativas."""
+
+    def __init__(self, on_state_change: Optional[Callable[[str, str, str], None]] = None,
+                 failure_threshold: int = 5, reset_timeout: float = 15.0, max_reset_timeout: float = 300.0):
+        self.on_state_change = on_state_change
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.budget = RetryBudget()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(
+                    name, self.failure_threshold, self.reset_timeout, self.max_reset_timeout,
+                    on_state_change=self.on_state_change,
+                )
+            return self.breakers[name]
+
+    def policy(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0) -> RetryPolicy:
+        return RetryPolicy(max_attempts, base_delay, max_delay, budget=self.budget)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            breakers = dict(self.breakers)
+        return {
+            "breakers": {name: b.snapshot() for name, b in breakers.items()},
+            "retry_tokens": round(self.budget.tokens, 2),
+            "retry_budget_exhausted": self.budget.exhausted,
+        }
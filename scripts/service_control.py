@@ -0,0 +1,257 @@
+"""
+Estado do serviço compartilhado entre o loop de impressão e a API local.
+
+O loop só atualiza alguns atributos e contadores; quem lê (a API local,
+em control_api.py) monta os snapshots na própria thread. Ações pedidas de
+fora (reimpressão, verificação imediata) são enfileiradas aqui e
+executadas pelo loop, que é o único a falar com a impressora.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Estados registrados em /jobs
+JOB_SENT = "sent"
+JOB_PRINTED = "printed"
+JOB_FAILED = "failed"
+JOB_REPRINTED = "reprinted"
+JOB_REPRINT_FAILED = "reprint_failed"
+
+DEFAULT_PORT = 8765
+
+# Token gerado quando [CONTROLE] TOKEN está vazio (na pasta do executável)
+TOKEN_FILE = "controle-token.txt"
+
+
+class JobRecord:
+    """Último estado conhecido de um pedido tratado pelo serviço."""
+
+    __slots__ = ("order_id", "status", "updated_at", "latency_ms", "detail")
+
+    def __init__(self, order_id: str, status: str, updated_at: float,
+                 latency_ms: Optional[float] = None, detail: Optional[str] = None):
+        self.order_id = order_id
+        self.status = status
+        self.updated_at = updated_at
+        self.latency_ms = latency_ms
+        self.detail = detail
+
+    def to_dict(self) -> Dict:
+        return {
+            "order_id": self.order_id,
+            "order_number": self.order_id[:8],
+            "status": self.status,
+            "updated_at": self.updated_at,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "detail": self.detail,
+        }
+
+
+class ServiceControl:
+    """Estado compartilhado entre o loop de impressão e a API local."""
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self.started_at = time.time()
+        self.paused = False
+        self.last_poll_at: Optional[float] = None
+        self.last_poll_ok: Optional[bool] = None
+        self.pending_orders = 0
+
+        self._jobs: "OrderedDict[str, JobRecord]" = OrderedDict()
+        self._counts: Dict[str, int] = {}
+        self._reprints: deque = deque()
+        # Textos avulsos (teste, resumo do dia) com o aviso do resultado
+        self._prints: deque = deque()
+        self._poll_requested = False
+        self._calibration_requested = False
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._sources: Dict[str, Callable[[], object]] = {}
+
+    # ---- chamado pelo loop de impressão ----
+    def record_poll(self, pending: Optional[int]):
+        """Registra uma verificação (pending None = servidor não respondeu)."""
+        self.last_poll_at = time.time()
+        self.last_poll_ok = pending is not None
+        if pending is not None:
+            self.pending_orders = pending
+
+    def record_job(self, order_id: str, status: str, latency_ms: Optional[float] = None,
+                   detail: Optional[str] = None):
+        with self._lock:
+            self._jobs.pop(order_id, None)
+            self._jobs[order_id] = JobRecord(order_id, status, time.time(), latency_ms, detail)
+            if len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self._counts[status] = self._counts.get(status, 0) + 1
+
+    def take_reprints(self) -> List[str]:
+        """Pedidos de reimpressão recebidos desde a última chamada."""
+        with self._lock:
+            reprints = list(self._reprints)
+            self._reprints.clear()
+        return reprints
+
+    def take_prints(self) -> List[Tuple[str, Callable[[bool], None]]]:
+        """Impressões avulsas pedidas desde a última chamada: (texto, on_done)."""
+        with self._lock:
+            prints = list(self._prints)
+            self._prints.clear()
+        return prints
+
+    def take_poll_request(self) -> bool:
+        """True uma única vez depois de cada POST /poll."""
+        with self._lock:
+            requested, self._poll_requested = self._poll_requested, False
+        return requested
+
+    def take_calibration_request(self) -> bool:
+        """True uma única vez depois de cada pedido de calibração."""
+        with self._lock:
+            requested, self._calibration_requested = self._calibration_requested, False
+        return requested
+
+    def wait(self, timeout: float) -> bool:
+        """Espera até timeout ou até uma ação da API. Retorna True se foi acordado."""
+        woke = self._wake.wait(max(0.0, timeout))
+        self._wake.clear()
+        return woke
+
+    # ---- chamado pela API ----
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._wake.set()
+
+    def request_poll(self):
+        with self._lock:
+            self._poll_requested = True
+        self._wake.set()
+
+    def request_reprint(self, order_id: str):
+        with self._lock:
+            if order_id not in self._reprints:
+                self._reprints.append(order_id)
+        self._wake.set()
+
+    def request_print(self, text: str, on_done: Callable[[bool], None]):
+        """Enfileira um texto avulso; on_done(impresso) é chamado pela thread do serviço."""
+        with self._lock:
+            self._prints.append((text, on_done))
+        self._wake.set()
+
+    def request_calibration(self):
+        with self._lock:
+            self._calibration_requested = True
+        self._wake.set()
+
+    def add_source(self, name: str, snapshot: Callable[[], object]):
+        """Registra um componente cujo snapshot aparece em /status."""
+        self._sources[name] = snapshot
+
+    def recent_jobs(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+            reprints = len(self._reprints)
+        data = {
+            "uptime_s": round(time.time() - self.started_at),
+            "paused": self.paused,
+            "last_poll_at": self.last_poll_at,
+            "last_poll_ok": self.last_poll_ok,
+            "pending_orders": self.pending_orders,
+            "queued_reprints": reprints,
+            "jobs": counts,
+        }
+        for name, source in list(self._sources.items()):
+            try:
+                data[name] = source()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+
+def control_api_enabled(config) -> bool:
+    """Indica se a API local ([CONTROLE] ATIVO) está ligada."""
+    value = config.get('CONTROLE', 'ATIVO', fallback='nao')
+    return value.strip().lower() in ("1", "sim", "s", "true", "yes", "on")
+
+
+def control_token(config, base_path: str) -> str:
+    """Token exigido pela API local.
+
+    O de [CONTROLE] TOKEN ou, se vazio, o gravado em controle-token.txt,
+    criado com um valor aleatório na primeira vez.
+    """
+    token = config.get('CONTROLE', 'TOKEN', fallback='').strip()
+    if token:
+        return token
+    path = os.path.join(base_path, TOKEN_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            token = f.read().strip()
+    except OSError:
+        token = ""
+    if not token:
+        token = secrets.token_urlsafe(32)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(token + "\n")
+        except OSError:
+            # Sem gravar, o token vale só até o serviço fechar
+            pass
+    return token
+
+
+def _post_to_service(config, base_path: str, path: str, body: Optional[Dict] = None,
+                     timeout: float = 5.0) -> Optional[int]:
+    """POST na API local do serviço em execução.
+
+    Retorna o código HTTP da resposta, ou None quando a API está desligada
+    ou nenhum serviço respondeu na porta.
+    """
+    if not control_api_enabled(config):
+        return None
+    port = config.getint('CONTROLE', 'PORTA', fallback=DEFAULT_PORT)
+    headers = {"Authorization": f"Bearer {control_token(config, base_path)}"}
+    data = None
+    if body is not None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers["Content-Type"] = "application/json; charset=utf-8"
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, method="POST", headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def request_service_reprint(config, base_path: str, order_id: str, timeout: float = 5.0) -> Optional[int]:
+    """Pede a reimpressão ao serviço em execução (POST /reprint/<id>); ver _post_to_service."""
+    return _post_to_service(config, base_path, f"/reprint/{order_id}", timeout=timeout)
+
+
+def request_service_calibration(config, base_path: str, timeout: float = 5.0) -> Optional[int]:
+    """Pede a calibração ao serviço em execução (POST /calibrate); ver _post_to_service."""
+    return _post_to_service(config, base_path, "/calibrate", timeout=timeout)
+
+
+def request_service_print(config, base_path: str, text: str, timeout: float = 5.0) -> Optional[int]:
+    """Entrega um texto avulso ao serviço em execução (POST /print); ver _post_to_service."""
+    return _post_to_service(config, base_path, "/print", {"text": text}, timeout=timeout)
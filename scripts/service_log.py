@@ -0,0 +1,162 @@
+"""
+Log estruturado do serviço de impressão.
+
+Os eventos vão para uma fila em memória (QueueHandler) e uma thread
+separada (QueueListener) grava no disco e no console, para que o loop de
+impressão nunca espere por I/O. O arquivo fica em `logs/impressora.log`,
+ao lado do executável, em formato JSON (uma linha por evento), e é
+rotacionado por tamanho e a cada dia; arquivos antigos são apagados.
+
+Uso:
+    log = setup_logging(base_path)
+    log.info("Pedido impresso", extra=fields(order_id=..., stage="print", latency_ms=12.5))
+"""
+
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import date, datetime
+from typing import Optional
+
+LOGGER_NAME = "impressora"
+
+# Atributos padrão de LogRecord (o resto veio de `extra` e vai para o JSON)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def fields(order_id: Optional[str] = None, stage: Optional[str] = None,
+           latency_ms: Optional[float] = None, **extra) -> dict:
+    """Monta o `extra` de um evento com os campos padrão do serviço."""
+    data = {key: value for key, value in extra.items() if value is not None}
+    if order_id is not None:
+        data["order_id"] = order_id
+    if stage is not None:
+        data["stage"] = stage
+    if latency_ms is not None:
+        data["latency_ms"] = round(latency_ms, 2)
+    return data
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Formato legível para o console: [HH:MM:SS] [NIVEL] mensagem (pedido)."""
+
+    LABELS = {"DEBUG": "DEBUG", "INFO": "INFO", "WARNING": "AVISO", "ERROR": "ERRO", "CRITICAL": "FATAL"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        ts = datetime.fromtimestamp(record.created).strftime("%H:%M:%S")
+        line = f"[{ts}] [{self.LABELS.get(record.levelname, record.levelname)}] {record.getMessage()}"
+        latency = getattr(record, "latency_ms", None)
+        if latency is not None:
+            line += f" ({latency:.0f} ms)"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SizeAndAgeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotaciona ao atingir max_bytes ou na virada do dia; apaga arquivos velhos."""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, max_age_days: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_age_days = max_age_days
+        if os.path.exists(filename):
+            self._day = date.fromtimestamp(os.path.getmtime(filename))
+        else:
+            self._day = date.today()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if date.today() != self._day and os.path.exists(self.baseFilename) \
+                and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._day = date.today()
+        self._remove_expired()
+
+    def _remove_expired(self):
+        cutoff = time.time() - self.max_age_days * 86400
+        for path in glob.glob(self.baseFilename + ".*"):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def setup_logging(base_path: str, console: bool = True, level: int = logging.INFO,
+                  max_bytes: int = 5 * 1024 * 1024, backup_count: int = 10,
+                  max_age_days: int = 30, filename: str = "impressora.log") -> logging.Logger:
+    """Configura o logger do serviço (arquivo JSON + console opcional).
+
+    Cada processo grava no seu arquivo (o supervisor em supervisor.log):
+    a rotação não funciona com dois processos no mesmo arquivo.
+    """
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
+
+    handlers = []
+    log_dir = os.path.join(base_path, "logs")
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = SizeAndAgeRotatingFileHandler(
+            os.path.join(log_dir, filename), max_bytes, backup_count, max_age_days)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError:
+        # Pasta sem permissão de escrita: segue só com o console
+        pass
+
+    # No executável --noconsole não existe stderr
+    if console and sys.stderr is not None:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """Grava os eventos pendentes e fecha os arquivos."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
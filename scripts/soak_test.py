@@ -0,0 +1,315 @@
+"""
+Teste de longa duração: procura vazamentos de memória, threads e handles.
+
+Roda o serviço (print_service.py) ou a interface (PrintServiceApp, com a
+janela oculta) numa pasta temporária, contra o servidor local que imita o
+Supabase (local_supabase.py) e a impressora `nulo`, simulando dias de
+movimento em minutos. A cada amostra lê o `process` do /status da API
+local (memória, threads, handles) e a latência de cada pedido (inserção
+até a confirmação).
+
+As primeiras amostras são aquecimento (imports, caches enchendo). Depois
+dele, a mediana do primeiro quarto é comparada com a do último quarto;
+o teste falha se o crescimento passar dos limites:
+
+    python soak_test.py                           1 dia simulado em ~2 min
+    python soak_test.py --target gui --days 7     interface, 1 semana em ~14 min
+    python soak_test.py --days 3 --orders-per-hour 120 --csv soak.csv
+
+A interface precisa de uma tela (no Linux sem monitor: xvfb-run).
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bench_startup import TEST_CONFIG, prepare
+from local_supabase import LocalSupabase
+
+# Fração inicial da execução ignorada na comparação
+WARMUP_FRACTION = 0.2
+
+PRODUCTS = ("X-Burger", "X-Salada", "Batata Frita", "Refrigerante Lata", "Suco de Laranja",
+            "Pizza Calabresa", "Porção de Frango", "Água sem Gás", "Açaí 500ml", "Pudim")
+ORDER_TYPES = ("table", "delivery", "takeout", "counter")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def random_order() -> Dict:
+    """Pedido com 1 a 8 itens, parecido com os do sistema web."""
+    items = []
+    for _ in range(random.randint(1, 8)):
+        items.append({
+            "product_name": random.choice(PRODUCTS),
+            "product_price": round(random.uniform(4, 60), 2),
+            "quantity": random.randint(1, 3),
+            "notes": random.choice((None, None, "sem cebola", "bem passado", "gelo e limão")),
+        })
+    order_type = random.choice(ORDER_TYPES)
+    return {
+        "id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "order_type": order_type,
+        "customer_name": f"Cliente {random.randint(1, 9999)}",
+        "delivery_address": "Rua das Flores, 123" if order_type == "delivery" else None,
+        "total": round(sum(item["product_price"] * item["quantity"] for item in items), 2),
+        "order_items": items,
+    }
+
+
+def read_status(port: int, token: str) -> Optional[Dict]:
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/status",
+                                     headers={"Authorization": f"Bearer {token}"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+class SoakRun:
+    """Uma execução: servidor local, processo do serviço e amostras."""
+
+    def __init__(self, target: str, days: float, orders_per_hour: float, speed: float,
+                 sample_interval: float):
+        self.target = target
+        self.duration = days * 86400 / speed
+        self.order_rate = orders_per_hour * speed / 3600
+        self.speed = speed
+        self.sample_interval = sample_interval
+        self.token = uuid.uuid4().hex
+        self.samples: List[Dict] = []
+        self._added: Dict[str, float] = {}
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def _on_ack(self, order_id: str):
+        now = time.perf_counter()
+        with self._lock:
+            added = self._added.pop(order_id, None)
+            if added is not None:
+                self._latencies.append((now - added) * 1000)
+
+    def _take_latencies(self) -> List[float]:
+        with self._lock:
+            latencies, self._latencies = self._latencies, []
+        return latencies
+
+    def run(self) -> Optional[str]:
+        """Executa o teste; retorna a mensagem de erro se o processo não aguentou."""
+        server = LocalSupabase()
+        server.on_ack = self._on_ack
+        server.start()
+        port = free_port()
+        workdir = tempfile.mkdtemp(prefix="soak-")
+        try:
+            if self.target == "gui":
+                command = prepare(workdir, [sys.executable, "soak_test.py"]) + ["--child-gui"]
+            else:
+                command = prepare(workdir, [sys.executable, "print_service.py"])
+            with open(os.path.join(workdir, "config.ini"), "w", encoding="utf-8") as f:
+                f.write(TEST_CONFIG.format(url=server.url, interval=round(max(0.2, 5 / self.speed), 3)))
+                f.write(f"\n[CONTROLE]\nATIVO = sim\nPORTA = {port}\nTOKEN = {self.token}\n")
+            # stderr vai para um arquivo: um PIPE que ninguém lê enche e trava o
+            # log do processo, o que apareceria aqui como vazamento
+            with open(os.path.join(workdir, "stderr.log"), "wb") as stderr:
+                process = subprocess.Popen(command, cwd=workdir, stdin=subprocess.DEVNULL,
+                                           stdout=subprocess.DEVNULL, stderr=stderr)
+                try:
+                    return self._drive(server, process, port, stderr.name)
+                finally:
+                    process.kill()
+                    process.wait()
+        finally:
+            server.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _drive(self, server, process, port: int, stderr_path: str) -> Optional[str]:
+        deadline = time.perf_counter() + 30
+        while read_status(port, self.token) is None:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                error = last_line(stderr_path)
+                return "o serviço não iniciou: " + (error or f"código {process.returncode}")
+            time.sleep(0.1)
+
+        start = time.perf_counter()
+        next_order = start
+        next_sample = start + self.sample_interval
+        while time.perf_counter() - start < self.duration:
+            now = time.perf_counter()
+            if now >= next_order:
+                order = random_order()
+                with self._lock:
+                    self._added[order["id"]] = now
+                server.add_order(order)
+                next_order = now + random.expovariate(self.order_rate)
+            if now >= next_sample:
+                if process.poll() is not None:
+                    error = last_line(stderr_path)
+                    return f"o serviço encerrou (código {process.returncode})" + (f": {error}" if error else "")
+                self._sample(server, port, now - start)
+                next_sample = now + self.sample_interval
+            time.sleep(max(0.0, min(next_order, next_sample) - time.perf_counter()))
+        return None
+
+    def _sample(self, server, port: int, elapsed: float):
+        status = read_status(port, self.token) or {}
+        usage = status.get("process") or {}
+        latencies = self._take_latencies()
+        server.discard_printed()
+        sample = {
+            "elapsed_s": round(elapsed, 1),
+            "sim_hours": round(elapsed * self.speed / 3600, 2),
+            "rss_mb": usage.get("rss_mb"),
+            "threads": usage.get("threads"),
+            "handles": usage.get("handles"),
+            "orders": len(latencies),
+            "p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+            "pending": server.pending_count(),
+        }
+        self.samples.append(sample)
+        day, hours = divmod(sample["sim_hours"], 24)
+        print(f"dia {int(day) + 1} {int(hours):02d}h | RSS {sample['rss_mb']} MB | threads {sample['threads']}"
+              f" | handles {sample['handles']} | p95 {sample['p95_ms']} ms | pendentes {sample['pending']}",
+              flush=True)
+
+
+def last_line(path: str) -> Optional[str]:
+    """Última linha não vazia do arquivo (lê só o final)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - 4096))
+            lines = f.read().decode(errors="replace").strip().splitlines()
+    except OSError:
+        return None
+    return lines[-1] if lines else None
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def window_median(samples: List[Dict], key: str) -> Optional[float]:
+    values = [sample[key] for sample in samples if sample.get(key) is not None]
+    return statistics.median(values) if values else None
+
+
+def evaluate(samples: List[Dict], limits: Dict[str, float]) -> List[str]:
+    """Compara o início e o fim (depois do aquecimento); retorna as falhas."""
+    measured = samples[int(len(samples) * WARMUP_FRACTION):]
+    if len(measured) < 4:
+        return ["poucas amostras: aumente --days ou diminua --sample"]
+    quarter = max(1, len(measured) // 4)
+    first, last = measured[:quarter], measured[-quarter:]
+    failures = []
+    print("\nCrescimento (mediana do início -> fim, após aquecimento):")
+    for key, label, limit in (("rss_mb", "memória (MB)", limits["rss_mb"]),
+                              ("threads", "threads", limits["threads"]),
+                              ("handles", "handles", limits["handles"])):
+        before, after = window_median(first, key), window_median(last, key)
+        if before is None or after is None:
+            print(f"  {label:<14} não medido neste sistema")
+            continue
+        growth = after - before
+        failed = growth > limit
+        print(f"  {label:<14} {before:>8.1f} -> {after:>8.1f}  ({growth:+.1f}, limite {limit:g})"
+              + ("  FALHOU" if failed else ""))
+        if failed:
+            failures.append(f"{label} cresceu {growth:.1f} (limite {limit:g})")
+    before, after = window_median(first, "p95_ms"), window_median(last, "p95_ms")
+    if before and after:
+        ratio = after / before
+        failed = ratio > limits["latency_ratio"]
+        print(f"  {'latência p95':<14} {before:>8.0f} -> {after:>8.0f} ms  ({ratio:.2f}x, limite"
+              f" {limits['latency_ratio']:g}x)" + ("  FALHOU" if failed else ""))
+        if failed:
+            failures.append(f"latência p95 subiu {ratio:.2f}x")
+    backlog = last[-1]["pending"]
+    if backlog > max(10, last[-1]["orders"] * 2):
+        failures.append(f"{backlog} pedidos acumulados sem imprimir")
+    return failures
+
+
+def run_gui_child():
+    """Processo filho: PrintServiceApp com a janela oculta."""
+    import tkinter as tk
+    from print_service_gui import PrintServiceApp
+
+    root = tk.Tk()
+    root.withdraw()
+    app = PrintServiceApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
+    root.mainloop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de longa duração (vazamentos)")
+    parser.add_argument("--target", choices=("cli", "gui"), default="cli",
+                        help="print_service.py (cli) ou PrintServiceApp (gui)")
+    parser.add_argument("--days", type=float, default=1.0, help="dias simulados")
+    parser.add_argument("--orders-per-hour", type=float, default=60.0)
+    parser.add_argument("--speed", type=float, default=720.0, help="aceleração (720 = 1 dia em 2 min)")
+    parser.add_argument("--sample", type=float, default=2.0, help="intervalo entre amostras (segundos)")
+    parser.add_argument("--max-rss-growth", type=float, default=15.0, help="MB")
+    parser.add_argument("--max-thread-growth", type=float, default=2.0)
+    parser.add_argument("--max-handle-growth", type=float, default=20.0)
+    parser.add_argument("--max-latency-growth", type=float, default=2.0, help="razão do p95 (fim/início)")
+    parser.add_argument("--csv", help="grava as amostras em CSV")
+    parser.add_argument("--child-gui", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_gui:
+        run_gui_child()
+        return
+    if args.target == "gui" and sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        print("A interface precisa de uma tela: rode com xvfb-run.")
+        sys.exit(2)
+
+    run = SoakRun(args.target, args.days, args.orders_per_hour, args.speed, args.sample)
+    print(f"Alvo: {args.target} | {args.days:g} dia(s) simulado(s) em {run.duration / 60:.1f} min"
+          f" | {args.orders_per_hour:g} pedidos/hora simulada ({run.order_rate:.1f}/s)")
+    error = run.run()
+
+    if args.csv and run.samples:
+        with open(args.csv, "w", encoding="utf-8") as f:
+            f.write(",".join(run.samples[0]) + "\n")
+            for sample in run.samples:
+                f.write(",".join("" if value is None else str(value) for value in sample.values()) + "\n")
+
+    if error:
+        print(f"\nFALHA: {error}")
+        sys.exit(1)
+    failures = evaluate(run.samples, {
+        "rss_mb": args.max_rss_growth,
+        "threads": args.max_thread_growth,
+        "handles": args.max_handle_growth,
+        "latency_ratio": args.max_latency_growth,
+    })
+    if failures:
+        print("\nFALHA: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK: sem crescimento acima dos limites.")
+
+
+if __name__ == "__main__":
+    main()
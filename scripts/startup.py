@@ -0,0 +1,59 @@
+"""
+Inicialização rápida do serviço de impressão.
+
+O que mais pesa na abertura é importar o `requests` (e, no executável
+--onefile, descompactar tudo numa pasta temporária). Para imprimir logo
+depois de ligar o computador:
+
+- `preload()` importa os módulos pesados numa thread enquanto o config,
+  o log, a impressora e a janela são preparados;
+- `StartupTimer` mede cada etapa até a primeira verificação de pedidos e
+  registra o total no log (stage "startup").
+
+Veja também bench_startup.py e o modo onedir do build.bat.
+"""
+
+import importlib
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Referência do início do processo (este módulo é importado primeiro)
+PROCESS_START = time.perf_counter()
+
+
+def preload(*modules: str) -> threading.Thread:
+    """Importa os módulos em segundo plano; um import posterior só espera terminar."""
+
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                # O import normal vai mostrar o erro no lugar certo
+                pass
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+class StartupTimer:
+    """Marca o tempo de cada etapa desde o início do processo."""
+
+    def __init__(self):
+        self._last = PROCESS_START
+        self.phases: List[Tuple[str, float]] = []
+        self.done = False
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - PROCESS_START) * 1000
+
+    def to_dict(self) -> Dict[str, float]:
+        return {phase: round(ms, 1) for phase, ms in self.phases}
@@ -0,0 +1,326 @@
+"""
+Cliente da API REST do Supabase usado pelo serviço de impressão.
+
+Todas as chamadas passam por um circuit breaker por endpoint (orders,
+print_logs, heartbeat) e por retentativas com backoff e jitter. Falhas
+retornam None/False e a descrição fica em `last_error`, para que o loop
+principal diferencie "sem pedidos" de "servidor fora do ar".
+
+A busca de pedidos pede resposta comprimida (gzip/deflate) e guarda a
+impressão digital da última resposta (ETag ou hash do corpo). Quando a
+lista de pendentes não mudou, o JSON não é decodificado de novo e
+`unchanged` fica True para que o loop pule o despacho.
+"""
+
+import hashlib
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+from order_model import ORDERS_SELECT, Order, parse_orders
+from profiling import stage
+from resilience import CircuitOpenError, Resilience
+
+# Intervalo entre heartbeats (segundos)
+HEARTBEAT_INTERVAL = 30
+
+
+class PollStats:
+    """Bytes trafegados e CPU gasta nas buscas de pedidos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.polls = 0
+        self.unchanged = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self.cpu_seconds = 0.0
+        self.idle_cpu_seconds = 0.0
+
+    def record(self, wire_bytes: int, body_bytes: int, cpu_seconds: float, unchanged: bool):
+        with self._lock:
+            self.polls += 1
+            self.wire_bytes += wire_bytes
+            self.body_bytes += body_bytes
+            self.cpu_seconds += cpu_seconds
+            if unchanged:
+                self.unchanged += 1
+                self.idle_cpu_seconds += cpu_seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "polls": self.polls,
+                "unchanged": self.unchanged,
+                "wire_bytes": self.wire_bytes,
+                "body_bytes": self.body_bytes,
+                "compression_ratio": round(self.body_bytes / self.wire_bytes, 2) if self.wire_bytes else None,
+                "avg_wire_bytes": round(self.wire_bytes / self.polls) if self.polls else 0,
+                "avg_cpu_ms": round(self.cpu_seconds * 1000 / self.polls, 3) if self.polls else 0.0,
+                "avg_idle_cpu_ms": round(self.idle_cpu_seconds * 1000 / self.unchanged, 3) if self.unchanged else 0.0,
+            }
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Timeouts, falhas de conexão, 429 e 5xx valem nova tentativa; 4xx não."""
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+def describe_error(exc: Exception) -> str:
+    """Mensagem amigável para o log."""
+    if isinstance(exc, CircuitOpenError):
+        return f"Servidor indisponível ({exc})"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "Timeout na conexão"
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return "Sem conexão com a internet"
+    return f"Falha na requisição: {exc}"
+
+
+class SupabaseAPI:
+    """Acesso às tabelas orders/print_logs e à função printer-heartbeat."""
+
+    def __init__(self, url: str, key: str, restaurant_id: str, resilience: Resilience,
+                 client_name: str = "Impressora de Pedidos", client_version: str = "2.0"):
+        self.url = url.rstrip('/')
+        self.key = key
+        self.restaurant_id = restaurant_id
+        self.resilience = resilience
+        self.client_name = client_name
+        self.client_version = client_version
+        self.client_id = f"python-{socket.gethostname()}"
+        self.last_error: Optional[str] = None
+        # Pedidos descartados na última busca por dados inválidos
+        self.invalid_orders: List[str] = []
+
+        # Cache da última lista de pendentes (requisição condicional)
+        self.unchanged = False
+        self.poll_stats = PollStats()
+        self._etag: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._cached_orders: Optional[List[Order]] = None
+
+        # Reaproveita a conexão HTTPS entre as verificações
+        self.session = requests.Session()
+
+        self._poll_policy = resilience.policy(max_attempts=2)
+        self._ack_policy = resilience.policy(max_attempts=4)
+        self._log_policy = resilience.policy(max_attempts=2)
+        self._heartbeat_policy = resilience.policy(max_attempts=1)
+
+    def _headers(self, prefer: Optional[str] = None) -> Dict[str, str]:
+        headers = {
+            "apikey": self.key,
+            "Authorization": f"Bearer {self.key}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate"
+        }
+        if prefer:
+            headers["Prefer"] = prefer
+        return headers
+
+    def _call(self, endpoint: str, policy, fn):
+        """Executa fn() protegida pelo breaker do endpoint; None em caso de falha."""
+        try:
+            result = policy.call(fn, breaker=self.resilience.breaker(endpoint), retryable=is_retryable)
+        except (requests.RequestException, CircuitOpenError, ValueError) as e:
+            self.last_error = describe_error(e)
+            return None
+        self.last_error = None
+        return result
+
+    # ---- pedidos ----
+    def get_pending_orders(self) -> Optional[List[Order]]:
+        """Pedidos com print_status = 'pending'; None se o servidor não respondeu.
+
+        Se a lista for igual à da busca anterior, retorna os mesmos objetos
+        já validados e marca `unchanged` = True.
+        """
+        params = {
+            "select": ORDERS_SELECT,
+            "restaurant_id": f"eq.{self.restaurant_id}",
+            "print_status": "eq.pending",
+            "order": "created_at.asc"
+        }
+        headers = self._headers()
+        if self._etag and self._cached_orders is not None:
+            headers["If-None-Match"] = self._etag
+
+        def fetch():
+            response = self.session.get(f"{self.url}/rest/v1/orders", params=params,
+                                        headers=headers, timeout=15)
+            response.raise_for_status()
+            return response
+
+        cpu_start = time.process_time()
+        with stage("http"):
+            response = self._call("orders", self._poll_policy, fetch)
+        if response is None:
+            self.unchanged = False
+            return None
+
+        body = response.content
+        wire_bytes = int(response.headers.get("Content-Length") or len(body))
+        if response.status_code == 304:
+            fingerprint = self._fingerprint
+        else:
+            self._etag = response.headers.get("ETag")
+            fingerprint = self._etag or hashlib.blake2b(body, digest_size=16).hexdigest()
+
+        self.unchanged = fingerprint is not None and fingerprint == self._fingerprint \
+            and self._cached_orders is not None
+        if not self.unchanged:
+            with stage("json"):
+                try:
+                    payload = response.json()
+                except ValueError as e:
+                    self.last_error = describe_error(e)
+                    return None
+                self._cached_orders, self.invalid_orders = parse_orders(payload)
+            self._fingerprint = fingerprint
+
+        self.poll_stats.record(wire_bytes, len(body), time.process_time() - cpu_start, self.unchanged)
+        return self._cached_orders
+
+    def poll_cursor(self) -> Optional[Dict]:
+        """Última lista de pendentes com a ETag, para outro processo continuar dela."""
+        if self._cached_orders is None or self._fingerprint is None:
+            return None
+        return {"etag": self._etag, "fingerprint": self._fingerprint,
+                "orders": [order.to_json() for order in self._cached_orders]}
+
+    def restore_poll_cursor(self, cursor: Dict):
+        """Retoma a lista gravada por poll_cursor(): a próxima busca pode vir como 304."""
+        orders, _ = parse_orders(cursor["orders"])
+        self._etag = cursor.get("etag")
+        self._fingerprint = cursor["fingerprint"]
+        self._cached_orders = orders
+
+    def invalidate_poll_cache(self):
+        """Força a próxima busca a decodificar e despachar a lista completa."""
+        self._etag = None
+        self._fingerprint = None
+        self._cached_orders = None
+
+    def get_order(self, order_id: str) -> Optional[Order]:
+        """Busca um pedido pelo id, em qualquer status (reimpressão)."""
+        params = {
+            "select": ORDERS_SELECT,
+            "id": f"eq.{order_id}",
+            "restaurant_id": f"eq.{self.restaurant_id}",
+        }
+
+        def fetch():
+            response = self.session.get(f"{self.url}/rest/v1/orders", params=params,
+                                        headers=self._headers(), timeout=15)
+            response.raise_for_status()
+            return response.json()
+
+        with stage("http"):
+            payload = self._call("orders", self._poll_policy, fetch)
+        if payload is None:
+            return None
+        orders, errors = parse_orders(payload)
+        if not orders:
+            self.last_error = errors[0] if errors else "Pedido não encontrado"
+            return None
+        return orders[0]
+
+    def get_prep_history(self, days: int = 7, limit: int = 1000) -> Optional[List[Dict]]:
+        """Pedidos recentes que ficaram prontos (created_at, ready_at, itens), para estimar o preparo."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        params = {
+            "select": "order_type,created_at,ready_at,order_items(product_name)",
+            "restaurant_id": f"eq.{self.restaurant_id}",
+            "ready_at": "not.is.null",
+            "created_at": f"gte.{since}",
+            "order": "created_at.desc",
+            "limit": str(limit),
+        }
+
+        def fetch():
+            response = self.session.get(f"{self.url}/rest/v1/orders", params=params,
+                                        headers=self._headers(), timeout=15)
+            response.raise_for_status()
+            return response.json()
+
+        with stage("http"):
+            # Breaker próprio: uma falha aqui não suspende a busca de pendentes
+            payload = self._call("prep_history", self._poll_policy, fetch)
+        return payload if isinstance(payload, list) else None
+
+    def mark_order_printed(self, order_id: str) -> bool:
+        """Atualiza o status do pedido para 'printed'."""
+        data = {
+            "print_status": "printed",
+            "printed_at": datetime.utcnow().isoformat() + "Z",
+            "print_count": 1
+        }
+
+        def patch():
+            response = self.session.patch(f"{self.url}/rest/v1/orders", params={"id": f"eq.{order_id}"},
+                                          json=data, headers=self._headers("return=minimal"), timeout=10)
+            response.raise_for_status()
+            return True
+
+        with stage("ack"):
+            return bool(self._call("orders", self._ack_policy, patch))
+
+    # ---- logs ----
+    def log_print_event(self, order: Order, event_type: str, status: str, printer_name: Optional[str],
+                        error_message: str = None) -> bool:
+        """Registra um log de impressão no banco de dados."""
+        data = {
+            "restaurant_id": self.restaurant_id,
+            "order_id": order.id,
+            "event_type": event_type,
+            "status": status,
+            "printer_name": printer_name,
+            "error_message": error_message,
+            "order_number": order.short_id,
+            "items_count": len(order.items)
+        }
+
+        def post():
+            response = self.session.post(f"{self.url}/rest/v1/print_logs", json=data,
+                                         headers=self._headers("return=minimal"), timeout=10)
+            response.raise_for_status()
+            return True
+
+        with stage("print_log"):
+            return bool(self._call("print_logs", self._log_policy, post))
+
+    # ---- heartbeat ----
+    def send_heartbeat(self, pending_orders: int = 0, is_printing: bool = False, printers_count: int = 1) -> bool:
+        """Informa ao painel que este computador está ativo."""
+        data = {
+            "restaurant_id": self.restaurant_id,
+            "client_id": self.client_id,
+            "client_name": self.client_name,
+            "client_version": self.client_version,
+            "platform": "windows" if sys.platform.startswith("win") else sys.platform,
+            "printers_count": printers_count,
+            "is_printing": is_printing,
+            "pending_orders": pending_orders,
+        }
+
+        def post():
+            response = self.session.post(f"{self.url}/functions/v1/printer-heartbeat", json=data,
+                                         headers=self._headers(), timeout=10)
+            response.raise_for_status()
+            return True
+
+        with stage("heartbeat"):
+            return bool(self._call("heartbeat", self._heartbeat_policy, post))
+
+    def close(self):
+        self.session.close()
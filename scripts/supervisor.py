@@ -0,0 +1,252 @@
+"""
+Supervisor do serviço de impressão.
+
+Com `--supervise`, o print_service.py (ou o executável) vira um processo
+pequeno que só vigia o serviço de verdade, aberto como processo filho:
+
+- se o filho cai, é reaberto com espera crescente (1s, 2s, 4s... até 1 min);
+- se para de dar sinal de vida por TEMPO_SEM_SINAL segundos (loop preso
+  numa chamada de rede ou na impressora), é encerrado e reaberto;
+- se a memória passa de MEMORIA_MAXIMA_MB, o filho é avisado, termina o
+  ciclo em andamento, sai e é reaberto.
+
+O filho grava a cada ciclo, em `supervisor-estado.json`, o sinal de vida e
+o estado que evita reimpressões ao reabrir: pedidos já impressos aguardando
+confirmação, trabalhos ainda no spooler e a última lista de pendentes (com
+a ETag, para a primeira verificação do novo processo não baixar tudo de
+novo). O novo processo lê esse arquivo ao iniciar.
+
+Configuração (opcional) no config.ini:
+
+    [SUPERVISOR]
+    TEMPO_SEM_SINAL = 180
+    MEMORIA_MAXIMA_MB = 500
+"""
+
+import configparser
+import json
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from process_usage import process_snapshot
+from resilience import Backoff
+from service_log import fields, setup_logging, shutdown_logging
+
+# Variáveis de ambiente passadas ao filho
+STATE_ENV = "IMPRESSORA_ESTADO"
+RESTARTS_ENV = "IMPRESSORA_REINICIOS"
+REASON_ENV = "IMPRESSORA_MOTIVO"
+
+STATE_FILE = "supervisor-estado.json"
+
+# Arquivo que pede ao filho para sair no fim do ciclo (<estado>.parar)
+STOP_SUFFIX = ".parar"
+
+# Espera pelo filho depois de pedir que saia (segundos)
+STOP_GRACE = 30.0
+
+# Filho que roda esse tempo sem problemas zera a espera entre reinícios
+STABLE_SECONDS = 300.0
+
+CHECK_INTERVAL = 1.0
+
+# Trabalhos do spooler só são retomados de um estado mais novo que isso;
+# depois de um reinício do computador a fila do spooler já não existe
+HANDOFF_MAX_AGE = 600.0
+
+
+class WorkerLink:
+    """Lado do filho: sinal de vida, estado para o próximo processo e pedido de saída."""
+
+    def __init__(self, path: str, restarts: int = 0, reason: Optional[str] = None):
+        self.path = path
+        self.stop_path = path + STOP_SUFFIX
+        self.restarts = restarts
+        self.reason = reason
+        self.restored: Dict[str, int] = {}
+
+    def load(self) -> Optional[Dict]:
+        """Estado deixado pelo processo anterior (None se não há ou está ilegível)."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if isinstance(state, dict) else None
+
+    def beat(self, state: Dict):
+        """Grava o sinal de vida junto com o estado atual."""
+        data = dict(state, pid=os.getpid(), beat_at=time.time(), process=process_snapshot())
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Supervisor lendo o arquivo no mesmo instante: fica para o próximo ciclo
+            pass
+
+    def stop_requested(self) -> bool:
+        return os.path.exists(self.stop_path)
+
+    def snapshot(self) -> Dict:
+        return {"restarts": self.restarts, "last_exit": self.reason, "restored": self.restored}
+
+
+def worker_link() -> Optional[WorkerLink]:
+    """WorkerLink quando este processo foi aberto pelo supervisor."""
+    path = os.environ.get(STATE_ENV)
+    if not path:
+        return None
+    try:
+        restarts = int(os.environ.get(RESTARTS_ENV, "0"))
+    except ValueError:
+        restarts = 0
+    return WorkerLink(path, restarts, os.environ.get(REASON_ENV) or None)
+
+
+class Supervisor:
+    """Mantém o serviço rodando como processo filho."""
+
+    def __init__(self, command: List[str], state_path: str, log, heartbeat_timeout: float = 180.0,
+                 max_memory_mb: float = 500.0):
+        self.command = command
+        self.state_path = state_path
+        self.stop_path = state_path + STOP_SUFFIX
+        self.log = log
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_memory_mb = max_memory_mb
+        self.restarts = 0
+        self.child: Optional[subprocess.Popen] = None
+
+    def run(self) -> int:
+        """Abre o filho e o reabre até ele sair normalmente (Ctrl+C). Retorna o código de saída."""
+        backoff = Backoff(1.0, cap=60.0)
+        reason = None
+        try:
+            while True:
+                started = time.monotonic()
+                reason = self._run_child(reason)
+                if reason is None:
+                    self.log.info("Serviço encerrado; supervisor encerrando.", extra=fields(stage="supervisor"))
+                    return 0
+                if time.monotonic() - started >= STABLE_SECONDS:
+                    backoff.reset()
+                delay = backoff.next_delay()
+                self.restarts += 1
+                self.log.warning(f"Serviço {reason}. Reabrindo em {delay:.0f}s (reinício {self.restarts})",
+                                 extra=fields(stage="supervisor", reason=reason, restarts=self.restarts))
+                time.sleep(delay)
+        except KeyboardInterrupt:
+            self.log.info("Encerrando supervisor...", extra=fields(stage="supervisor"))
+            self._stop_child()
+            return 0
+
+    def _run_child(self, last_reason: Optional[str]) -> Optional[str]:
+        """Roda um filho até ele sair; retorna o motivo do reinício (None: saída normal)."""
+        self._remove(self.stop_path)
+        env = dict(os.environ)
+        env[STATE_ENV] = self.state_path
+        env[RESTARTS_ENV] = str(self.restarts)
+        if last_reason:
+            env[REASON_ENV] = last_reason
+        self.child = subprocess.Popen(self.command, env=env)
+        self.log.info(f"Serviço aberto (pid {self.child.pid})", extra=fields(stage="supervisor", pid=self.child.pid))
+        spawned = time.time()
+        stop_deadline = None
+        while True:
+            try:
+                code = self.child.wait(CHECK_INTERVAL)
+            except subprocess.TimeoutExpired:
+                code = None
+            if code is not None:
+                if stop_deadline is not None:
+                    return f"usando memória acima de {self.max_memory_mb:g} MB"
+                return None if code == 0 else f"encerrou com código {code}"
+
+            state = self._read_state()
+            current = state.get("pid") == self.child.pid
+            last_beat = max(spawned, state.get("beat_at", 0) if current else 0)
+            silent = time.time() - last_beat
+            if silent > self.heartbeat_timeout:
+                self._kill_child()
+                return f"sem sinal de vida há {silent:.0f}s"
+
+            if stop_deadline is None:
+                rss_mb = (state.get("process") or {}).get("rss_mb") if current else None
+                if self.max_memory_mb and rss_mb and rss_mb > self.max_memory_mb:
+                    self.log.warning(f"Serviço usando {rss_mb:.0f} MB; pedindo para reabrir",
+                                     extra=fields(stage="supervisor", rss_mb=rss_mb))
+                    self._request_stop()
+                    stop_deadline = time.monotonic() + STOP_GRACE
+            elif time.monotonic() > stop_deadline:
+                self._kill_child()
+                return f"não saiu em {STOP_GRACE:.0f}s após o pedido (memória acima de {self.max_memory_mb:g} MB)"
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _request_stop(self):
+        try:
+            with open(self.stop_path, "w", encoding="utf-8"):
+                pass
+        except OSError:
+            pass
+
+    def _stop_child(self):
+        """Pede ao filho para sair e espera; encerra à força se não sair."""
+        if self.child is None or self.child.poll() is not None:
+            return
+        self._request_stop()
+        try:
+            self.child.wait(STOP_GRACE)
+        except (subprocess.TimeoutExpired, KeyboardInterrupt):
+            self._kill_child()
+        self._remove(self.stop_path)
+
+    def _kill_child(self):
+        self.child.kill()
+        self.child.wait()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def create_supervisor(config, base_path: str, command: List[str], log) -> Supervisor:
+    """Cria o supervisor com os limites da seção [SUPERVISOR] do config.ini."""
+    return Supervisor(
+        command,
+        os.path.join(base_path, STATE_FILE),
+        log,
+        heartbeat_timeout=config.getfloat('SUPERVISOR', 'TEMPO_SEM_SINAL', fallback=180.0),
+        max_memory_mb=config.getfloat('SUPERVISOR', 'MEMORIA_MAXIMA_MB', fallback=500.0),
+    )
+
+
+def run_supervisor(base_path: str, command: List[str]) -> int:
+    """Supervisiona o serviço (--supervise). Retorna o código de saída.
+
+    Lê o config.ini sem exigir que ele exista: sem ele o filho falha e é
+    reaberto até o arquivo ser criado.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(base_path, "config.ini"), encoding="utf-8")
+    log = setup_logging(base_path, filename="supervisor.log")
+    supervisor = create_supervisor(config, base_path, command, log)
+    log.info(f"Supervisor iniciado (sem sinal: {supervisor.heartbeat_timeout:g}s,"
+             f" memória máxima: {supervisor.max_memory_mb:g} MB)", extra=fields(stage="supervisor"))
+    try:
+        return supervisor.run()
+    finally:
+        shutdown_logging()
@@ -0,0 +1,130 @@
+"""API local: token sempre exigido, origem do navegador conferida e comandos entregues ao serviço."""
+
+import configparser
+import json
+import os
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from control_api import ControlServer, create_control_server
+from service_control import (
+    TOKEN_FILE,
+    ServiceControl,
+    request_service_calibration,
+    request_service_print,
+    request_service_reprint,
+)
+
+TOKEN = "segredo"
+PANEL = "https://painel.exemplo.com.br"
+ORDER_ID = "8b4c1f9e-2d7a-4e3b-9c61-0f5a7d2e8b14"
+
+
+@pytest.fixture
+def server():
+    server = ControlServer(ServiceControl(), TOKEN, port=0, origin=PANEL)
+    server.start()
+    yield server
+    server.stop()
+
+
+def call(server, path, method="GET", headers=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.port}{path}", method=method,
+                                     headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_status_requires_token(server):
+    assert call(server, "/status")[0] == 401
+    assert call(server, "/status", headers={"Authorization": "Bearer errado"})[0] == 401
+    status, _, body = call(server, "/status", headers={"Authorization": f"Bearer {TOKEN}"})
+    assert status == 200
+    assert "uptime_s" in json.loads(body)
+
+
+def test_foreign_origin_is_rejected(server):
+    headers = {"Authorization": f"Bearer {TOKEN}", "Origin": "https://outro.site"}
+    assert call(server, "/status", headers=headers)[0] == 403
+    assert call(server, "/pause", "POST", headers)[0] == 403
+    assert call(server, "/status", "OPTIONS", {"Origin": "https://outro.site"})[0] == 403
+
+
+def test_configured_origin_gets_cors_headers(server):
+    status, headers, _ = call(server, "/status", "OPTIONS", {"Origin": PANEL})
+    assert status == 204
+    assert headers["Access-Control-Allow-Origin"] == PANEL
+    assert headers["Access-Control-Allow-Private-Network"] == "true"
+    status, headers, _ = call(server, "/status", headers={"Authorization": f"Bearer {TOKEN}", "Origin": PANEL})
+    assert status == 200
+    assert headers["Access-Control-Allow-Origin"] == PANEL
+
+
+def test_empty_token_is_generated_and_kept(tmp_path):
+    config = configparser.ConfigParser()
+    config.read_string("[CONTROLE]\nATIVO = sim\nPORTA = 0\nTOKEN =\n")
+    first = create_control_server(config, ServiceControl(), str(tmp_path))
+    first.httpd.server_close()
+    with open(os.path.join(tmp_path, TOKEN_FILE), encoding="utf-8") as f:
+        saved = f.read().strip()
+    assert len(saved) >= 32
+    assert first.httpd.token == saved
+    assert first.httpd.origin == ""
+
+    second = create_control_server(config, ServiceControl(), str(tmp_path))
+    second.start()
+    try:
+        assert call(second, "/status")[0] == 401
+        assert call(second, "/status", headers={"Authorization": f"Bearer {saved}"})[0] == 200
+    finally:
+        second.stop()
+
+
+def client_config(port, token=TOKEN):
+    config = configparser.ConfigParser()
+    config.read_string(f"[CONTROLE]\nATIVO = sim\nPORTA = {port}\nTOKEN = {token}\n")
+    return config
+
+
+def test_reprint_goes_to_running_service(server, tmp_path):
+    assert request_service_reprint(client_config(server.port), str(tmp_path), ORDER_ID) == 202
+    assert server.control.take_reprints() == [ORDER_ID]
+    assert request_service_reprint(client_config(server.port, "errado"), str(tmp_path), ORDER_ID) == 401
+
+
+def test_calibration_goes_to_running_service(server, tmp_path):
+    assert request_service_calibration(client_config(server.port), str(tmp_path)) == 202
+    assert server.control.take_calibration_request()
+
+
+def test_print_goes_to_running_service(server, tmp_path):
+    assert request_service_print(client_config(server.port), str(tmp_path), "RESUMO DO DIA\nAçaí") == 202
+    [(text, on_done)] = server.control.take_prints()
+    assert text == "RESUMO DO DIA\nAçaí"
+    on_done(True)
+
+    headers = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+    request = urllib.request.Request(f"http://127.0.0.1:{server.port}/print", data=b'{"text": ""}',
+                                     method="POST", headers=headers)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 400
+    assert server.control.take_prints() == []
+
+
+def test_reprint_without_service_is_not_reachable(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    assert request_service_reprint(client_config(port), str(tmp_path), ORDER_ID) is None
+    assert request_service_calibration(client_config(port), str(tmp_path)) is None
+    assert request_service_print(client_config(port), str(tmp_path), "teste") is None
+    config = client_config(port)
+    config.set("CONTROLE", "ATIVO", "nao")
+    assert request_service_reprint(config, str(tmp_path), ORDER_ID) is None
@@ -0,0 +1,126 @@
+"""Fila de despacho por prazo: fórmula do prazo, ordem, espera máxima e contadores."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import dispatch_queue
+from dispatch_queue import DEFAULT_PREP_MINUTES, DispatchScheduler, PrepTimeModel
+from order_model import Order
+
+T0 = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio de parede controlado pelo teste (segundos desde T0)."""
+    now = [0.0]
+    monkeypatch.setattr(dispatch_queue.time, "time", lambda: T0.timestamp() + now[0])
+    return now
+
+
+def order(order_id, order_type="table", created=0.0, products=("X-Burger",)):
+    return Order.from_json({
+        "id": order_id,
+        "created_at": (T0 + timedelta(seconds=created)).isoformat(),
+        "order_type": order_type,
+        "order_items": [{"product_name": name, "product_price": 10, "quantity": 1} for name in products],
+    })
+
+
+def history(product, minutes, order_type="table"):
+    return {
+        "created_at": T0.isoformat(),
+        "ready_at": (T0 + timedelta(minutes=minutes)).isoformat(),
+        "order_type": order_type,
+        "order_items": [{"product_name": product}],
+    }
+
+
+def ids(orders):
+    return [entry.id for entry in orders]
+
+
+def test_deadline_is_arrival_plus_target_minus_prep_and_print_time(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel(), print_ms=lambda entry: 3000.0)
+    scheduler.plan([order("balcao", "counter")])
+    [entry] = scheduler.snapshot()["next"]
+    # 10 min de meta, 12 min de preparo padrão e 3 s de impressão
+    assert entry["prep_min"] == DEFAULT_PREP_MINUTES
+    assert entry["deadline_in_s"] == (10 - 12) * 60 - 3
+
+
+def test_shortest_deadline_goes_first(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel())
+    # A mesa chegou antes, mas tem 20 min de meta; o balcão só 10
+    orders = [order("mesa", "table", created=-60), order("balcao", "counter")]
+    assert ids(scheduler.plan(orders)) == ["balcao", "mesa"]
+
+    fifo = DispatchScheduler("nulo", PrepTimeModel(), enabled=False)
+    assert ids(fifo.plan(orders)) == ["mesa", "balcao"]
+
+
+def test_order_waiting_longer_than_max_wait_is_promoted(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel(), max_wait=120)
+    scheduler.plan([order("mesa", "table")])
+    clock[0] = 130
+    plan = scheduler.plan([order("mesa", "table"), order("balcao", "counter", created=130)])
+    assert ids(plan) == ["mesa", "balcao"]
+
+    scheduler.dispatched(plan[0])
+    snapshot = scheduler.snapshot()
+    assert (snapshot["promoted"], snapshot["reordered"], snapshot["dispatched"]) == (1, 0, 1)
+
+
+def test_seen_at_survives_a_reparsed_list_and_missing_orders_leave(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel(), max_wait=120)
+    scheduler.plan([order("mesa"), order("entrega", "delivery")])
+    clock[0] = 90
+    # A lista nova traz objetos novos para os mesmos pedidos
+    scheduler.plan([order("mesa")])
+    snapshot = scheduler.snapshot()
+    assert snapshot["queued"] == 1
+    assert snapshot["next"][0]["waiting_s"] == 90
+
+
+def test_counters_for_reordered_and_late_orders(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel())
+    # A mesa chegou antes, mas o balcão (prazo já vencido) passa na frente
+    plan = scheduler.plan([order("mesa", "table", created=-30), order("balcao", "counter")])
+    assert ids(plan) == ["balcao", "mesa"]
+    scheduler.dispatched(plan[0])
+    scheduler.dispatched(plan[1])
+    snapshot = scheduler.snapshot()
+    assert (snapshot["reordered"], snapshot["late"], snapshot["promoted"]) == (1, 1, 0)
+    assert snapshot["wait_ms"]["count"] == 2
+    # Pedido que não está na fila não conta
+    scheduler.dispatched(order("outro"))
+    assert scheduler.snapshot()["dispatched"] == 2
+
+
+def test_prep_model_medians_and_filters():
+    model = PrepTimeModel()
+    model.update([history("Pizza", 20), history("Pizza", 30), history("Pizza", 40),
+                  # Menos de MIN_SAMPLES pedidos: não entra por produto
+                  history("Suco", 2), history("Suco", 4),
+                  # Fora de 0..MAX_PREP_MINUTES: descartados
+                  history("Pizza", -5), history("Pizza", 200),
+                  {"created_at": T0.isoformat(), "order_items": [{"product_name": "Pizza"}]}])
+    assert model.by_product == {"Pizza": 30}
+    assert model.by_type == {"table": 20}
+    assert model.orders == 5
+
+    # O item mais demorado com histórico define o preparo
+    assert model.estimate(order("a", products=("Pizza", "Suco"))) == 30
+    # Sem produto conhecido: mediana do tipo, ou o padrão
+    assert model.estimate(order("b", products=("Suco",))) == 20
+    assert model.estimate(order("c", "delivery", products=("Suco",))) == DEFAULT_PREP_MINUTES
+
+
+def test_new_history_recomputes_queued_deadlines(clock):
+    scheduler = DispatchScheduler("nulo", PrepTimeModel())
+    scheduler.plan([order("mesa", products=("Pizza",))])
+    scheduler.update_history([history("Pizza", minutes) for minutes in (30, 30, 30)])
+    [entry] = scheduler.snapshot()["next"]
+    assert entry["prep_min"] == 30
+    assert entry["deadline_in_s"] == (20 - 30) * 60
@@ -0,0 +1,48 @@
+"""PrintStats: gravações de processos diferentes no mesmo estatisticas.json se somam."""
+
+import os
+
+import print_stats
+from print_stats import PrintStats
+
+
+def test_flush_merges_events_from_other_processes(tmp_path):
+    path = str(tmp_path / "estatisticas.json")
+    service, cli = PrintStats(path), PrintStats(path)
+    service.record_ticket(3, wait_ms=1000, print_ms=50)
+    service.flush()
+    # A linha de comando abriu o arquivo antes da gravação do serviço
+    cli.record_reprint()
+    cli.flush()
+    service.record_ticket(2)
+    service.flush()
+
+    summary = PrintStats(path).day_summary()
+    assert (summary["tickets"], summary["items"], summary["reprints"]) == (2, 5, 1)
+    assert summary["latency_ms"]["wait"]["count"] == 1
+    # O serviço passou a ver a reimpressão feita pela linha de comando
+    assert service.day_summary()["reprints"] == 1
+
+
+def test_pending_events_count_before_flush(tmp_path):
+    stats = PrintStats(str(tmp_path / "estatisticas.json"))
+    stats.record_ticket(4)
+    stats.flush()
+    stats.record_ticket(1)
+    assert stats.day_summary()["tickets"] == 2
+    assert stats.peak_hour() == 2
+
+
+def test_locked_file_keeps_events_for_next_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(print_stats, "LOCK_TIMEOUT", 0.1)
+    path = str(tmp_path / "estatisticas.json")
+    stats = PrintStats(path)
+    stats.record_ticket(1)
+    with open(path + ".lock", "w"):
+        pass
+    stats.flush()
+    assert not os.path.exists(path)
+
+    os.remove(path + ".lock")
+    stats.flush()
+    assert PrintStats(path).day_summary()["tickets"] == 1
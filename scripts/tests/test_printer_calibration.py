@@ -0,0 +1,30 @@
+"""TicketLines: os recibos só são lidos na calibração e nas gravações das estatísticas."""
+
+from printer_calibration import DEFAULT_TICKET_LINES, TicketLines
+
+
+class Entry:
+    def __init__(self, lines):
+        self.data = b"\n".join(b"linha" for _ in range(lines))
+
+
+class Receipts:
+    def __init__(self, *lines):
+        self.entries = [Entry(count) for count in lines]
+        self.reads = 0
+
+    def recent(self, limit=30):
+        self.reads += 1
+        return self.entries[:limit]
+
+
+def test_value_is_cached_until_refresh():
+    receipts = Receipts(20, 24, 40)
+    lines = TicketLines(receipts)
+    assert lines.value == DEFAULT_TICKET_LINES
+    assert receipts.reads == 0
+
+    assert lines.refresh() == 24
+    receipts.entries.append(Entry(90))
+    assert lines.value == 24
+    assert receipts.reads == 1
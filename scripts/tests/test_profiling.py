@@ -0,0 +1,23 @@
+"""Profiler: só desliga o tracemalloc que ele mesmo ligou."""
+
+import tracemalloc
+
+from profiling import Profiler
+
+
+def test_disable_stops_only_tracing_it_started(tmp_path):
+    profiler = Profiler(sample_interval=0.001)
+    assert not tracemalloc.is_tracing()
+    profiler.enable(str(tmp_path))
+    assert tracemalloc.is_tracing()
+    assert profiler.disable()
+    assert not tracemalloc.is_tracing()
+
+    # Ligado de fora (ex.: PYTHONTRACEMALLOC): continua ligado depois
+    tracemalloc.start()
+    try:
+        profiler.enable(str(tmp_path))
+        profiler.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,164 @@
+"""Circuit breaker, orçamento de retentativas e RetryPolicy com relógio controlado."""
+
+import pytest
+
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    RetryPolicy,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def breaker(clock, **kwargs):
+    transitions = []
+    kwargs.setdefault("failure_threshold", 3)
+    kwargs.setdefault("reset_timeout", 10.0)
+    cb = CircuitBreaker("api", clock=clock, on_state_change=lambda name, old, new: transitions.append((old, new)),
+                        **kwargs)
+    return cb, transitions
+
+
+def fail(times):
+    """fn que falha `times` vezes com ConnectionError e depois retorna "ok"."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= times:
+            raise ConnectionError("sem rede")
+        return "ok"
+    fn.calls = calls
+    return fn
+
+
+def test_opens_at_threshold_and_rejects_until_cooldown(clock):
+    cb, transitions = breaker(clock)
+    for _ in range(2):
+        assert cb.allow()
+        cb.record_failure()
+    assert cb.state == CLOSED
+    cb.record_failure()
+    assert cb.state == OPEN
+    assert transitions == [(CLOSED, OPEN)]
+
+    assert not cb.allow()
+    with pytest.raises(CircuitOpenError) as error:
+        cb.check()
+    assert error.value.retry_in == 10.0
+    clock.now += 9.9
+    assert not cb.allow()
+    assert cb.snapshot()["rejected"] == 3
+
+
+def test_half_open_allows_a_single_probe_and_success_closes(clock):
+    cb, transitions = breaker(clock)
+    for _ in range(3):
+        cb.record_failure()
+    clock.now += 10
+    assert cb.allow()
+    assert cb.state == HALF_OPEN
+    # Só uma chamada de teste por vez
+    assert not cb.allow()
+    cb.record_success()
+    assert cb.state == CLOSED
+    assert cb.consecutive_failures == 0
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_failed_probe_reopens_with_doubled_timeout_up_to_the_cap(clock):
+    cb, _ = breaker(clock, max_reset_timeout=25.0)
+    for _ in range(3):
+        cb.record_failure()
+    for expected in (20.0, 25.0, 25.0):
+        clock.now += cb.retry_in()
+        assert cb.allow()
+        cb.record_failure()
+        assert cb.state == OPEN
+        assert cb.retry_in() == expected
+    snapshot = cb.snapshot()
+    assert (snapshot["opens"], snapshot["probes"], snapshot["probe_failures"]) == (1, 3, 3)
+
+    # Fechar volta a espera para o valor inicial
+    clock.now += cb.retry_in()
+    assert cb.allow()
+    cb.record_success()
+    for _ in range(3):
+        cb.record_failure()
+    assert cb.retry_in() == 10.0
+
+
+def test_retry_budget_spends_deposits_and_refills(clock):
+    budget = RetryBudget(ratio=0.5, max_tokens=2.0, refill_per_second=0.1, clock=clock)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.exhausted == 1
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+    clock.now += 10
+    assert budget.tokens == pytest.approx(1.0)
+    clock.now += 100
+    assert budget.tokens == 2.0
+
+
+def test_policy_retries_until_success(clock):
+    cb, _ = breaker(clock)
+    delays = []
+    fn = fail(2)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8.0)
+    assert policy.call(fn, cb, sleep=delays.append) == "ok"
+    assert len(fn.calls) == 3
+    assert policy.retries == 2
+    assert delays[0] <= 0.5 and delays[1] <= 1.0
+    assert cb.state == CLOSED and cb.consecutive_failures == 0
+
+
+def test_policy_stops_on_non_retryable_error_without_tripping_the_breaker(clock):
+    cb, _ = breaker(clock, failure_threshold=1)
+
+    def fn():
+        raise ValueError("400 do servidor")
+    with pytest.raises(ValueError):
+        RetryPolicy().call(fn, cb, retryable=lambda e: isinstance(e, ConnectionError), sleep=lambda s: None)
+    assert cb.state == CLOSED
+    assert cb.snapshot()["failures"] == 0
+
+
+def test_policy_stops_when_the_budget_is_exhausted(clock):
+    budget = RetryBudget(ratio=0.0, max_tokens=1.0, refill_per_second=0.0, clock=clock)
+    policy = RetryPolicy(max_attempts=5, budget=budget)
+    fn = fail(10)
+    with pytest.raises(ConnectionError):
+        policy.call(fn, sleep=lambda s: None)
+    # Uma retentativa (a única ficha) e a falha seguinte é propagada
+    assert len(fn.calls) == 2
+    assert budget.exhausted == 1
+
+
+def test_policy_stops_when_the_breaker_opens_and_then_rejects(clock):
+    cb, _ = breaker(clock, failure_threshold=2)
+    fn = fail(10)
+    with pytest.raises(ConnectionError):
+        RetryPolicy(max_attempts=5).call(fn, cb, sleep=lambda s: None)
+    assert len(fn.calls) == 2
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        RetryPolicy().call(fn, cb, sleep=lambda s: None)
+    assert len(fn.calls) == 2
@@ -0,0 +1,131 @@
+"""TcpBackend contra um listener local na porta 0 (no lugar da impressora 9100)."""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from printer_backends import TcpBackend
+
+
+class FakePrinter:
+    """Aceita conexões e guarda os bytes recebidos em cada uma."""
+
+    def __init__(self, status_reply=None):
+        self.status_reply = status_reply
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.connections = []
+        self.received = []
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            self.received.append(bytearray())
+            threading.Thread(target=self._read, args=(conn, self.received[-1]), daemon=True).start()
+
+    def _read(self, conn, buffer):
+        while True:
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer.extend(chunk)
+            if self.status_reply is not None and b"\x1dr\x01" in chunk:
+                conn.sendall(self.status_reply)
+
+    def wait_for(self, size, index=-1, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.received and len(self.received[index]) >= size:
+                return bytes(self.received[index])
+            time.sleep(0.01)
+        raise AssertionError(f"recebidos {[len(data) for data in self.received]} bytes")
+
+    def drop_clients(self):
+        for conn in self.connections:
+            conn.shutdown(socket.SHUT_RDWR)
+            conn.close()
+
+    def close(self):
+        self.server.close()
+        for conn in self.connections:
+            conn.close()
+
+
+@pytest.fixture
+def printer():
+    fake = FakePrinter()
+    yield fake
+    fake.close()
+
+
+def test_bytes_arrive_intact(printer):
+    backend = TcpBackend("127.0.0.1", printer.port, timeout=2)
+    data = bytes(range(256)) * 400  # 100 KB com todos os valores de byte
+    try:
+        assert backend.send(data)
+        assert printer.wait_for(len(data)) == data
+        assert backend.snapshot()["bytes_written"] == len(data)
+    finally:
+        backend.close()
+
+
+def test_reconnects_after_printer_closes_connection(printer):
+    backend = TcpBackend("127.0.0.1", printer.port, timeout=2)
+    try:
+        assert backend.send(b"primeiro\n")
+        printer.wait_for(9)
+        printer.drop_clients()
+        time.sleep(0.1)
+
+        assert backend.send(b"segundo\n")
+        assert printer.wait_for(8, index=1) == b"segundo\n"
+        assert len(printer.connections) == 2
+        assert backend.reconnects == 1
+    finally:
+        backend.close()
+
+
+def test_wait_printed_confirmed_by_status_reply():
+    fake = FakePrinter(status_reply=b"\x00")
+    backend = TcpBackend("127.0.0.1", fake.port, timeout=2)
+    try:
+        assert backend.send(b"recibo\n")
+        assert backend.wait_printed(2.0) is True
+        assert backend.status_supported is True
+    finally:
+        backend.close()
+        fake.close()
+
+
+def test_wait_printed_timeout_marks_status_unsupported(printer):
+    backend = TcpBackend("127.0.0.1", printer.port, timeout=2)
+    try:
+        assert backend.send(b"recibo\n")
+        start = time.monotonic()
+        assert backend.wait_printed(0.3) is None
+        assert time.monotonic() - start < 1.5
+        assert backend.status_supported is False
+        # Não consulta de novo nem perde a conexão
+        assert backend.wait_printed(0.3) is None
+        assert backend.send(b"outro\n")
+        assert printer.wait_for(len(b"recibo\n\x1dr\x01outro\n")).endswith(b"outro\n")
+    finally:
+        backend.close()
+
+
+def test_wait_printed_without_connection():
+    backend = TcpBackend("127.0.0.1", 9, timeout=0.5)
+    assert backend.wait_printed(0.1) is False
@@ -0,0 +1,108 @@
+"""Win32Backend.job_state com um win32print falso (a fila do spooler em memória)."""
+
+import pytest
+
+import printer_backends
+from printer_backends import (
+    JOB_DONE,
+    JOB_ERROR,
+    JOB_PENDING,
+    JOB_STATUS_DELETING,
+    JOB_STATUS_PRINTED,
+    JOB_STATUS_PRINTING,
+    JOB_STATUS_RETAINED,
+    Win32Backend,
+)
+
+
+class FakeSpooler:
+    """Imita as chamadas de win32print usadas pelo backend."""
+
+    def __init__(self, retain=True):
+        self.retain = retain
+        self.jobs = {}
+        self.next_id = 1
+
+    def OpenPrinter(self, name):
+        return name
+
+    def ClosePrinter(self, handle):
+        pass
+
+    def StartDocPrinter(self, handle, level, info):
+        job_id = self.next_id
+        self.next_id += 1
+        self.jobs[job_id] = 0
+        return job_id
+
+    def StartPagePrinter(self, handle):
+        pass
+
+    def WritePrinter(self, handle, data):
+        pass
+
+    def EndPagePrinter(self, handle):
+        pass
+
+    def EndDocPrinter(self, handle):
+        pass
+
+    def GetJob(self, handle, job_id, level):
+        if job_id not in self.jobs:
+            raise OSError("trabalho não encontrado")
+        return {"Status": self.jobs[job_id]}
+
+    def SetJob(self, handle, job_id, level, info, command):
+        if command == printer_backends.JOB_CONTROL_RETAIN:
+            if not self.retain:
+                raise OSError("retenção não suportada")
+        elif command == printer_backends.JOB_CONTROL_DELETE:
+            self.jobs.pop(job_id, None)
+
+
+@pytest.fixture
+def spooler(monkeypatch):
+    fake = FakeSpooler()
+    monkeypatch.setattr(printer_backends, "win32print", fake)
+    return fake
+
+
+def send(spooler):
+    backend = Win32Backend("Termica")
+    assert backend.send(b"pedido")
+    return backend, backend.last_job_id
+
+
+def test_printed_job_is_done_and_removed_from_queue(spooler):
+    backend, job_id = send(spooler)
+    assert backend.job_state(job_id) == JOB_PENDING
+    spooler.jobs[job_id] = JOB_STATUS_PRINTED | JOB_STATUS_RETAINED
+    assert backend.job_state(job_id) == JOB_DONE
+    assert job_id not in spooler.jobs
+
+
+def test_deleted_job_is_an_error(spooler):
+    backend, job_id = send(spooler)
+    spooler.jobs[job_id] = JOB_STATUS_DELETING | JOB_STATUS_PRINTED
+    assert backend.job_state(job_id) == JOB_ERROR
+
+
+def test_retained_job_vanishing_is_an_error(spooler):
+    backend, job_id = send(spooler)
+    spooler.jobs[job_id] = JOB_STATUS_PRINTING
+    assert backend.job_state(job_id) == JOB_PENDING
+    del spooler.jobs[job_id]
+    assert backend.job_state(job_id) == JOB_ERROR
+
+
+def test_without_retention_only_a_job_seen_printing_counts_as_done(spooler):
+    spooler.retain = False
+    backend, job_id = send(spooler)
+    del spooler.jobs[job_id]
+    assert backend.job_state(job_id) == JOB_ERROR
+
+    backend, job_id = send(spooler)
+    spooler.jobs[job_id] = JOB_STATUS_PRINTING
+    assert backend.job_state(job_id) == JOB_PENDING
+    del spooler.jobs[job_id]
+    assert backend.job_state(job_id) == JOB_DONE
@@ -0,0 +1,165 @@
+"""
+Gravação do tráfego do serviço, para reproduzir o movimento de um dia real.
+
+Com `--record` o serviço grava em logs/captura-AAAAMMDD-HHMMSS.jsonl.gz:
+
+- cada busca de pedidos pendentes: tempo de resposta, ids da lista e os
+  pedidos completos (com order_items) na primeira vez que aparecem ou
+  quando mudam — listas repetidas ocupam só uma linha curta;
+- cada recibo enviado à impressora: pedido, resultado, bytes e tempo.
+
+O arquivo é JSON por linha comprimido com gzip, descarregado no disco a
+cada poucos segundos (uma queda do processo perde no máximo esse trecho).
+`replay_capture.py` reproduz a captura contra um servidor local e a
+impressora nula.
+
+Linhas do arquivo (campo "type"):
+
+    header  version, started, source, poll_interval
+    poll    t, ms, ids[, orders] | unchanged | error
+    print   t, order_id, ok, ms, bytes[, error]
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from order_model import Order
+
+CAPTURE_VERSION = 1
+
+# Intervalo máximo entre descargas do gzip para o disco (segundos)
+FLUSH_INTERVAL = 5.0
+
+
+class CaptureWriter:
+    """Grava buscas e impressões num arquivo .jsonl.gz."""
+
+    def __init__(self, path: str, source: str = "print_service", poll_interval: Optional[float] = None):
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        # (id, updated_at) dos pedidos já gravados por completo
+        self._seen = set()
+        self.events = 0
+        self._write({"type": "header", "version": CAPTURE_VERSION,
+                     "started": datetime.now().isoformat(timespec="seconds"),
+                     "source": source, "poll_interval": poll_interval})
+
+    def _elapsed(self) -> float:
+        return round(time.monotonic() - self._start, 3)
+
+    def _write(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.events += 1
+            now = time.monotonic()
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def record_poll(self, orders: Optional[List[Order]], unchanged: bool, latency_ms: float,
+                    error: Optional[str] = None):
+        event = {"type": "poll", "t": self._elapsed(), "ms": round(latency_ms, 1)}
+        if orders is None:
+            event["error"] = error or "sem resposta"
+        elif unchanged:
+            event["unchanged"] = True
+        else:
+            event["ids"] = [order.id for order in orders]
+            new = []
+            for order in orders:
+                key = (order.id, order.updated_at)
+                if key not in self._seen:
+                    self._seen.add(key)
+                    new.append(order.to_json())
+            if new:
+                event["orders"] = new
+        self._write(event)
+
+    def record_print(self, order_id: str, ok: bool, latency_ms: float, size: int,
+                     error: Optional[str] = None):
+        event = {"type": "print", "t": self._elapsed(), "order_id": order_id, "ok": ok,
+                 "ms": round(latency_ms, 1), "bytes": size}
+        if error and not ok:
+            event["error"] = error
+        self._write(event)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def default_capture_path(base_path: str) -> str:
+    """logs/captura-AAAAMMDD-HHMMSS.jsonl.gz na pasta do executável."""
+    directory = os.path.join(base_path, "logs")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"captura-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+
+
+def read_capture(path: str) -> Iterator[Dict]:
+    """Eventos da captura, em ordem. Tolera o final cortado de um processo encerrado à força."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except (EOFError, OSError):
+            return
+
+
+class Capture:
+    """Captura carregada: chegada de cada pedido e os tempos medidos na produção."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict = {}
+        # (segundos desde o início, pedido como veio da API), na ordem de chegada
+        self.arrivals: List[tuple] = []
+        self.poll_ms: List[float] = []
+        self.poll_errors = 0
+        # Da primeira vez que o pedido apareceu numa busca até o envio à impressora
+        self.print_ms: Dict[str, float] = {}
+        self.print_failures = 0
+        self.duration = 0.0
+
+        first_seen: Dict[str, float] = {}
+        orders: Dict[str, Dict] = {}
+        for event in read_capture(path):
+            kind = event.get("type")
+            self.duration = max(self.duration, event.get("t", 0.0))
+            if kind == "header":
+                self.header = event
+            elif kind == "poll":
+                if "error" in event:
+                    self.poll_errors += 1
+                    continue
+                self.poll_ms.append(event["ms"])
+                for order in event.get("orders", ()):
+                    orders[order["id"]] = order
+                for order_id in event.get("ids", ()):
+                    if order_id not in first_seen and order_id in orders:
+                        first_seen[order_id] = event["t"]
+                        self.arrivals.append((event["t"], orders[order_id]))
+            elif kind == "print":
+                if not event["ok"]:
+                    self.print_failures += 1
+                elif event["order_id"] in first_seen and event["order_id"] not in self.print_ms:
+                    self.print_ms[event["order_id"]] = (event["t"] - first_seen[event["order_id"]]) * 1000
+
+    @property
+    def poll_interval(self) -> float:
+        return float(self.header.get("poll_interval") or 5)